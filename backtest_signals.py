@@ -0,0 +1,168 @@
+"""
+Signal Backtest - Replay completed_trades under alternative pip ladders
+
+Loads past signals from completed_trades, replays them over local minute
+candles (CANDLE_DATA_DIR/<PAIR>.csv) with the live TP/SL rules and prints
+win rate and pips for every ladder.
+
+Usage:
+    python backtest_signals.py --days 365 --ladder 20/40/70/50 --ladder 15/35/60/40
+"""
+
+import argparse
+import asyncio
+import os
+import ssl
+import time
+from datetime import datetime, timedelta, timezone
+
+import asyncpg
+import numpy as np
+
+import signal_replay
+
+DEFAULT_LADDER = (20, 40, 70, 50)
+
+
+def parse_ladder(text: str) -> tuple:
+    parts = [float(p) for p in text.split('/')]
+    if len(parts) != 4:
+        raise argparse.ArgumentTypeError(
+            f"Ladder must be tp1/tp2/tp3/sl pips, got {text}")
+    return tuple(parts)
+
+
+def parse_range(text: str) -> list:
+    """'15:30:5' -> [15, 20, 25, 30]"""
+    start, stop, step = (float(p) for p in text.split(':'))
+    return list(np.arange(start, stop + step / 2, step))
+
+
+def build_ladders(args) -> list:
+    ladders = list(args.ladder or [])
+    if args.sweep:
+        tp1s, tp2s, tp3s, sls = (parse_range(r) for r in args.sweep.split(','))
+        ladders.extend((a, b, c, d) for a in tp1s for b in tp2s for c in tp3s
+                       for d in sls if a < b < c)
+    return ladders or [DEFAULT_LADDER]
+
+
+async def load_completed_trades(days: int) -> list:
+    database_url = os.getenv("DATABASE_URL", "")
+    if not database_url:
+        raise SystemExit("DATABASE_URL is not set")
+
+    ctx = ssl.create_default_context()
+    ctx.check_hostname = False
+    ctx.verify_mode = ssl.CERT_NONE
+
+    conn = await asyncpg.connect(database_url, ssl=ctx)
+    try:
+        return await conn.fetch(
+            """SELECT pair, action, COALESCE(live_entry, entry_price) AS entry, created_at
+               FROM completed_trades
+               WHERE created_at >= $1 AND completion_reason <> 'message_deleted'
+               ORDER BY created_at""",
+            datetime.now(timezone.utc) - timedelta(days=days))
+    finally:
+        await conn.close()
+
+
+def group_by_pair(rows: list) -> dict:
+    from telegram_bot import PAIR_CONFIG
+
+    grouped = {}
+    for row in rows:
+        pair = str(row['pair']).upper()
+        pip_value = PAIR_CONFIG.get(pair, {}).get('pip_value', 0.0001)
+        grouped.setdefault(pair, []).append(
+            (str(row['action']).upper() == 'BUY', float(row['entry']),
+             pip_value, int(row['created_at'].timestamp())))
+    return grouped
+
+
+def run_backtest(grouped: dict, data_dir: str, ladders: list,
+                 max_hours: int) -> dict:
+    totals = {ladder: ([], []) for ladder in ladders}
+
+    for pair, rows in grouped.items():
+        start = datetime.fromtimestamp(min(r[3] for r in rows), timezone.utc)
+        end = datetime.fromtimestamp(max(r[3] for r in rows),
+                                     timezone.utc) + timedelta(hours=max_hours)
+        candles = signal_replay.load_candles_from_file(
+            data_dir, pair, start, end)
+        if len(candles['time']) == 0:
+            print(f"⚠️  No candles for {pair}, skipping {len(rows)} trades")
+            continue
+
+        trades = {
+            'is_buy': np.array([r[0] for r in rows]),
+            'entry': np.array([r[1] for r in rows]),
+            'pip_value': np.array([r[2] for r in rows]),
+            'start_time': np.array([r[3] for r in rows], dtype=np.int64),
+        }
+        scores = signal_replay.sweep_ladders(candles,
+                                             trades,
+                                             ladders,
+                                             max_bars=max_hours * 60)
+        for ladder, scored in scores.items():
+            totals[ladder][0].append(scored['outcome'])
+            totals[ladder][1].append(scored['pips'])
+
+    results = {}
+    for ladder, (outcomes, pips) in totals.items():
+        if not outcomes:
+            continue
+        results[ladder] = signal_replay.summarise_scores(
+            np.concatenate(outcomes), np.concatenate(pips))
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Backtest TP/SL pip ladders over completed trades")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--data-dir",
+                        default=os.getenv("CANDLE_DATA_DIR", ""),
+                        help="Directory with <PAIR>.csv minute candles")
+    parser.add_argument("--ladder",
+                        type=parse_ladder,
+                        action="append",
+                        help="tp1/tp2/tp3/sl in pips, repeatable")
+    parser.add_argument(
+        "--sweep",
+        help="Ranges start:stop:step for tp1,tp2,tp3,sl e.g. 10:30:5,30:60:10,50:90:10,30:60:10"
+    )
+    parser.add_argument("--max-hours",
+                        type=int,
+                        default=72,
+                        help="How long a trade is followed before it is marked to market")
+    args = parser.parse_args()
+
+    if not args.data_dir:
+        raise SystemExit("Set --data-dir or CANDLE_DATA_DIR")
+
+    ladders = build_ladders(args)
+    rows = await load_completed_trades(args.days)
+    print(f"Loaded {len(rows)} completed trades from the last {args.days} days")
+
+    started = time.perf_counter()
+    results = run_backtest(group_by_pair(rows), args.data_dir, ladders,
+                           args.max_hours)
+    elapsed = time.perf_counter() - started
+
+    print(
+        f"\n{'Ladder (TP1/TP2/TP3/SL)':<26}{'Trades':>8}{'Win %':>8}{'SL':>6}{'BE':>6}{'TP3':>6}{'Pips':>10}{'Avg':>8}"
+    )
+    for ladder, stats in sorted(results.items(),
+                                key=lambda item: item[1]['total_pips'],
+                                reverse=True):
+        label = '/'.join(f"{p:g}" for p in ladder)
+        print(
+            f"{label:<26}{stats['trades']:>8}{stats['win_rate']:>7.1f}%{stats['losses']:>6}{stats['breakevens']:>6}{stats['tp3']:>6}{stats['total_pips']:>10.1f}{stats['avg_pips']:>8.1f}"
+        )
+    print(f"\n✅ {len(ladders)} ladders replayed in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,262 @@
+"""
+Index Benchmark - Check the hot-path queries against a seeded database
+
+Builds the full schema (schema_migrations) in a throwaway Postgres schema,
+seeds 1M userbot_dm_queue rows plus proportional member/join/trade history,
+then runs each hot query from dm_loop, trial_expiry_loop,
+peer_id_escalation_loop and /newmemberslist under EXPLAIN ANALYZE. Every
+query must use its expected index (no sequential scan of the table) and stay
+under its latency budget, and the dm_loop queries must stay inside the hot
+pending partition; the exit code is non-zero otherwise.
+
+Run against a scratch database, not production:
+    BENCH_DATABASE_URL=postgresql://... python bench_indexes.py --queue-rows 1000000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import ssl
+import statistics
+import sys
+from datetime import datetime, timedelta, timezone
+
+import asyncpg
+
+from schema_migrations import run_migrations
+
+BENCH_SCHEMA = "bench_indexes"
+
+# (name, sql, args builder, expected index, table that must not be seq-scanned, budget ms)
+HOT_QUERIES = [
+    ("dm_loop pending batch", """
+        SELECT id, user_id, message_text, label, created_at, retry_count, last_retry_at
+        FROM userbot_dm_queue
+        WHERE status = 'pending' AND abandoned = FALSE
+        ORDER BY created_at ASC LIMIT 10
+     """, lambda now: (), "idx_dm_queue_pending", "userbot_dm_queue", 2.0),
+    ("dm queue dedup", """
+        SELECT id FROM userbot_dm_queue
+        WHERE user_id = $1 AND label = $2 AND status = 'pending'
+     """, lambda now: (4242, "Trial Expired"), "idx_dm_queue_user_label",
+     "userbot_dm_queue", 2.0),
+    ("daily offer dedup", """
+        SELECT id FROM userbot_dm_queue
+        WHERE user_id = $1 AND label = 'Daily Trial Offer' AND created_at > $2
+     """, lambda now: (4242, now - timedelta(hours=23)),
+     "idx_dm_queue_user_label", "userbot_dm_queue", 2.0),
+    ("trial_expiry_loop expired", """
+        SELECT member_id, expiry_time FROM active_members WHERE expiry_time <= $1
+     """, lambda now: (now, ), "idx_active_members_expiry", "active_members",
+     5.0),
+    ("peer_id_escalation_loop pending", """
+        SELECT user_id, joined_at, peer_id_established, current_delay_minutes,
+               current_interval_minutes, next_check_at
+        FROM peer_id_checks
+        WHERE NOT peer_id_established AND welcome_dm_sent = FALSE
+        ORDER BY next_check_at ASC
+     """, lambda now: (), "idx_peer_id_checks_pending", "peer_id_checks", 5.0),
+    ("/newmemberslist joiners", """
+        SELECT user_id, joined_at FROM free_group_joins
+        WHERE joined_at >= $1 AND joined_at <= $2
+        ORDER BY joined_at DESC
+     """, lambda now: (now - timedelta(days=7), now),
+     "idx_free_group_joins_joined_at", "free_group_joins", 5.0),
+    ("/newmemberslist trials", """
+        SELECT member_id, role_added_time, expiry_time
+        FROM active_members
+        WHERE role_added_time >= $1 AND role_added_time <= $2
+        ORDER BY role_added_time DESC
+     """, lambda now: (now - timedelta(days=7), now),
+     "idx_active_members_role_added", "active_members", 5.0),
+    ("restore message_deleted trades", """
+        SELECT * FROM completed_trades WHERE completion_reason = $1
+     """, lambda now: ("message_deleted", ), "idx_completed_trades_reason",
+     "completed_trades", 5.0),
+]
+
+
+async def seed(conn, queue_rows: int):
+    """Fill the bench schema with a history-heavy, working-set-light dataset."""
+    members = max(queue_rows // 20, 1000)
+    await conn.execute(
+        """
+        INSERT INTO userbot_dm_queue (user_id, message_text, label, status, created_at, sent_at, abandoned)
+        SELECT g % $2,
+               'bench message',
+               (ARRAY['Welcome DM', 'Trial Started', '24h_warning', '3h_warning',
+                      'Trial Expired', 'Daily Trial Offer'])[1 + g % 6],
+               CASE WHEN g % 1000 = 0 THEN 'pending'
+                    WHEN g % 997 = 0 THEN 'abandoned'
+                    ELSE 'sent' END,
+               NOW() - (g || ' seconds')::interval * 30,
+               CASE WHEN g % 1000 = 0 THEN NULL ELSE NOW() - (g || ' seconds')::interval * 30 END,
+               g % 997 = 0
+        FROM generate_series(1, $1) g
+    """, queue_rows, members)
+    await conn.execute(
+        """
+        INSERT INTO active_members (member_id, role_added_time, role_id, guild_id, expiry_time)
+        SELECT g, NOW() - (g % 365 || ' days')::interval, 0, 0,
+               NOW() + (g % 365 || ' days')::interval - INTERVAL '1 hour'
+        FROM generate_series(1, $1) g
+    """, members)
+    await conn.execute(
+        """
+        INSERT INTO peer_id_checks (user_id, joined_at, peer_id_established, welcome_dm_sent, next_check_at)
+        SELECT g, NOW() - (g % 365 || ' days')::interval,
+               g % 100 <> 0, g % 100 <> 0,
+               NOW() + (g % 60 || ' minutes')::interval
+        FROM generate_series(1, $1) g
+    """, members * 4)
+    await conn.execute(
+        """
+        INSERT INTO free_group_joins (user_id, joined_at, discount_sent)
+        SELECT g, NOW() - (g % 730 || ' days')::interval, g % 3 = 0
+        FROM generate_series(1, $1) g
+    """, members * 4)
+    await conn.execute(
+        """
+        INSERT INTO completed_trades (message_id, channel_id, guild_id, pair, action, entry_price,
+                                      final_status, created_at, completion_reason)
+        SELECT 'bench_' || g, 0, 0, 'XAUUSD', 'BUY', 2000, 'completed',
+               NOW() - (g || ' minutes')::interval,
+               CASE WHEN g % 500 = 0 THEN 'message_deleted' ELSE 'sl_hit' END
+        FROM generate_series(1, $1) g
+    """, members)
+    await conn.execute("ANALYZE")
+
+
+# Queries that must stay inside one partition (the working set)
+HOT_PARTITIONS = {
+    "dm_loop pending batch": "userbot_dm_queue_pending",
+    "dm queue dedup": "userbot_dm_queue_pending",
+}
+
+RELATION_FAMILY_QUERY = """
+    WITH RECURSIVE family(oid) AS (
+        SELECT $1::regclass::oid
+        UNION ALL
+        SELECT i.inhrelid FROM pg_inherits i JOIN family f ON i.inhparent = f.oid
+    )
+    SELECT c.relname FROM pg_class c JOIN family f ON c.oid = f.oid
+"""
+
+
+async def relation_family(conn, name: str) -> set:
+    """A table or index plus all of its partitions (partition indexes get their own names)."""
+    return {
+        row['relname']
+        for row in await conn.fetch(RELATION_FAMILY_QUERY, name)
+    }
+
+
+def plan_nodes(node: dict):
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+async def check_query(conn, now, name, sql, build_args, index, table,
+                      budget_ms, runs):
+    args = build_args(now)
+    timings = []
+    plan = None
+    for _ in range(runs):
+        raw = await conn.fetchval(
+            f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", *args)
+        result = json.loads(raw)[0] if isinstance(raw, str) else raw[0]
+        plan = result["Plan"]
+        timings.append(result["Execution Time"])
+
+    nodes = list(plan_nodes(plan))
+    indexes = {n.get("Index Name") for n in nodes if n.get("Index Name")}
+    relations = {
+        n["Relation Name"]
+        for n in nodes if n.get("Relation Name")
+    }
+    tables = await relation_family(conn, table)
+    seq_scans = [
+        n for n in nodes
+        if n["Node Type"] == "Seq Scan" and n.get("Relation Name") in tables
+    ]
+    median_ms = statistics.median(timings)
+
+    problems = []
+    if not indexes & await relation_family(conn, index):
+        problems.append(
+            f"expected {index}, plan used {sorted(indexes) or 'no index'}")
+    if seq_scans:
+        problems.append(f"sequential scan on {table}")
+    hot_partition = HOT_PARTITIONS.get(name)
+    if hot_partition and relations - {hot_partition}:
+        problems.append(
+            f"touched {sorted(relations - {hot_partition})} outside {hot_partition}"
+        )
+    if median_ms > budget_ms:
+        problems.append(f"{median_ms:.2f}ms over {budget_ms:.1f}ms budget")
+    return median_ms, problems
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Assert plan shapes and latency of the hot-path queries")
+    parser.add_argument("--queue-rows", type=int, default=1_000_000)
+    parser.add_argument("--runs",
+                        type=int,
+                        default=5,
+                        help="EXPLAIN ANALYZE runs per query (median is used)")
+    parser.add_argument("--keep",
+                        action="store_true",
+                        help=f"Keep the {BENCH_SCHEMA} schema afterwards")
+    args = parser.parse_args()
+
+    # Deliberately not DATABASE_URL: the seed is far too heavy for production
+    database_url = os.getenv("BENCH_DATABASE_URL", "")
+    if not database_url:
+        raise SystemExit("BENCH_DATABASE_URL is not set")
+
+    ctx = ssl.create_default_context()
+    ctx.check_hostname = False
+    ctx.verify_mode = ssl.CERT_NONE
+
+    conn = await asyncpg.connect(database_url, ssl=ctx)
+    failed = 0
+    try:
+        await conn.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+        await conn.execute(f"CREATE SCHEMA {BENCH_SCHEMA}")
+        await conn.execute(f"SET search_path TO {BENCH_SCHEMA}")
+        await run_migrations(conn)
+        # Monthly history partitions for the seeded year, so nothing lands in DEFAULT
+        await conn.execute("""
+            SELECT ensure_month_partitions('userbot_dm_queue_done', NOW() - INTERVAL '12 months', NOW());
+            SELECT ensure_month_partitions('completed_trades', NOW() - INTERVAL '12 months', NOW());
+        """)
+
+        print(f"Seeding {args.queue_rows:,} queue rows...")
+        await seed(conn, args.queue_rows)
+
+        now = datetime.now(timezone.utc)
+        print(f"\n{'Query':<34}{'Median':>10}  Result")
+        for name, sql, build_args, index, table, budget_ms in HOT_QUERIES:
+            median_ms, problems = await check_query(conn, now, name, sql,
+                                                    build_args, index, table,
+                                                    budget_ms, args.runs)
+            status = "✅ " + index if not problems else "❌ " + "; ".join(
+                problems)
+            failed += bool(problems)
+            print(f"{name:<34}{median_ms:>8.2f}ms  {status}")
+    finally:
+        if not args.keep:
+            await conn.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+        await conn.close()
+
+    if failed:
+        print(f"\n❌ {failed} of {len(HOT_QUERIES)} queries failed")
+        sys.exit(1)
+    print(f"\n✅ All {len(HOT_QUERIES)} hot queries use their indexes")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
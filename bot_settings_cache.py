@@ -0,0 +1,111 @@
+"""
+Bot Settings Cache - Shared in-memory view of the bot_settings table
+
+Used by both the main bot and the userbot service. All settings are loaded
+once, reads are plain dict lookups, and writes go through to the database.
+A trigger on bot_settings (created in schema_migrations) fires
+pg_notify('bot_settings_changed', key) on every insert/update/delete, so a
+change made by either service (or by hand) is picked up by the other one
+immediately.
+"""
+
+import asyncio
+import logging
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+SETTINGS_CHANNEL = "bot_settings_changed"
+
+FALSE_VALUES = ('false', '0', 'off', 'no')
+
+
+class BotSettingsCache:
+
+    def __init__(self):
+        self.db_pool = None
+        self.values: Dict[str, str] = {}
+        self.listener = None
+        self.changed = asyncio.Queue()
+
+    async def attach(self, db_pool):
+        """Load every setting and start listening for changes."""
+        self.db_pool = db_pool
+        await self.reload()
+        if self.listener is None or self.listener.done():
+            self.listener = asyncio.create_task(self.listen_loop())
+
+    async def reload(self, key: Optional[str] = None):
+        async with self.db_pool.acquire() as conn:
+            if key is None:
+                rows = await conn.fetch(
+                    "SELECT setting_key, setting_value FROM bot_settings")
+                self.values = {
+                    row['setting_key']: row['setting_value']
+                    for row in rows
+                }
+                return
+            value = await conn.fetchval(
+                "SELECT setting_value FROM bot_settings WHERE setting_key = $1",
+                key)
+        if value is None:
+            self.values.pop(key, None)
+        else:
+            self.values[key] = value
+
+    async def listen_loop(self):
+        """Hold one LISTEN connection; refresh changed keys, full reload after reconnects."""
+
+        def on_notify(connection, pid, channel, payload):
+            self.changed.put_nowait(payload)
+
+        while True:
+            try:
+                async with self.db_pool.acquire('listen') as conn:
+                    await conn.add_listener(SETTINGS_CHANNEL, on_notify)
+                    # Anything changed while we were not listening
+                    await self.reload()
+                    try:
+                        while not conn.is_closed():
+                            try:
+                                key = await asyncio.wait_for(
+                                    self.changed.get(), timeout=60)
+                            except asyncio.TimeoutError:
+                                continue
+                            await self.reload(key)
+                    finally:
+                        if not conn.is_closed():
+                            await conn.remove_listener(SETTINGS_CHANNEL,
+                                                       on_notify)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Settings listener error: {e}")
+                await asyncio.sleep(10)
+
+    def get_str(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        return self.values.get(key, default)
+
+    def get_bool(self, key: str, default: bool = False) -> bool:
+        value = self.values.get(key)
+        if value is None:
+            return default
+        return value.strip().lower() not in FALSE_VALUES
+
+    def get_int(self, key: str, default: int = 0) -> int:
+        try:
+            return int(self.values[key])
+        except (KeyError, TypeError, ValueError):
+            return default
+
+    async def set(self, key: str, value) -> None:
+        """Write a setting through to the database and the local cache."""
+        value = str(value).lower() if isinstance(value, bool) else str(value)
+        async with self.db_pool.acquire() as conn:
+            await conn.execute(
+                """
+                INSERT INTO bot_settings (setting_key, setting_value)
+                VALUES ($1, $2)
+                ON CONFLICT (setting_key) DO UPDATE SET setting_value = EXCLUDED.setting_value
+            """, key, value)
+        self.values[key] = value
@@ -0,0 +1,248 @@
+"""
+DB Access - Sized, budgeted asyncpg pool shared by both services
+
+BudgetedPool wraps asyncpg.create_pool with:
+- explicit pool sizing per service (DB_POOL_CONFIG)
+- per-subsystem connection budgets: acquire('price') can only be held by the
+  price engine, so a slow admin query or a burst of general work can never
+  take the last connection away from TP/SL persistence
+- named prepared statements for the hottest queries (PREPARED_QUERIES),
+  prepared once per connection and reused
+- metrics: pool wait time per subsystem and latency per named query
+
+It is a drop-in for the plain pool: `async with db_pool.acquire() as conn`
+uses the 'general' budget.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+# Budgets add up to max_size, so every subsystem's share is always available
+DB_POOL_CONFIG = {
+    "main_bot": {
+        "min_size": 2,
+        "max_size": 12,
+        "budgets": {
+            "price": 3,  # TP/SL persistence and heartbeat
+            "admin": 2,  # owner commands (/newmemberslist, /memberdatabase)
+            "listen": 2,  # LISTEN connections held for service events/settings
+            "leader": 1,  # session holding the leader election lock
+            "general": 4,
+        },
+    },
+    "userbot": {
+        "min_size": 1,
+        "max_size": 6,
+        "budgets": {
+            "dm": 2,  # dm_loop queue processing
+            "reactions": 1,  # reaction buffer flushes
+            "listen": 1,  # bot_settings LISTEN connection
+            "general": 2,
+        },
+    },
+}
+
+POOL_SETTINGS = {
+    "command_timeout": 60,
+    "max_inactive_connection_lifetime": 300,
+    "statement_cache_size": 200,  # asyncpg's own cache for ad-hoc SQL
+}
+
+PREPARED_QUERIES = {
+    # Userbot dm_loop
+    "dm_pending_batch": """
+        SELECT id, user_id, message_text, label, created_at, retry_count, last_retry_at
+        FROM userbot_dm_queue
+        WHERE status = 'pending' AND abandoned = FALSE
+        ORDER BY created_at ASC LIMIT 10
+    """,
+    "dm_mark_sent": """
+        UPDATE userbot_dm_queue
+        SET status = 'sent', sent_at = $1::timestamptz
+        WHERE id = $2::integer AND status = 'pending'
+    """,
+    "dm_mark_retry": """
+        UPDATE userbot_dm_queue
+        SET retry_count = retry_count + 1, last_retry_at = $1::timestamptz
+        WHERE id = $2::integer AND status = 'pending'
+    """,
+    "dm_abandon": """
+        UPDATE userbot_dm_queue SET abandoned = TRUE, status = 'abandoned'
+        WHERE id = $1 AND status = 'pending'
+    """,
+    "member_expiry":
+    "SELECT expiry_time FROM active_members WHERE member_id = $1",
+    # Main bot price engine
+    "trade_event": """
+        INSERT INTO trade_events (message_id, event_type, price, status, detail)
+        VALUES ($1, $2, $3, $4, $5)
+    """,
+    "trade_delete": "DELETE FROM active_trades WHERE message_id = $1",
+    "price_heartbeat": """
+        INSERT INTO bot_status (status_key, status_value)
+        VALUES ('price_check_heartbeat', $1)
+        ON CONFLICT (status_key) DO UPDATE SET status_value = $1
+    """,
+    # Main bot background loops
+    "expired_members":
+    "SELECT member_id, expiry_time FROM active_members WHERE expiry_time <= $1",
+    "peer_checks_pending": """
+        SELECT user_id, joined_at, peer_id_established, current_delay_minutes,
+               current_interval_minutes, next_check_at
+        FROM peer_id_checks
+        WHERE NOT peer_id_established AND welcome_dm_sent = FALSE
+        ORDER BY next_check_at ASC
+    """,
+}
+
+
+class _LatencyStats:
+
+    def __init__(self):
+        self.count = 0
+        self.samples = deque(maxlen=500)
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.samples.append(seconds)
+
+    def summary(self) -> Dict:
+        if not self.samples:
+            return {"count": self.count}
+        ordered = sorted(self.samples)
+        return {
+            "count": self.count,
+            "avg_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+            "p95_ms": round(
+                ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] *
+                1000, 2),
+            "max_ms": round(ordered[-1] * 1000, 2),
+        }
+
+
+class PreparedConnection(asyncpg.Connection):
+    """asyncpg connection that keeps the named hot queries prepared."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.named_statements = {}
+        self.query_stats = None
+
+    async def _named(self, name: str):
+        statement = self.named_statements.get(name)
+        if statement is None:
+            statement = await self.prepare(PREPARED_QUERIES[name])
+            self.named_statements[name] = statement
+        return statement
+
+    async def _run_named(self, name: str, method: str, args: tuple):
+        started = time.monotonic()
+        try:
+            statement = await self._named(name)
+            try:
+                return await getattr(statement, method)(*args)
+            except asyncpg.exceptions.InvalidCachedStatementError:
+                # Schema changed under the statement (e.g. a migration); re-prepare once
+                self.named_statements.pop(name, None)
+                statement = await self._named(name)
+                return await getattr(statement, method)(*args)
+        finally:
+            if self.query_stats is not None:
+                self.query_stats.setdefault(
+                    name, _LatencyStats()).add(time.monotonic() - started)
+
+    async def fetch_named(self, name: str, *args):
+        return await self._run_named(name, "fetch", args)
+
+    async def fetchrow_named(self, name: str, *args):
+        return await self._run_named(name, "fetchrow", args)
+
+    async def fetchval_named(self, name: str, *args):
+        return await self._run_named(name, "fetchval", args)
+
+    async def execute_named(self, name: str, *args):
+        """Run a named write; prepared statements return rows, so this returns nothing."""
+        await self._run_named(name, "fetch", args)
+
+
+class BudgetedPool:
+
+    def __init__(self, service: str, config: Optional[Dict] = None):
+        self.service = service
+        self.config = dict(DB_POOL_CONFIG[service], **(config or {}))
+        self.pool = None
+        self.budgets = {
+            name: asyncio.Semaphore(size)
+            for name, size in self.config["budgets"].items()
+        }
+        self.in_use = {name: 0 for name in self.budgets}
+        self.wait_stats = {name: _LatencyStats() for name in self.budgets}
+        self.query_stats = {}
+
+    async def connect(self, dsn: str, **kwargs):
+        """Create the underlying pool; extra kwargs go to asyncpg.create_pool."""
+
+        async def init(conn):
+            conn.query_stats = self.query_stats
+
+        settings = dict(POOL_SETTINGS, **kwargs)
+        self.pool = await asyncpg.create_pool(
+            dsn,
+            min_size=self.config["min_size"],
+            max_size=self.config["max_size"],
+            connection_class=PreparedConnection,
+            init=init,
+            **settings)
+        logger.info(
+            f"Database pool ready for {self.service} "
+            f"(max {self.config['max_size']}, budgets {self.config['budgets']})"
+        )
+        return self
+
+    @asynccontextmanager
+    async def acquire(self, subsystem: str = "general"):
+        """Hold one connection from the subsystem's budget for the whole block."""
+        if subsystem not in self.budgets:
+            subsystem = "general"
+        started = time.monotonic()
+        async with self.budgets[subsystem]:
+            async with self.pool.acquire() as conn:
+                self.wait_stats[subsystem].add(time.monotonic() - started)
+                self.in_use[subsystem] += 1
+                try:
+                    yield conn
+                finally:
+                    self.in_use[subsystem] -= 1
+
+    async def close(self):
+        if self.pool:
+            await self.pool.close()
+
+    def metrics(self) -> Dict:
+        if not self.pool:
+            return {}
+        return {
+            "size": self.pool.get_size(),
+            "idle": self.pool.get_idle_size(),
+            "max_size": self.config["max_size"],
+            "subsystems": {
+                name: {
+                    "budget": self.config["budgets"][name],
+                    "in_use": self.in_use[name],
+                    "wait": self.wait_stats[name].summary(),
+                }
+                for name in self.budgets
+            },
+            "queries": {
+                name: stats.summary()
+                for name, stats in self.query_stats.items()
+            },
+        }
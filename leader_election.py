@@ -0,0 +1,126 @@
+"""
+Leader Election - One active signal engine across main-bot replicas
+
+Every replica connects to Telegram and handles updates, but the singleton
+loops (price tracking, notification outbox, peer escalation, service events,
+ladder refresh, partition retention) only run on the leader.
+
+The leader holds a session-level Postgres advisory lock on a dedicated
+connection from the 'leader' pool budget. If the process dies or its
+connection drops, Postgres releases the lock and a standby takes over on its
+next heartbeat, a few seconds later.
+
+Each election bumps leader_lease.epoch (schema migration 9), which is the
+fencing token. Writes made by leader-only work call fence() inside their
+transaction: it share-locks the lease row and raises FencedOut if another
+replica has been elected since, so a stalled former leader can never commit
+a late hit or claim outbox rows.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# pg_try_advisory_lock key held by the current leader
+LEADER_LOCK_KEY = 724_049
+
+LEADER_ELECTION_CONFIG = {
+    "heartbeat": 2.0,  # seconds between lock attempts / liveness checks
+    "heartbeat_timeout": 5.0,  # a slower check means the session is gone
+}
+
+BUMP_EPOCH_QUERY = """
+    INSERT INTO leader_lease (name, epoch, holder, acquired_at)
+    VALUES ($1, 1, $2, NOW())
+    ON CONFLICT (name) DO UPDATE
+    SET epoch = leader_lease.epoch + 1, holder = $2, acquired_at = NOW()
+    RETURNING epoch
+"""
+
+
+class FencedOut(Exception):
+    """A newer leader has been elected; the current write must not commit."""
+
+
+class LeaderElection:
+
+    def __init__(self,
+                 db_pool,
+                 name: str,
+                 on_elected: Callable[[int], Awaitable],
+                 on_demoted: Callable[[], Awaitable],
+                 config: Optional[dict] = None):
+        self.db_pool = db_pool
+        self.name = name
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.config = dict(LEADER_ELECTION_CONFIG, **(config or {}))
+        self.holder = f"{socket.gethostname()}:{os.getpid()}"
+        self.epoch = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self.epoch is not None
+
+    async def run(self):
+        """Campaign forever; each lost session steps down and starts over."""
+        while True:
+            try:
+                async with self.db_pool.acquire('leader') as conn:
+                    await self.campaign(conn)
+            except asyncio.CancelledError:
+                await self.step_down()
+                raise
+            except Exception as e:
+                logger.error(f"Leader election session lost: {e}")
+            await self.step_down()
+            await asyncio.sleep(self.config["heartbeat"])
+
+    async def campaign(self, conn):
+        while True:
+            if not self.is_leader:
+                if await conn.fetchval("SELECT pg_try_advisory_lock($1)",
+                                       LEADER_LOCK_KEY):
+                    self.epoch = await conn.fetchval(BUMP_EPOCH_QUERY,
+                                                     self.name, self.holder)
+                    logger.info(
+                        f"👑 {self.holder} elected {self.name} leader (epoch {self.epoch})"
+                    )
+                    await self.on_elected(self.epoch)
+            else:
+                await asyncio.wait_for(conn.fetchval("SELECT 1"),
+                                       self.config["heartbeat_timeout"])
+            await asyncio.sleep(self.config["heartbeat"])
+
+    async def step_down(self):
+        if not self.is_leader:
+            return
+        logger.warning(
+            f"⚠️ {self.holder} stepping down as {self.name} leader (epoch {self.epoch})"
+        )
+        self.epoch = None
+        try:
+            await self.on_demoted()
+        except Exception as e:
+            logger.error(f"Error stopping leader work: {e}")
+
+    async def fence(self, conn):
+        """Call inside a transaction; raises FencedOut unless we are still the leader."""
+        current = await conn.fetchval(
+            "SELECT epoch FROM leader_lease WHERE name = $1 FOR SHARE",
+            self.name)
+        if self.epoch is None or current != self.epoch:
+            raise FencedOut(
+                f"{self.holder} fenced out: epoch {self.epoch}, current {current}"
+            )
+
+    def metrics(self) -> dict:
+        return {
+            "is_leader": self.is_leader,
+            "epoch": self.epoch,
+            "holder": self.holder
+        }
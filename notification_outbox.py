@@ -0,0 +1,119 @@
+"""
+Notification Outbox - Durable TP/SL/breakeven replies
+
+The price engine no longer sends trade notifications itself. The hit (trade
+event or closing transaction) and its reply are written to
+notification_outbox in the same transaction (schema migration 8), and the
+main bot's notification_outbox_loop drains the outbox concurrently through
+the send scheduler:
+- a restart or FloodWait mid-send leaves the row pending, so it is retried
+- message_id is the channel post replied to (chat_id_msgid) and
+  (message_id, label) is unique, so a hit queues one reply per linked post
+- rows are claimed with FOR UPDATE SKIP LOCKED and marked sent with the
+  Telegram message id; a claim older than stale_claim seconds (process died
+  between send and mark) is picked up again
+
+Failed sends back off exponentially and stop after max_attempts. The rest of
+that chat's batch is released with the same backoff, so replies keep their
+order.
+"""
+
+from typing import List, Optional
+
+NOTIFICATION_OUTBOX_CONFIG = {
+    "poll_interval": 5,  # seconds; enqueues also wake the sender directly
+    "batch_size": 20,
+    "max_attempts": 8,
+    "retry_base": 10,  # seconds, doubled per failed attempt
+    "retry_max": 900,
+    "stale_claim": 300,
+    "keep_sent_days": 30,  # sent rows are purged by the daily retention run
+}
+
+ENQUEUE_QUERY = """
+    INSERT INTO notification_outbox (message_id, label, chat_id, reply_to, text)
+    VALUES ($1, $2, $3, $4, $5)
+    ON CONFLICT (message_id, label) DO NOTHING
+    RETURNING id
+"""
+
+CLAIM_QUERY = """
+    UPDATE notification_outbox
+    SET status = 'sending', claimed_at = NOW(), attempts = attempts + 1
+    WHERE id IN (
+        SELECT id FROM notification_outbox
+        WHERE (status = 'pending' AND next_attempt_at <= NOW())
+           OR (status = 'sending' AND claimed_at < NOW() - make_interval(secs => $2))
+        ORDER BY id
+        LIMIT $1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, message_id, label, chat_id, reply_to, text, attempts
+"""
+
+
+async def enqueue_notification(conn, message_id: str, label: str,
+                               chat_id: int, reply_to: Optional[int],
+                               text: str) -> bool:
+    """Queue a reply inside the caller's transaction; False if already queued."""
+    return await conn.fetchval(ENQUEUE_QUERY, message_id, label, chat_id,
+                               reply_to, text) is not None
+
+
+async def claim_notifications(conn, limit: int,
+                              stale_claim: int) -> List:
+    return await conn.fetch(CLAIM_QUERY, limit, float(stale_claim))
+
+
+async def mark_sent(conn, outbox_id: int, sent_message_id: Optional[int]):
+    await conn.execute(
+        """
+        UPDATE notification_outbox
+        SET status = 'sent', sent_at = NOW(), sent_message_id = $2, last_error = NULL
+        WHERE id = $1
+    """, outbox_id, sent_message_id)
+
+
+async def mark_failed(conn, outbox_id: int, attempts: int, error: str,
+                      limits: Optional[dict] = None) -> bool:
+    """Schedule a retry with backoff; returns False once attempts are used up."""
+    limits = dict(NOTIFICATION_OUTBOX_CONFIG, **(limits or {}))
+    retry = attempts < limits["max_attempts"]
+    delay = min(limits["retry_base"] * 2**(attempts - 1), limits["retry_max"])
+    await conn.execute(
+        """
+        UPDATE notification_outbox
+        SET status = $2, last_error = $3,
+            next_attempt_at = NOW() + make_interval(secs => $4)
+        WHERE id = $1
+    """, outbox_id, 'pending' if retry else 'failed', error[:500],
+        float(delay))
+    return retry
+
+
+async def release_after(conn, outbox_ids: List[int], failed_id: int):
+    """Hand claimed rows back unsent, due no earlier than failed_id's retry.
+
+    Used when an earlier reply to the same chat failed, so TP2 never goes out
+    ahead of TP1. The claim's attempt is not counted against these rows.
+    """
+    await conn.execute(
+        """
+        UPDATE notification_outbox
+        SET status = 'pending', claimed_at = NULL,
+            attempts = GREATEST(attempts - 1, 0),
+            next_attempt_at = GREATEST(
+                next_attempt_at,
+                (SELECT next_attempt_at FROM notification_outbox WHERE id = $2))
+        WHERE id = ANY($1::bigint[]) AND status = 'sending'
+    """, outbox_ids, failed_id)
+
+
+async def purge_sent(conn, days: int) -> int:
+    """Delete sent notifications older than `days`; returns the row count."""
+    result = await conn.execute(
+        """
+        DELETE FROM notification_outbox
+        WHERE status = 'sent' AND sent_at < NOW() - make_interval(days => $1)
+    """, days)
+    return int(result.split()[-1])
@@ -0,0 +1,124 @@
+"""
+Partition Retention - Monthly partition upkeep for the history tables
+
+userbot_dm_queue_done (sent/abandoned DMs), completed_trades and trade_events
+are range partitioned by month of created_at (schema migrations 6 and 7).
+run_retention():
+- creates the partitions for the coming months, so inserts never land in
+  the DEFAULT partition
+- exports partitions older than the retention window as gzipped CSV to
+  PARTITION_ARCHIVE_DIR (when set), then detaches and drops them
+
+DM history is dropped after its window even without an archive directory.
+Trade history feeds backtests and stats, so completed_trades and
+trade_events partitions are only dropped once they have been exported.
+"""
+
+import gzip
+import logging
+import os
+import re
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# pg_try_advisory_lock key, so only one process runs retention at a time
+RETENTION_LOCK_KEY = 724_043
+
+PARTITION_RETENTION = {
+    "interval": 86400,  # seconds between runs
+    "months_ahead": 2,  # future monthly partitions kept ready
+    "archive_dir": os.getenv("PARTITION_ARCHIVE_DIR", ""),
+}
+
+# parent table -> (months kept online, export required before dropping)
+PARTITIONED_TABLES = {
+    "userbot_dm_queue_done": (3, False),
+    "completed_trades": (24, True),
+    "trade_events": (24, True),
+}
+
+PARTITION_NAME = re.compile(r"_y(\d{4})m(\d{2})$")
+
+
+def month_index(year: int, month: int) -> int:
+    return year * 12 + month - 1
+
+
+async def list_month_partitions(conn, parent: str) -> List[tuple]:
+    """Return (partition name, year, month) for every monthly partition of parent."""
+    rows = await conn.fetch(
+        """
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = $1::regclass
+    """, parent)
+    partitions = []
+    for row in rows:
+        match = PARTITION_NAME.search(row['relname'])
+        if match:
+            partitions.append(
+                (row['relname'], int(match.group(1)), int(match.group(2))))
+    return sorted(partitions, key=lambda p: (p[1], p[2]))
+
+
+async def export_partition(conn, partition: str, archive_dir: str) -> str:
+    """COPY a partition out to <archive_dir>/<partition>.csv.gz."""
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{partition}.csv.gz")
+    with gzip.open(path, "wb") as archive:
+
+        async def write(chunk):
+            archive.write(chunk)
+
+        await conn.copy_from_table(partition,
+                                   output=write,
+                                   format="csv",
+                                   header=True)
+    return path
+
+
+async def run_retention(conn, limits: Optional[Dict] = None) -> Dict:
+    """Create upcoming partitions and retire expired ones; returns a summary."""
+    limits = dict(PARTITION_RETENTION, **(limits or {}))
+    summary = {"created": 0, "archived": [], "dropped": [], "kept": []}
+
+    if not await conn.fetchval("SELECT pg_try_advisory_lock($1)",
+                               RETENTION_LOCK_KEY):
+        return summary
+    try:
+        now = datetime.now(timezone.utc)
+        current = month_index(now.year, now.month)
+
+        for parent, (keep_months,
+                     export_required) in PARTITIONED_TABLES.items():
+            summary["created"] += await conn.fetchval(
+                "SELECT ensure_month_partitions($1, NOW(), NOW() + make_interval(months => $2))",
+                parent, limits["months_ahead"])
+
+            for partition, year, month in await list_month_partitions(
+                    conn, parent):
+                if current - month_index(year, month) < keep_months:
+                    continue
+
+                if limits["archive_dir"]:
+                    path = await export_partition(conn, partition,
+                                                  limits["archive_dir"])
+                    summary["archived"].append(path)
+                elif export_required:
+                    summary["kept"].append(partition)
+                    continue
+
+                async with conn.transaction():
+                    await conn.execute(
+                        f'ALTER TABLE "{parent}" DETACH PARTITION "{partition}"'
+                    )
+                    await conn.execute(f'DROP TABLE "{partition}"')
+                summary["dropped"].append(partition)
+                logger.info(f"🗄️ Retired partition {partition}")
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1)",
+                           RETENTION_LOCK_KEY)
+    return summary
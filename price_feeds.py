@@ -0,0 +1,427 @@
+"""
+Price Feeds - Live quotes from the FX, metals and crypto price APIs
+
+PriceFeeds holds the quote logic for the main bot's price engine: provider
+order per pair (metals, indices and crypto try the secondary feed first),
+per-pair lookups with fallback, and batched lookups that hit each provider
+once per base currency. It only depends on the price config, so the
+price_shards worker processes build their own instance from
+worker_config() without loading the bot.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from typing import Dict, List, Optional
+
+import aiohttp
+from aiohttp import ClientTimeout
+
+import signal_replay
+
+logger = logging.getLogger(__name__)
+
+# PRICE_TRACKING_CONFIG keys a feed needs (everything but the trades themselves)
+FEED_CONFIG_KEYS = [
+    "api_keys", "api_endpoints", "api_priority_order", "secondary_feed_pairs",
+    "secondary_api_priority_order", "max_concurrent_quote_requests"
+]
+
+
+class PriceFeeds:
+
+    def __init__(self, config: dict, pair_config: Optional[dict] = None):
+        self.config = config
+        self.pair_config = pair_config or {}
+
+    def worker_config(self, shares: int = 1) -> tuple:
+        """Picklable (config, pair_config) for building a feed in another process.
+
+        With shares > 1 each copy gets an equal slice of the quote concurrency
+        budget (at least one request), so the workers together stay within it.
+        """
+        config = {
+            key: self.config[key]
+            for key in FEED_CONFIG_KEYS if key in self.config
+        }
+        config['max_concurrent_quote_requests'] = max(
+            1,
+            self.config.get('max_concurrent_quote_requests', 5) // shares)
+        return config, self.pair_config
+
+    def get_api_order(self, pair_clean: str) -> List[str]:
+        """Metals, indices and crypto try the secondary feed first, then the FX APIs"""
+        if pair_clean in self.config['secondary_feed_pairs']:
+            return self.config[
+                'secondary_api_priority_order'] + self.config[
+                    'api_priority_order']
+        return list(self.config['api_priority_order'])
+
+    def has_secondary_feed(self) -> bool:
+        api_keys = self.config['api_keys']
+        return any(
+            api_keys.get(f"{api_name}_key")
+            for api_name in self.config['secondary_api_priority_order'])
+
+    async def get_working_api_for_pair(self, pair: str) -> str:
+        pair_clean = pair.upper().replace("/",
+                                          "").replace("-",
+                                                      "").replace("_", "")
+
+        for api_name in self.get_api_order(pair_clean):
+            try:
+                api_key = self.config['api_keys'].get(
+                    f"{api_name}_key")
+                if not api_key:
+                    continue
+
+                price = await self.get_price_from_api(api_name, pair_clean)
+                if price is not None:
+                    logger.info(
+                        f"API assignment: {pair_clean} will use {api_name}")
+                    return api_name
+            except Exception as e:
+                logger.warning(
+                    f"{api_name} failed for {pair_clean}: {str(e)[:100]}")
+                continue
+
+        logger.warning(
+            f"All APIs failed for {pair_clean}, defaulting to currencybeacon")
+        return "currencybeacon"
+
+    async def get_live_price(self, pair: str) -> Optional[float]:
+        pair_clean = pair.upper().replace("/",
+                                          "").replace("-",
+                                                      "").replace("_", "")
+
+        for api_name in self.get_api_order(pair_clean):
+            try:
+                price = await self.get_price_from_api(api_name, pair_clean)
+                if price:
+                    return price
+            except Exception as e:
+                logger.error(f"Error getting price from {api_name}: {e}")
+                continue
+
+        return None
+
+    async def get_live_price_with_fallback(
+            self,
+            pair: str,
+            assigned_api: Optional[str] = None) -> Optional[float]:
+        """Get live price - try assigned API first, then fallback to all APIs if assigned fails"""
+        pair_clean = pair.upper().replace("/",
+                                          "").replace("-",
+                                                      "").replace("_", "")
+
+        priority = self.get_api_order(pair_clean)
+
+        # If an API is already assigned to this trade, try that first
+        search_order = priority.copy()
+        if assigned_api and assigned_api in search_order:
+            search_order.remove(assigned_api)
+            search_order.insert(0, assigned_api)
+
+        for api_name in search_order:
+            try:
+                price = await self.get_price_from_api(api_name, pair_clean)
+                if price is not None:
+                    return price
+            except Exception as e:
+                logger.debug(f"Price fallback error for {api_name}: {e}")
+                continue
+
+        return None
+
+    def split_quote_pair(self, pair: str) -> Optional[tuple]:
+        """Split a cleaned pair into (base, quote) the same way get_price_from_api does"""
+        if pair.startswith("XAU") or pair.startswith("XAG"):
+            return pair[:3], pair[3:]
+        if len(pair) == 6:
+            return pair[:3], pair[3:]
+        return None
+
+    async def get_prices_from_api_batch(self, session: aiohttp.ClientSession,
+                                        api_name: str, base: str,
+                                        quotes: List[str]) -> Dict[str, float]:
+        """Fetch several quote currencies against one base in a single request"""
+        api_keys = self.config['api_keys']
+        rates = {}
+
+        try:
+            if api_name == "currencybeacon":
+                key = api_keys.get('currencybeacon_key')
+                if not key:
+                    return rates
+
+                url = f"https://api.currencybeacon.com/v1/latest?api_key={key}&base={base}&symbols={','.join(quotes)}"
+                async with session.get(
+                        url, timeout=ClientTimeout(total=10)) as response:
+                    if response.status == 200:
+                        data = await response.json()
+                        source = data.get('rates') or {}
+                        for quote in quotes:
+                            if quote in source:
+                                rates[quote] = float(source[quote])
+
+            elif api_name == "exchangerate_api":
+                key = api_keys.get('exchangerate_api_key')
+                if not key or base in ("XAU", "XAG"):
+                    return rates
+
+                # The latest endpoint returns every conversion rate for the base
+                url = f"https://v6.exchangerate-api.com/v6/{key}/latest/{base}"
+                async with session.get(
+                        url, timeout=ClientTimeout(total=10)) as response:
+                    if response.status == 200:
+                        data = await response.json()
+                        source = data.get('conversion_rates') or {}
+                        for quote in quotes:
+                            if quote in source:
+                                rates[quote] = float(source[quote])
+
+            elif api_name == "currencylayer":
+                key = api_keys.get('currencylayer_key')
+                if not key or base in ("XAU", "XAG"):
+                    return rates
+
+                url = f"https://api.currencylayer.com/live?access_key={key}&currencies={','.join(quotes)}&source={base}"
+                async with session.get(
+                        url, timeout=ClientTimeout(total=10)) as response:
+                    if response.status == 200:
+                        data = await response.json()
+                        if data.get('success') and 'quotes' in data:
+                            for quote in quotes:
+                                rate_key = f"{base}{quote}"
+                                if rate_key in data['quotes']:
+                                    rates[quote] = float(
+                                        data['quotes'][rate_key])
+
+            elif api_name == "abstractapi":
+                key = api_keys.get('abstractapi_key')
+                if not key or base in ("XAU", "XAG"):
+                    return rates
+
+                url = f"https://exchange-rates.abstractapi.com/v1/live?api_key={key}&base={base}&target={','.join(quotes)}"
+                async with session.get(
+                        url, timeout=ClientTimeout(total=10)) as response:
+                    if response.status == 200:
+                        data = await response.json()
+                        source = data.get('exchange_rates') or {}
+                        for quote in quotes:
+                            if quote in source:
+                                rates[quote] = float(source[quote])
+
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Timeout getting batched prices from {api_name} for {base}")
+        except Exception as e:
+            logger.error(f"Error with batched {api_name} for {base}: {e}")
+
+        return rates
+
+    async def get_live_prices(self, pairs: List[str]) -> Dict[str, float]:
+        """Get live prices for many pairs at once.
+
+        Pairs are grouped by base currency so every provider is hit once per base
+        instead of once per trade; pairs a provider misses fall through to the next
+        provider in api_priority_order, exactly like get_live_price does per pair.
+        """
+        remaining = set()
+        secondary = set()
+        for pair in pairs:
+            pair_clean = pair.upper().replace("/", "").replace("-",
+                                                               "").replace(
+                                                                   "_", "")
+            if pair_clean in self.config['secondary_feed_pairs']:
+                secondary.add(pair_clean)
+            elif self.split_quote_pair(pair_clean):
+                remaining.add(pair_clean)
+
+        prices = {}
+
+        # Only a handful of metals/indices/crypto exist, so they are quoted per pair
+        if secondary:
+            secondary_pairs = sorted(secondary)
+            secondary_prices = await asyncio.gather(
+                *[self.get_live_price(pair) for pair in secondary_pairs],
+                return_exceptions=True)
+            for pair_clean, price in zip(secondary_pairs, secondary_prices):
+                if price and not isinstance(price, Exception):
+                    prices[pair_clean] = price
+
+        if not remaining:
+            return prices
+
+        limiter = asyncio.Semaphore(
+            self.config.get('max_concurrent_quote_requests', 5))
+
+        async with aiohttp.ClientSession() as session:
+
+            async def fetch_base(api_name: str, base: str,
+                                 quotes: List[str]) -> tuple:
+                async with limiter:
+                    return base, await self.get_prices_from_api_batch(
+                        session, api_name, base, quotes)
+
+            for api_name in self.config['api_priority_order']:
+                if not remaining:
+                    break
+                if not self.config['api_keys'].get(
+                        f"{api_name}_key"):
+                    continue
+
+                by_base = {}
+                for pair_clean in remaining:
+                    base, quote = self.split_quote_pair(pair_clean)
+                    by_base.setdefault(base, []).append(quote)
+
+                results = await asyncio.gather(*[
+                    fetch_base(api_name, base, sorted(quotes))
+                    for base, quotes in by_base.items()
+                ])
+
+                for base, rates in results:
+                    for quote, price in rates.items():
+                        if price:
+                            prices[f"{base}{quote}"] = price
+                            remaining.discard(f"{base}{quote}")
+
+        if remaining:
+            logger.warning(
+                f"No batched price available for: {', '.join(sorted(remaining))}"
+            )
+
+        return prices
+
+    async def get_price_from_api(self, api_name: str,
+                                 pair: str) -> Optional[float]:
+        api_keys = self.config['api_keys']
+
+        try:
+            if api_name == "currencybeacon":
+                key = api_keys.get('currencybeacon_key')
+                if not key:
+                    return None
+
+                if pair.startswith("XAU"):
+                    base, quote = "XAU", pair[3:]
+                elif pair.startswith("XAG"):
+                    base, quote = "XAG", pair[3:]
+                elif len(pair) == 6:
+                    base, quote = pair[:3], pair[3:]
+                else:
+                    return None
+
+                url = f"https://api.currencybeacon.com/v1/latest?api_key={key}&base={base}&symbols={quote}"
+
+                async with aiohttp.ClientSession() as session:
+                    async with session.get(
+                            url, timeout=ClientTimeout(total=10)) as response:
+                        if response.status == 200:
+                            data = await response.json()
+                            if 'rates' in data and quote in data['rates']:
+                                return float(data['rates'][quote])
+
+            elif api_name == "exchangerate_api":
+                key = api_keys.get('exchangerate_api_key')
+                if not key:
+                    return None
+
+                if len(pair) == 6:
+                    base, quote = pair[:3], pair[3:]
+                else:
+                    return None
+
+                url = f"https://v6.exchangerate-api.com/v6/{key}/pair/{base}/{quote}"
+
+                async with aiohttp.ClientSession() as session:
+                    async with session.get(
+                            url, timeout=ClientTimeout(total=10)) as response:
+                        if response.status == 200:
+                            data = await response.json()
+                            if 'conversion_rate' in data:
+                                return float(data['conversion_rate'])
+
+            elif api_name == "currencylayer":
+                key = api_keys.get('currencylayer_key')
+                if not key:
+                    return None
+
+                if len(pair) == 6:
+                    base, quote = pair[:3], pair[3:]
+                else:
+                    return None
+
+                url = f"https://api.currencylayer.com/live?access_key={key}&currencies={quote}&source={base}"
+
+                async with aiohttp.ClientSession() as session:
+                    async with session.get(
+                            url, timeout=ClientTimeout(total=10)) as response:
+                        if response.status == 200:
+                            data = await response.json()
+                            if data.get('success') and 'quotes' in data:
+                                rate_key = f"{base}{quote}"
+                                if rate_key in data['quotes']:
+                                    return float(data['quotes'][rate_key])
+
+            elif api_name == "abstractapi":
+                key = api_keys.get('abstractapi_key')
+                if not key:
+                    return None
+
+                if len(pair) == 6:
+                    base, quote = pair[:3], pair[3:]
+                else:
+                    return None
+
+                url = f"https://exchange-rates.abstractapi.com/v1/live?api_key={key}&base={base}&target={quote}"
+
+                async with aiohttp.ClientSession() as session:
+                    async with session.get(
+                            url, timeout=ClientTimeout(total=10)) as response:
+                        if response.status == 200:
+                            data = await response.json()
+                            if 'exchange_rates' in data and quote in data[
+                                    'exchange_rates']:
+                                return float(data['exchange_rates'][quote])
+
+            elif api_name == "twelvedata":
+                key = api_keys.get('twelvedata_key')
+                if not key:
+                    return None
+
+                symbol = self.pair_config.get(pair, {}).get(
+                    'feed_symbol') or signal_replay.provider_symbol(pair)
+
+                async with aiohttp.ClientSession() as session:
+                    async with session.get(
+                            self.config['api_endpoints']
+                        ['twelvedata'],
+                            params={
+                                'symbol': symbol,
+                                'apikey': key
+                            },
+                            timeout=ClientTimeout(total=10)) as response:
+                        if response.status == 200:
+                            data = await response.json()
+                            if data.get('price'):
+                                return float(data['price'])
+
+            elif api_name == "local_quotes":
+                path = api_keys.get('local_quotes_key')
+                if not path or not os.path.exists(path):
+                    return None
+
+                with open(path) as handle:
+                    local_quotes = json.load(handle)
+                if pair in local_quotes:
+                    return float(local_quotes[pair])
+
+        except asyncio.TimeoutError:
+            logger.warning(f"Timeout getting price from {api_name}")
+        except Exception as e:
+            logger.error(f"Error with {api_name}: {e}")
+
+        return None
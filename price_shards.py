@@ -0,0 +1,195 @@
+"""
+Price Shards - Active-trade tracking in worker processes, partitioned by pair
+
+The sequential price_tracking_loop quotes and evaluates every trade on the
+bot's own event loop, next to pyrogram updates and owner commands. In
+sharded mode the leader hands that work to PRICE_SHARDS worker processes:
+- each pair hashes to exactly one shard (shard_for), and each shard has its
+  own single-process executor, so a worker owns all trades on its pairs
+- a worker quotes its pairs with one batched PriceFeeds.get_live_prices call
+  per cycle (per-trade fallback for anything the batch missed), evaluates
+  the trigger levels and returns the hits
+- Telegram and the database stay on the main loop: the existence and
+  consistency checks before a cycle run there (bounded concurrency), and
+  the returned hits are applied there one trade at a time, with the same
+  fenced writes and outbox enqueues as the sequential path
+
+Workers are spawned processes (no fork of a running event loop), so each
+one has its own interpreter and core. Sharding is opt-in: PRICE_SHARDS
+defaults to 1, which keeps tracking on the loop. The quote concurrency budget
+is split across the shards rather than given to each, and a worker that
+overruns cycle_timeout is killed and its executor replaced, so a hung quote
+cannot hold the shard's next cycle.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from typing import Dict, List, Optional
+
+from price_feeds import PriceFeeds
+
+PRICE_SHARD_CONFIG = {
+    "shards": int(os.getenv("PRICE_SHARDS", "1")),
+    "cycle_timeout": 90,  # seconds a worker may spend on one shard
+    "prepare_concurrency": 5,  # existence/consistency checks in flight on the main loop
+}
+
+
+def clean_pair(pair: str) -> str:
+    return (pair or "").upper().replace("/", "").replace("-", "").replace("_", "")
+
+
+def shard_for(pair: str, shards: int) -> int:
+    """Stable shard for a pair; crc32 so every process agrees (unlike hash())."""
+    return zlib.crc32(clean_pair(pair).encode()) % shards
+
+
+def partition_trades(trades: Dict[str, dict],
+                     shards: int) -> List[Dict[str, dict]]:
+    """Split a snapshot of active_trades into one dict per shard."""
+    partitions = [{} for _ in range(shards)]
+    for message_id, trade_data in list(trades.items()):
+        partitions[shard_for(trade_data.get('pair', ''),
+                             shards)][message_id] = trade_data
+    return partitions
+
+
+def evaluate_price_hits(trade_data: dict, current_price: float) -> List[str]:
+    """Return the levels a price triggers, in the order they must be applied.
+
+    Result is ['BREAKEVEN'], ['SL'] or any of 'TP1'/'TP2'/'TP3'. Shared by live
+    tracking, the shard workers and offline reconciliation so all follow the
+    same rules.
+    """
+    action = trade_data.get('action') or ''
+    tp1 = trade_data.get('tp1_price')
+    tp2 = trade_data.get('tp2_price')
+    tp3 = trade_data.get('tp3_price')
+    sl = trade_data.get('sl_price')
+    tp_hits = trade_data.get('tp_hits', [])
+    breakeven_active = trade_data.get('breakeven_active', False)
+    live_entry = trade_data.get('live_entry') or trade_data.get('entry')
+
+    # Rule 1: If TP2 was already hit, ensure breakeven protection is active
+    if 'TP2' in tp_hits:
+        breakeven_active = True
+
+    is_buy = action.upper() == "BUY"
+
+    def reached(level) -> bool:
+        if level is None:
+            return False
+        return current_price >= level if is_buy else current_price <= level
+
+    def crossed_back(level) -> bool:
+        return current_price <= level if is_buy else current_price >= level
+
+    if breakeven_active and live_entry:
+        if crossed_back(live_entry):
+            return ['BREAKEVEN']
+    elif sl is not None and crossed_back(sl):
+        # Rule 2: SL cannot hit after TP2 (breakeven protection)
+        if 'TP2' not in tp_hits:
+            return ['SL']
+
+    hits = []
+    for level_name, level in (('TP1', tp1), ('TP2', tp2), ('TP3', tp3)):
+        if level_name not in tp_hits and reached(level):
+            hits.append(level_name)
+    return hits
+
+
+async def _evaluate_shard(feed_config: dict, pair_config: dict,
+                          trades: Dict[str, dict]) -> dict:
+    started = time.monotonic()
+    feeds = PriceFeeds(feed_config, pair_config)
+    prices = await feeds.get_live_prices(
+        sorted({trade['pair']
+                for trade in trades.values()}))
+
+    hits = []
+    for message_id, trade_data in trades.items():
+        pair_clean = clean_pair(trade_data['pair'])
+        if not prices.get(pair_clean):
+            price = await feeds.get_live_price_with_fallback(
+                trade_data['pair'], trade_data.get('assigned_api'))
+            if not price:
+                continue
+            prices[pair_clean] = price
+        levels = evaluate_price_hits(trade_data, prices[pair_clean])
+        if levels:
+            hits.append((message_id, levels, prices[pair_clean]))
+
+    return {
+        "hits": hits,
+        "trades": len(trades),
+        "pairs": len({clean_pair(trade['pair'])
+                      for trade in trades.values()}),
+        "cycle_ms": round((time.monotonic() - started) * 1000, 1),
+    }
+
+
+def evaluate_shard(feed_config: dict, pair_config: dict,
+                   trades: Dict[str, dict]) -> dict:
+    """Worker-process entry point: quote one shard's pairs and evaluate its trades."""
+    return asyncio.run(_evaluate_shard(feed_config, pair_config, trades))
+
+
+def _init_worker():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+
+class PriceShardPool:
+    """One single-process executor per shard, so a pair always lands on the same worker."""
+
+    def __init__(self, shards: int, config: Optional[dict] = None):
+        self.config = dict(PRICE_SHARD_CONFIG, **(config or {}))
+        self.executors = [self._new_executor() for _ in range(shards)]
+        self.recycles = [0] * shards
+
+    @staticmethod
+    def _new_executor() -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=1,
+                                   mp_context=get_context("spawn"),
+                                   initializer=_init_worker)
+
+    async def evaluate(self, shard: int, feed_config: tuple,
+                       trades: Dict[str, dict]) -> dict:
+        """Run one shard's cycle in its worker; feed_config is PriceFeeds.worker_config()"""
+        loop = asyncio.get_running_loop()
+        try:
+            return await asyncio.wait_for(
+                loop.run_in_executor(self.executors[shard], evaluate_shard,
+                                     *feed_config, trades),
+                self.config["cycle_timeout"])
+        except (asyncio.TimeoutError, BrokenProcessPool):
+            self.recycle(shard)
+            raise
+
+    def recycle(self, shard: int):
+        """Kill a shard's worker and start a fresh executor in its place.
+
+        Cancelling the future does not stop a running worker call, so a hung
+        cycle would otherwise still own the single worker next cycle.
+        """
+        executor = self.executors[shard]
+        # ProcessPoolExecutor has no public handle on its workers
+        processes = list((getattr(executor, "_processes", None) or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            if process.is_alive():
+                process.kill()
+        self.executors[shard] = self._new_executor()
+        self.recycles[shard] += 1
+
+    def close(self):
+        for executor in self.executors:
+            executor.shutdown(wait=False, cancel_futures=True)
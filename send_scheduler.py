@@ -0,0 +1,371 @@
+"""
+Send Scheduler - Central outbound pacing for the main bot
+
+Every message the main bot sends goes through one dispatcher that:
+- serves jobs by priority (signals, then TP/SL updates, then onboarding, then debug logs)
+- respects Telegram's global rate and per-chat limits (1 msg/s per private chat,
+  20 msg/min per group)
+- absorbs FloodWait by pausing only the affected chat and retrying the job
+- keeps queue depth and enqueue-to-sent latency for monitoring
+
+Jobs are zero-argument callables returning an awaitable, e.g.
+    await scheduler.submit(chat_id, lambda: app.send_message(chat_id, text), PRIORITY_SIGNAL)
+
+DebugLogShipper sits in front of it for Debug Group logging: callers never
+wait on Telegram, and bursts are coalesced into digest messages.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pyrogram.errors import FloodWait
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_SIGNAL = 0
+PRIORITY_TRADE_UPDATE = 1
+PRIORITY_ONBOARDING = 2
+PRIORITY_DEBUG = 3
+
+PRIORITY_NAMES = {
+    PRIORITY_SIGNAL: "signal",
+    PRIORITY_TRADE_UPDATE: "trade_update",
+    PRIORITY_ONBOARDING: "onboarding",
+    PRIORITY_DEBUG: "debug",
+}
+
+SEND_RATE_LIMITS = {
+    "global_per_second": 25,  # Telegram allows ~30/s for bots, keep headroom
+    "private_interval": 1.0,  # seconds between messages to one user
+    "group_interval": 3.0,  # 20 messages per minute per group
+    "max_retries": 3,  # FloodWait retries per job before giving up
+}
+
+
+class _SendJob:
+    __slots__ = ("priority", "seq", "chat_id", "call", "label", "future",
+                 "enqueued_at", "retries")
+
+    def __init__(self, priority: int, seq: int, chat_id: int,
+                 call: Callable[[], Awaitable], label: str,
+                 future: asyncio.Future):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.call = call
+        self.label = label
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.retries = 0
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class SendScheduler:
+
+    def __init__(self, concurrency: int = 5, limits: Optional[Dict] = None):
+        self.limits = dict(SEND_RATE_LIMITS, **(limits or {}))
+        self.concurrency = asyncio.Semaphore(concurrency)
+        self.chat_queues = {}  # chat_id -> heap of _SendJob
+        self.chat_ready_at = {}  # chat_id -> monotonic time of next allowed send
+        self.sent_times = deque()  # monotonic send times within the last second
+        self.seq = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.dispatcher = None
+
+        # Metrics
+        self.sent_count = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.failed_count = 0
+        self.flood_waits = 0
+        self.latencies = {
+            name: deque(maxlen=500)
+            for name in PRIORITY_NAMES.values()
+        }
+
+    def start(self):
+        if self.dispatcher is None or self.dispatcher.done():
+            self.dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    def enqueue(self,
+                chat_id: int,
+                call: Callable[[], Awaitable],
+                priority: int = PRIORITY_DEBUG,
+                label: str = "message") -> asyncio.Future:
+        """Queue a send and return a future resolving to the call's result."""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        job = _SendJob(priority, next(self.seq), chat_id, call, label, future)
+        heapq.heappush(self.chat_queues.setdefault(chat_id, []), job)
+        self.wakeup.set()
+        return future
+
+    async def submit(self,
+                     chat_id: int,
+                     call: Callable[[], Awaitable],
+                     priority: int = PRIORITY_DEBUG,
+                     label: str = "message"):
+        """Queue a send and wait for it to go out."""
+        return await self.enqueue(chat_id, call, priority, label)
+
+    def queue_depth(self) -> Dict[str, int]:
+        depth = {name: 0 for name in PRIORITY_NAMES.values()}
+        for jobs in self.chat_queues.values():
+            for job in jobs:
+                depth[PRIORITY_NAMES.get(job.priority, "debug")] += 1
+        return depth
+
+    def metrics(self) -> Dict:
+        latency = {}
+        for name, samples in self.latencies.items():
+            if not samples:
+                continue
+            ordered = sorted(samples)
+            latency[name] = {
+                "avg_ms": round(sum(ordered) / len(ordered) * 1000, 1),
+                "p95_ms": round(
+                    ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] *
+                    1000, 1),
+                "max_ms": round(ordered[-1] * 1000, 1),
+            }
+        return {
+            "queue_depth": self.queue_depth(),
+            "sent": dict(self.sent_count),
+            "failed": self.failed_count,
+            "flood_waits": self.flood_waits,
+            "latency": latency,
+        }
+
+    def _chat_interval(self, chat_id: int) -> float:
+        if chat_id < 0:
+            return self.limits["group_interval"]
+        return self.limits["private_interval"]
+
+    def _next_job(self, now: float):
+        """Pick the highest-priority job whose chat is allowed to send now."""
+        best = None
+        for chat_id, jobs in self.chat_queues.items():
+            if not jobs or self.chat_ready_at.get(chat_id, 0) > now:
+                continue
+            if best is None or jobs[0] < best:
+                best = jobs[0]
+        return best
+
+    def _next_wakeup(self, now: float) -> Optional[float]:
+        waits = [
+            self.chat_ready_at.get(chat_id, 0) - now
+            for chat_id, jobs in self.chat_queues.items() if jobs
+        ]
+        return max(min(waits), 0.01) if waits else None
+
+    async def _dispatch_loop(self):
+        while True:
+            try:
+                now = time.monotonic()
+                while self.sent_times and now - self.sent_times[0] >= 1:
+                    self.sent_times.popleft()
+                if len(self.sent_times) >= self.limits["global_per_second"]:
+                    await asyncio.sleep(1 - (now - self.sent_times[0]))
+                    continue
+
+                job = self._next_job(now)
+                if job is None:
+                    self.wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self.wakeup.wait(),
+                                               timeout=self._next_wakeup(now))
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                heapq.heappop(self.chat_queues[job.chat_id])
+                if not self.chat_queues[job.chat_id]:
+                    del self.chat_queues[job.chat_id]
+
+                self.chat_ready_at[job.chat_id] = now + self._chat_interval(
+                    job.chat_id)
+                self.sent_times.append(now)
+
+                await self.concurrency.acquire()
+                asyncio.create_task(self._run_job(job))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Send scheduler dispatch error: {e}")
+                await asyncio.sleep(1)
+
+    async def _run_job(self, job: _SendJob):
+        try:
+            result = await job.call()
+        except FloodWait as e:
+            self.flood_waits += 1
+            wait_time = float(e.value) if getattr(e, 'value', None) else 5
+            # Pause only this chat and put the job back at the front of its queue
+            self.chat_ready_at[job.chat_id] = max(
+                self.chat_ready_at.get(job.chat_id, 0),
+                time.monotonic() + wait_time)
+            job.retries += 1
+            if job.retries > self.limits["max_retries"]:
+                self.failed_count += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+            else:
+                logger.warning(
+                    f"FloodWait {wait_time:.0f}s on {job.label} to {job.chat_id}, requeued"
+                )
+                heapq.heappush(self.chat_queues.setdefault(job.chat_id, []),
+                               job)
+                self.wakeup.set()
+        except Exception as e:
+            self.failed_count += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            name = PRIORITY_NAMES.get(job.priority, "debug")
+            self.sent_count[name] += 1
+            self.latencies[name].append(time.monotonic() - job.enqueued_at)
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self.concurrency.release()
+
+
+DEBUG_LOG_LIMITS = {
+    "flush_interval": 3.0,  # seconds between digests
+    "max_message_length": 4096,  # Telegram text limit
+    "soft_limit": 200,  # pending info records before sampling starts
+    "hard_limit": 1000,  # pending info records before info is dropped
+    "sample_every": 5,  # keep 1 in N info records between the limits
+}
+
+
+class DebugLogShipper:
+    """Non-blocking debug-group logger that ships records as digests.
+
+    log() only appends to memory. run() coalesces whatever arrived during
+    the last interval into as few messages as possible. Under pressure info
+    records are sampled and then dropped; error records are always kept.
+    Records carrying a user_id are shipped on their own so their profile
+    button still works.
+    """
+
+    def __init__(self,
+                 send: Callable[[str, Optional[int], bool], Awaitable],
+                 limits: Optional[Dict] = None):
+        self.send = send
+        self.limits = dict(DEBUG_LOG_LIMITS, **(limits or {}))
+        self.pending = deque()  # (is_error, message, user_id)
+        self.pending_info = 0
+        self.sampled_out = 0  # cumulative, for metrics()
+        self.dropped = 0
+        self.skipped_since_flush = 0
+        self.info_seen = 0
+        self.shipper = None
+
+    def start(self):
+        if self.shipper is None or self.shipper.done():
+            self.shipper = asyncio.create_task(self.run())
+
+    def log(self,
+            message: str,
+            is_error: bool = False,
+            user_id: Optional[int] = None):
+        if not is_error:
+            self.info_seen += 1
+            if self.pending_info >= self.limits["hard_limit"]:
+                self.dropped += 1
+                self.skipped_since_flush += 1
+                return
+            if (self.pending_info >= self.limits["soft_limit"] and
+                    self.info_seen % self.limits["sample_every"]):
+                self.sampled_out += 1
+                self.skipped_since_flush += 1
+                return
+            self.pending_info += 1
+        self.pending.append((is_error, str(message), user_id))
+
+    def metrics(self) -> Dict:
+        return {
+            "pending": len(self.pending),
+            "sampled_out": self.sampled_out,
+            "dropped": self.dropped,
+        }
+
+    @staticmethod
+    def format_single(message: str, is_error: bool) -> str:
+        if is_error:
+            return f"🚨 **SYSTEM ERROR**\n\n**Issue:** {message}"
+        return f"📊 **SYSTEM LOG**\n\n**Event:** {message}"
+
+    def build_digests(self, records: List[tuple]) -> List[tuple]:
+        """Pack records into (text, user_id, is_error) messages under the length limit."""
+        # Room for the owner mention the sender appends to error messages
+        limit = self.limits["max_message_length"] - 100
+        digests = []
+        batch = []
+
+        def close_batch():
+            if not batch:
+                return
+            if len(batch) == 1:
+                is_error, message = batch[0]
+                digests.append((self.format_single(message, is_error)[:limit],
+                                None, is_error))
+            else:
+                has_error = any(is_error for is_error, _ in batch)
+                header = f"📊 **SYSTEM LOG** ({len(batch)} events)"
+                lines = [("🚨 " if is_error else "• ") + message
+                         for is_error, message in batch]
+                digests.append(("\n\n".join([header] + lines), None,
+                                has_error))
+            batch.clear()
+
+        length = 0
+        for is_error, message, user_id in records:
+            if user_id:
+                digests.append((self.format_single(message, is_error)[:limit],
+                                user_id, is_error))
+                continue
+            message = message[:limit - 200]
+            if batch and length + len(message) + 4 > limit:
+                close_batch()
+                length = 0
+            if not batch:
+                length = 60
+            batch.append((is_error, message))
+            length += len(message) + 4
+        close_batch()
+        return digests
+
+    async def flush(self):
+        records = list(self.pending)
+        self.pending.clear()
+        self.pending_info = 0
+        skipped = self.skipped_since_flush
+        if skipped:
+            records.append(
+                (False,
+                 f"⚠️ {skipped} info events skipped under log pressure",
+                 None))
+            self.skipped_since_flush = 0
+        if not records:
+            return
+
+        for text, user_id, is_error in self.build_digests(records):
+            try:
+                await self.send(text, user_id, is_error)
+            except Exception as e:
+                logger.error(f"Failed to ship debug digest: {e}")
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.limits["flush_interval"])
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Debug log shipper error: {e}")
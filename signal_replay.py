@@ -0,0 +1,398 @@
+"""
+Signal Replay - Vectorised TP/SL rule engine over historical candles
+
+Replays the same rules the live price tracker uses (TP1/TP2/TP3 in order,
+SL disabled and breakeven armed once TP2 is hit) over minute candles for many
+trades at once. Used by the main bot to backfill hits missed while offline,
+and by backtest_signals.py to sweep alternative pip ladders over history.
+
+Candle sources:
+- Local CSV files (CANDLE_DATA_DIR/<PAIR>.csv with timestamp,open,high,low,close)
+- Twelve Data 1-minute time series (TWELVEDATA_API_KEY)
+"""
+
+import csv
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import aiohttp
+import numpy as np
+
+NO_HIT = np.iinfo(np.int64).max
+
+OUTCOME_OPEN = 0
+OUTCOME_SL = 1
+OUTCOME_BREAKEVEN = 2
+OUTCOME_TP3 = 3
+
+OUTCOME_NAMES = {
+    OUTCOME_OPEN: "open",
+    OUTCOME_SL: "sl",
+    OUTCOME_BREAKEVEN: "breakeven",
+    OUTCOME_TP3: "tp3",
+}
+
+TWELVEDATA_TIME_SERIES_URL = "https://api.twelvedata.com/time_series"
+
+
+def _to_epoch(value) -> int:
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp())
+    text = str(value).strip()
+    try:
+        return int(float(text))
+    except ValueError:
+        parsed = datetime.fromisoformat(text.replace('Z', '+00:00'))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return int(parsed.timestamp())
+
+
+def _empty_candles() -> Dict[str, np.ndarray]:
+    return {
+        'time': np.empty(0, dtype=np.int64),
+        'high': np.empty(0, dtype=np.float64),
+        'low': np.empty(0, dtype=np.float64),
+        'close': np.empty(0, dtype=np.float64),
+    }
+
+
+def _build_candles(rows: List[tuple]) -> Dict[str, np.ndarray]:
+    if not rows:
+        return _empty_candles()
+    rows.sort(key=lambda r: r[0])
+    data = np.array(rows, dtype=np.float64)
+    return {
+        'time': data[:, 0].astype(np.int64),
+        'high': data[:, 1],
+        'low': data[:, 2],
+        'close': data[:, 3],
+    }
+
+
+def load_candles_from_file(data_dir: str, pair: str, start: datetime,
+                           end: datetime) -> Dict[str, np.ndarray]:
+    """Load minute candles for a pair from a local CSV file (stand-in for a live provider)"""
+    path = os.path.join(data_dir, f"{pair.upper()}.csv")
+    if not os.path.exists(path):
+        return _empty_candles()
+
+    start_ts, end_ts = _to_epoch(start), _to_epoch(end)
+    rows = []
+    with open(path, newline='') as handle:
+        for record in csv.DictReader(handle):
+            ts = _to_epoch(record['timestamp'])
+            if start_ts <= ts <= end_ts:
+                rows.append((ts, float(record['high']), float(record['low']),
+                             float(record['close'])))
+    return _build_candles(rows)
+
+
+def provider_symbol(pair: str) -> str:
+    """EURUSD -> EUR/USD, the symbol format used by the candle provider"""
+    pair = pair.upper()
+    if len(pair) == 6:
+        return f"{pair[:3]}/{pair[3:]}"
+    return pair
+
+
+async def fetch_candles_twelvedata(
+        session: aiohttp.ClientSession,
+        api_key: str,
+        pair: str,
+        start: datetime,
+        end: datetime,
+        symbol: Optional[str] = None) -> Dict[str, np.ndarray]:
+    """Fetch 1-minute candles for the window from Twelve Data"""
+    params = {
+        'symbol': symbol or provider_symbol(pair),
+        'interval': '1min',
+        'start_date': datetime.fromtimestamp(
+            _to_epoch(start), timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+        'end_date': datetime.fromtimestamp(
+            _to_epoch(end), timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+        'timezone': 'UTC',
+        'order': 'ASC',
+        'outputsize': 5000,
+        'apikey': api_key,
+    }
+    async with session.get(TWELVEDATA_TIME_SERIES_URL,
+                           params=params,
+                           timeout=aiohttp.ClientTimeout(total=20)) as response:
+        if response.status != 200:
+            return _empty_candles()
+        data = await response.json()
+
+    rows = []
+    for value in data.get('values') or []:
+        rows.append((_to_epoch(value['datetime']), float(value['high']),
+                     float(value['low']), float(value['close'])))
+    return _build_candles(rows)
+
+
+def _first_touch(mask: np.ndarray) -> np.ndarray:
+    """Column index of the first True per row, NO_HIT where there is none"""
+    if mask.shape[1] == 0:
+        return np.full(mask.shape[0], NO_HIT, dtype=np.int64)
+    return np.where(mask.any(axis=1), mask.argmax(axis=1),
+                    NO_HIT).astype(np.int64)
+
+
+def window_candles(candles: Dict[str, np.ndarray], start_times: np.ndarray,
+                   max_bars: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """Gather each trade's candles from its start_time into (trades x bars) matrices"""
+    times = candles['time']
+    n_candles = len(times)
+    start_idx = np.searchsorted(times,
+                                np.asarray(start_times, dtype=np.int64),
+                                side='left')
+    n_trades = len(start_idx)
+    width = max_bars if max_bars is not None else (
+        n_candles - int(start_idx.min()) if n_trades else 0)
+    width = max(int(width), 0)
+
+    cols = np.arange(width, dtype=np.int64)
+    index = start_idx[:, None] + cols[None, :]
+    valid = index < n_candles
+    index = np.minimum(index, max(n_candles - 1, 0))
+
+    if n_candles:
+        high, low, close = candles['high'][index], candles['low'][
+            index], candles['close'][index]
+    else:
+        high = low = close = np.zeros((n_trades, width))
+
+    return {
+        'start_idx': start_idx,
+        'cols': cols,
+        'valid': valid,
+        'high': high,
+        'low': low,
+        'close': close,
+    }
+
+
+def replay_window(window: Dict[str, np.ndarray],
+                  trades: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Apply the TP/SL rules to pre-gathered candle windows.
+
+    Returns window-relative indices (NO_HIT when not hit) and an outcome code
+    per trade, so the same window can be reused for several ladders.
+    """
+    is_buy = np.asarray(trades['is_buy'], dtype=bool)
+    n_trades = len(is_buy)
+    cols, valid = window['cols'], window['valid']
+
+    def flag(name: str) -> np.ndarray:
+        if name in trades:
+            return np.asarray(trades[name], dtype=bool)
+        return np.zeros(n_trades, dtype=bool)
+
+    tp1_done, tp2_done, tp3_done = flag('tp1_done'), flag('tp2_done'), flag(
+        'tp3_done')
+    armed = flag('breakeven_active') | tp2_done
+
+    buy = is_buy[:, None]
+    favourable = np.where(buy, window['high'], window['low'])
+    adverse = np.where(buy, window['low'], window['high'])
+
+    def reached(level) -> np.ndarray:
+        level = np.asarray(level, dtype=np.float64)[:, None]
+        return np.where(buy, favourable >= level, favourable <= level) & valid
+
+    def crossed_back(level) -> np.ndarray:
+        level = np.asarray(level, dtype=np.float64)[:, None]
+        return np.where(buy, adverse <= level, adverse >= level) & valid
+
+    i_tp1 = np.where(tp1_done, -1, _first_touch(reached(trades['tp1'])))
+    i_tp2 = np.where(tp2_done, -1, _first_touch(reached(trades['tp2'])))
+    i_tp3 = np.where(tp3_done, -1, _first_touch(reached(trades['tp3'])))
+
+    # SL only counts before TP2; afterwards breakeven protection takes over
+    i_sl = np.where(armed, NO_HIT, _first_touch(crossed_back(trades['sl'])))
+    sl_first = (i_sl != NO_HIT) & (i_sl <= i_tp2)
+
+    # Breakeven is armed from the candle after TP2 (or immediately if already armed)
+    armed_after = np.where(armed, -1, i_tp2)
+    i_be = _first_touch(
+        crossed_back(trades['entry']) & (cols[None, :] > armed_after[:, None]))
+    i_be = np.where(sl_first, NO_HIT, i_be)
+
+    tp3_first = ~sl_first & (i_tp3 >= 0) & (i_tp3 != NO_HIT) & (i_tp3 < i_be)
+    be_first = ~sl_first & ~tp3_first & (i_be != NO_HIT)
+
+    outcome = np.full(n_trades, OUTCOME_OPEN, dtype=np.int8)
+    outcome[sl_first] = OUTCOME_SL
+    outcome[be_first] = OUTCOME_BREAKEVEN
+    outcome[tp3_first] = OUTCOME_TP3
+
+    # Last candle that can still produce a hit for each trade
+    terminal = np.full(n_trades, NO_HIT, dtype=np.int64)
+    terminal[sl_first] = i_sl[sl_first] - 1
+    # A TP3 touch in the breakeven candle is not counted: the retrace wins
+    terminal[be_first] = i_be[be_first] - 1
+    terminal[tp3_first] = i_tp3[tp3_first]
+
+    def new_hit(idx: np.ndarray) -> np.ndarray:
+        keep = (idx >= 0) & (idx != NO_HIT) & (idx <= terminal)
+        return np.where(keep, idx, NO_HIT)
+
+    return {
+        'tp1': new_hit(i_tp1),
+        'tp2': new_hit(i_tp2),
+        'tp3': new_hit(i_tp3),
+        'sl': np.where(sl_first, i_sl, NO_HIT),
+        'breakeven': np.where(be_first, i_be, NO_HIT),
+        'outcome': outcome,
+    }
+
+
+def replay_trades(candles: Dict[str, np.ndarray],
+                  trades: Dict[str, np.ndarray],
+                  max_bars: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """Replay many trades of one pair over the same candle series in one pass.
+
+    trades holds equal-length arrays: is_buy, entry, tp1, tp2, tp3, sl, start_time
+    and optionally tp1_done, tp2_done, tp3_done, breakeven_active for trades that
+    already have hits. Each trade only sees candles at or after its start_time.
+
+    When SL and a TP land inside the same candle the order is unknown, so the
+    adverse level wins (same for breakeven vs TP3).
+
+    Returns absolute candle indices for new hits (NO_HIT when not hit) and an
+    outcome code per trade.
+    """
+    window = window_candles(candles, trades['start_time'], max_bars)
+    result = replay_window(window, trades)
+    start_idx = window['start_idx']
+    for key in ('tp1', 'tp2', 'tp3', 'sl', 'breakeven'):
+        hit = result[key] != NO_HIT
+        result[key] = np.where(hit, start_idx + np.where(hit, result[key], 0),
+                               NO_HIT)
+    return result
+
+
+def ladder_levels(is_buy: np.ndarray, entry: np.ndarray,
+                  pip_value: np.ndarray, ladder: tuple) -> Dict[str, np.ndarray]:
+    """TP1/TP2/TP3/SL prices for a (tp1, tp2, tp3, sl) pip ladder, as calculate_tp_sl_levels does"""
+    tp1_pips, tp2_pips, tp3_pips, sl_pips = ladder
+    direction = np.where(is_buy, 1.0, -1.0)
+    return {
+        'tp1': entry + direction * tp1_pips * pip_value,
+        'tp2': entry + direction * tp2_pips * pip_value,
+        'tp3': entry + direction * tp3_pips * pip_value,
+        'sl': entry - direction * sl_pips * pip_value,
+    }
+
+
+def score_ladder(window: Dict[str, np.ndarray], is_buy: np.ndarray,
+                 entry: np.ndarray, pip_value: np.ndarray,
+                 ladder: tuple) -> Dict[str, np.ndarray]:
+    """Replay one ladder over pre-gathered windows and return outcome and pips per trade.
+
+    Pips model: SL before TP2 loses the SL distance, TP3 banks the TP3 distance,
+    breakeven after TP2 banks the TP2 distance, and trades still open at the end
+    of the window are marked to the last close.
+    """
+    trades = dict(is_buy=is_buy, entry=entry)
+    trades.update(ladder_levels(is_buy, entry, pip_value, ladder))
+    result = replay_window(window, trades)
+
+    tp1_pips, tp2_pips, tp3_pips, sl_pips = ladder
+    outcome = result['outcome']
+
+    valid = window['valid']
+    last_bar = np.maximum(valid.sum(axis=1) - 1, 0)
+    if valid.shape[1]:
+        last_close = window['close'][np.arange(len(entry)), last_bar]
+    else:
+        last_close = entry
+    direction = np.where(is_buy, 1.0, -1.0)
+    open_pips = direction * (last_close - entry) / pip_value
+
+    pips = np.select([
+        outcome == OUTCOME_SL, outcome == OUTCOME_TP3,
+        outcome == OUTCOME_BREAKEVEN
+    ], [-float(sl_pips), float(tp3_pips),
+        float(tp2_pips)], open_pips)
+    return {'outcome': outcome, 'pips': pips}
+
+
+def sweep_ladders(candles: Dict[str, np.ndarray],
+                  trades: Dict[str, np.ndarray],
+                  ladders: List[tuple],
+                  max_bars: int,
+                  chunk_size: int = 512) -> Dict[tuple, Dict[str, np.ndarray]]:
+    """Score several pip ladders over the same trades of one pair.
+
+    trades holds is_buy, entry, pip_value and start_time arrays. Candle windows
+    are gathered once per chunk and reused for every ladder.
+    """
+    n_trades = len(trades['entry'])
+    scores = {
+        ladder: {
+            'outcome': np.empty(n_trades, dtype=np.int8),
+            'pips': np.empty(n_trades, dtype=np.float64)
+        }
+        for ladder in ladders
+    }
+
+    for offset in range(0, n_trades, chunk_size):
+        part = slice(offset, offset + chunk_size)
+        window = window_candles(candles, trades['start_time'][part],
+                                max_bars)
+        for ladder in ladders:
+            scored = score_ladder(window, trades['is_buy'][part],
+                                  trades['entry'][part],
+                                  trades['pip_value'][part], ladder)
+            scores[ladder]['outcome'][part] = scored['outcome']
+            scores[ladder]['pips'][part] = scored['pips']
+
+    return scores
+
+
+def summarise_scores(outcomes: np.ndarray, pips: np.ndarray) -> dict:
+    """Win rate and pip totals for one ladder"""
+    total = len(pips)
+    wins = int((pips > 0).sum())
+    return {
+        'trades': total,
+        'wins': wins,
+        'losses': int((outcomes == OUTCOME_SL).sum()),
+        'breakevens': int((outcomes == OUTCOME_BREAKEVEN).sum()),
+        'tp3': int((outcomes == OUTCOME_TP3).sum()),
+        'open': int((outcomes == OUTCOME_OPEN).sum()),
+        'win_rate': (wins / total * 100) if total else 0.0,
+        'total_pips': float(pips.sum()),
+        'avg_pips': float(pips.mean()) if total else 0.0,
+    }
+
+
+def average_true_range(candles: Dict[str, np.ndarray],
+                       period: int = 14,
+                       timeframe_minutes: int = 60) -> Optional[float]:
+    """ATR over the last `period` bars after resampling minute candles to the timeframe"""
+    times = candles['time']
+    if len(times) == 0:
+        return None
+
+    buckets = times // (timeframe_minutes * 60)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(times)] - 1
+
+    high = np.maximum.reduceat(candles['high'], starts)
+    low = np.minimum.reduceat(candles['low'], starts)
+    close = candles['close'][ends]
+    if len(close) <= period:
+        return None
+
+    prev_close = close[:-1]
+    true_range = np.maximum.reduce([
+        high[1:] - low[1:],
+        np.abs(high[1:] - prev_close),
+        np.abs(low[1:] - prev_close),
+    ])
+    return float(true_range[-period:].mean())
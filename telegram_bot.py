@@ -15,13 +15,14 @@ import os
 import asyncio
 import logging
 import json
+import hmac
 import random
 import time
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict, List, Union
 import asyncpg
 import aiohttp
-from aiohttp import web, ClientTimeout
+from aiohttp import web
 import requests
 import re
 from urllib.parse import quote
@@ -37,6 +38,26 @@ from pyrogram.errors import FloodWait, UserNotParticipant, ChatAdminRequired
 
 import pyrogram.utils as pyrogram_utils
 
+import numpy as np
+
+import signal_replay
+from bot_settings_cache import BotSettingsCache
+from db_access import BudgetedPool
+from leader_election import FencedOut, LeaderElection
+from notification_outbox import (NOTIFICATION_OUTBOX_CONFIG,
+                                 claim_notifications, enqueue_notification,
+                                 mark_failed, mark_sent, purge_sent,
+                                 release_after)
+from partition_retention import PARTITION_RETENTION, run_retention
+from price_feeds import PriceFeeds
+from price_shards import (PRICE_SHARD_CONFIG, PriceShardPool,
+                          evaluate_price_hits, partition_trades)
+from schema_migrations import run_migrations
+from send_scheduler import (SendScheduler, DebugLogShipper, PRIORITY_SIGNAL,
+                            PRIORITY_TRADE_UPDATE, PRIORITY_ONBOARDING,
+                            PRIORITY_DEBUG)
+from trade_events import CLOSING_EVENTS, completion_event, trade_event_stats
+
 pyrogram_utils.MIN_CHANNEL_ID = -1009999999999
 pyrogram_utils.MIN_CHAT_ID = -999999999999
 
@@ -107,7 +128,8 @@ PAIR_CONFIG = {
     'XAUUSD': {
         'decimals': 2,
         'pip_value': 0.1,
-        'name': 'Gold (XAU/USD)'
+        'name': 'Gold (XAU/USD)',
+        'feed_symbol': 'XAU/USD'
     },
     'GBPJPY': {
         'decimals': 3,
@@ -137,22 +159,26 @@ PAIR_CONFIG = {
     'US100': {
         'decimals': 1,
         'pip_value': 1.0,
-        'name': 'US100 (Nasdaq)'
+        'name': 'US100 (Nasdaq)',
+        'feed_symbol': 'NDX'
     },
     'US500': {
         'decimals': 2,
         'pip_value': 0.1,
-        'name': 'US500 (S&P 500)'
+        'name': 'US500 (S&P 500)',
+        'feed_symbol': 'SPX'
     },
     'GER40': {
         'decimals': 1,
         'pip_value': 1.0,
-        'name': 'GER40 (DAX)'
+        'name': 'GER40 (DAX)',
+        'feed_symbol': 'DAX'
     },
     'BTCUSD': {
         'decimals': 1,
         'pip_value': 10,
-        'name': 'Bitcoin (BTC/USD)'
+        'name': 'Bitcoin (BTC/USD)',
+        'feed_symbol': 'BTC/USD'
     },
     'GBPCHF': {
         'decimals': 4,
@@ -271,15 +297,25 @@ PAIR_CONFIG = {
     },
 }
 
+# Not quoted by the FX APIs; tracked through the secondary feed when one is configured,
+# otherwise they fall back to manual tracking via /tradeoverride
 EXCLUDED_FROM_TRACKING = ['XAUUSD', 'BTCUSD', 'GER40', 'US100']
 
+# TP/SL ladder engine: profiles live in tp_sl_profiles, ATR inputs in pair_volatility
+LADDER_CONFIG = {
+    "default_pips": (20, 40, 70, 50),  # TP1, TP2, TP3, SL
+    "refresh_interval": 3600,
+    "atr_period": 14,
+    "atr_timeframe_minutes": 60,
+}
+
 AUTO_ROLE_CONFIG = {
     "enabled": True,
     "duration_hours": 72,
     "active_members": {},
     "role_history": {},
     "dm_schedule": {},
-    "weekend_pending": {}
+    "weekend_pending": {},
 }
 
 PRICE_TRACKING_CONFIG = {
@@ -290,22 +326,79 @@ PRICE_TRACKING_CONFIG = {
         "currencybeacon_key": os.getenv("CURRENCYBEACON_KEY", ""),
         "exchangerate_api_key": os.getenv("EXCHANGERATE_API_KEY", ""),
         "currencylayer_key": os.getenv("CURRENCYLAYER_KEY", ""),
-        "abstractapi_key": os.getenv("ABSTRACTAPI_KEY", "")
+        "abstractapi_key": os.getenv("ABSTRACTAPI_KEY", ""),
+        "twelvedata_key": os.getenv("TWELVEDATA_API_KEY", ""),
+        # Local stand-in for the secondary feed: JSON file of {"XAUUSD": 2345.6, ...}
+        "local_quotes_key": os.getenv("LOCAL_QUOTES_FILE", "")
     },
     "api_endpoints": {
         "currencybeacon": "https://api.currencybeacon.com/v1/latest",
         "exchangerate_api": "https://v6.exchangerate-api.com/v6",
         "currencylayer": "https://api.currencylayer.com/live",
-        "abstractapi": "https://exchange-rates.abstractapi.com/v1/live"
+        "abstractapi": "https://exchange-rates.abstractapi.com/v1/live",
+        "twelvedata": "https://api.twelvedata.com/price"
     },
     "api_priority_order":
     ["currencybeacon", "exchangerate_api", "currencylayer", "abstractapi"],
+    # Metals, indices and crypto (EXCLUDED_FROM_TRACKING + US500)
+    "secondary_feed_pairs": ["XAUUSD", "BTCUSD", "GER40", "US100", "US500"],
+    "secondary_api_priority_order": ["local_quotes", "twelvedata"],
     "check_interval":
     120,
     "last_price_check_time":
     None,
+    "max_concurrent_quote_requests":
+    5,
+    # Minute candles for offline backfill: local CSVs take precedence over Twelve Data
+    "candle_data_dir":
+    os.getenv("CANDLE_DATA_DIR", ""),
+    "offline_backfill_max_hours":
+    72,
+}
+
+# Cap on concurrent outbound Telegram sends for bursty paths (offline recovery etc.)
+TELEGRAM_SEND_CONCURRENCY = 5
+
+# /metrics needs "Authorization: Bearer <METRICS_TOKEN>" unless called from localhost
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Onboarding widgets: edits within this window collapse into one
+ONBOARDING_WIDGET_DEBOUNCE_SECONDS = 2.0
+ONBOARDING_WIDGET_PERSIST_INTERVAL = 5
+
+# Free-group joins are buffered and written in batches (promotions bring thousands per hour)
+FREE_JOIN_BATCH_CONFIG = {
+    "flush_interval": 2.0,  # seconds a join may wait in the buffer
+    "max_batch": 500,
+    "widget_threshold": 5,  # batches this size or larger get one summary instead of widgets
 }
 
+# VIP trial-link join requests are answered in batches
+JOIN_REQUEST_BATCH_CONFIG = {
+    "flush_interval": 1.0,
+    "max_batch": 200,
+    "concurrency": 10,  # approve/decline calls in flight
+    "widget_threshold": 5,
+}
+
+# service_events are pushed via NOTIFY; this poll only covers missed notifications
+SERVICE_EVENTS_FALLBACK_POLL = 60
+# How long an event waits for its widget id to reach bot_status before it is dropped
+SERVICE_EVENTS_WIDGET_GRACE = 180
+
+# RETURNING is true only when the row is new (not the ON CONFLICT update)
+ACTIVE_TRADE_UPSERT = '''
+    INSERT INTO active_trades
+    (message_id, channel_id, guild_id, pair, action, entry_price, tp1_price, tp2_price, tp3_price, sl_price,
+     telegram_entry, telegram_tp1, telegram_tp2, telegram_tp3, telegram_sl, live_entry, assigned_api,
+     status, tp_hits, breakeven_active, entry_type, manual_overrides, channel_message_map, all_channel_ids, group_name, manual_tracking_only)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, $15, $16, $17, $18, $19, $20, $21, $22, $23, $24, $25, $26)
+    ON CONFLICT (message_id) DO UPDATE SET
+    status = $18, tp_hits = $19, breakeven_active = $20, manual_overrides = $22,
+    channel_message_map = $23, all_channel_ids = $24, group_name = $25, manual_tracking_only = $26, last_updated = NOW()
+    RETURNING (xmax = 0)
+'''
+
 PENDING_ENTRIES = {}
 
 MESSAGE_TEMPLATES = {
@@ -414,6 +507,9 @@ class TelegramTradingBot:
             bot_token=TELEGRAM_BOT_TOKEN,
             workdir=".")  # Fix 2: Session storage enabled by providing workdir
 
+        # Quote APIs for the price engine (shared with the shard workers)
+        self.price_feeds = PriceFeeds(PRICE_TRACKING_CONFIG, PAIR_CONFIG)
+
         # Database connection pool
         self.db_pool = None
         db_url = os.getenv("DATABASE_URL_OVERRIDE") or os.getenv(
@@ -433,14 +529,14 @@ class TelegramTradingBot:
                             local_ctx.check_hostname = False
                             local_ctx.verify_mode = ssl.CERT_NONE
 
-                            self.db_pool = await asyncpg.create_pool(
-                                db_url, ssl=local_ctx)
+                            pool = BudgetedPool('main_bot')
+                            await pool.connect(db_url, ssl=local_ctx)
+                            self.db_pool = pool
                             print("Database pool successfully initialized")
 
-                            # Initialize tables
+                            # Apply pending schema migrations (no-op on a warm start)
                             async with self.db_pool.acquire() as conn:
-                                await self.initialize_all_tables(conn)
-                                await self.initialize_additional_tables(conn)
+                                await run_migrations(conn)
                             return
                         except Exception as e:
                             wait_time = (attempt + 1) * 5
@@ -461,7 +557,6 @@ class TelegramTradingBot:
         else:
             print("No DATABASE_URL found for main bot")
 
-        self.client_session = None
         self.last_online_time = None
         self.running = True
         self.startup_complete = False
@@ -476,6 +571,39 @@ class TelegramTradingBot:
         }  # Track peer ID checks: user_id -> {joined_at, delay_level, interval, established}
         self.userbot_login_state = {
         }  # user_id -> {client, phone, phone_code_hash}
+        # All outbound sends are paced by priority and chat through one scheduler
+        self.send_scheduler = SendScheduler(TELEGRAM_SEND_CONCURRENCY)
+        # Debug Group logs are queued and shipped as digests, never awaited inline
+        self.debug_shipper = DebugLogShipper(self.send_debug_digest)
+        # Set after a trade notification is queued, so the outbox sends it now
+        self.outbox_wakeup = asyncio.Event()
+        # Singleton loops run only while this replica is the elected leader
+        self.leader = None
+        self.leader_tasks = []
+        # Sharded price engine: worker processes and per-shard stats
+        self.price_shard_pool = None
+        self.price_shard_stats = {}
+        # Onboarding widget registry: user_id -> debug message id, plus the
+        # latest unsent state and the message-id changes still to persist
+        self.onboarding_widgets = {}
+        self.widget_pending = {}
+        self.widget_flush_tasks = {}
+        self.widget_id_writes = {}
+        self.widget_lookups = set()
+        # (pair, strategy) -> TP/SL ladder, rebuilt by load_ladder_profiles
+        self.ladder_tables = {}
+        # bot_settings mirror shared with the userbot, kept fresh via NOTIFY
+        self.settings = BotSettingsCache()
+        # Free-group join buffer drained by join_flush_loop
+        self.join_buffer = []
+        self.join_flush_event = asyncio.Event()
+        # VIP join requests drained by join_request_flush_loop
+        self.join_request_buffer = []
+        self.join_request_event = asyncio.Event()
+        self.join_request_limiter = asyncio.Semaphore(
+            JOIN_REQUEST_BATCH_CONFIG['concurrency'])
+        # VIP membership known from member updates and lookups: user_id -> bool
+        self.vip_roster = {}
 
         # Handle BOT_OWNER_USER_ID from environment
         global BOT_OWNER_USER_ID
@@ -540,14 +668,16 @@ class TelegramTradingBot:
         @self.app.on_chat_member_updated()
         async def handle_member_update(client,
                                        member_update: ChatMemberUpdated):
-            # Log all member updates to debug for visibility
-            if member_update.new_chat_member:
+            # Log member updates to debug for visibility; Free-group joins
+            # are summarised per batch by the join pipeline instead
+            if member_update.new_chat_member and member_update.chat.id != FREE_GROUP_ID:
                 user = member_update.new_chat_member.user
                 chat = member_update.chat
                 status = member_update.new_chat_member.status
                 await self.log_to_debug(
                     f"👤 Member Update: {user.first_name} ({user.id}) joined/updated in {chat.title} as {status}"
                 )
+            self.update_vip_roster(member_update)
             await self.process_member_update(client, member_update)
 
         @self.app.on_callback_query(filters.regex("^entry_"))
@@ -750,11 +880,11 @@ class TelegramTradingBot:
         try:
             # Send to debug group instead of current chat
             if DEBUG_GROUP_ID:
-                await self.app.send_message(
-                    DEBUG_GROUP_ID,
-                    debug_text,
-                    reply_markup=keyboard
-                )
+                await self.send_scheduled(DEBUG_GROUP_ID,
+                                          debug_text,
+                                          PRIORITY_DEBUG,
+                                          "profile request",
+                                          reply_markup=keyboard)
                 await message.reply(f"✅ Profile link for `{user_id}` sent to **Debug Group**.")
             else:
                 await message.reply("❌ **Error:** `DEBUG_GROUP_ID` is not configured.")
@@ -773,9 +903,8 @@ class TelegramTradingBot:
                     pass
             return
 
-        # Track engagement in free group
-        if message.chat.id == FREE_GROUP_ID and message.reactions:
-            asyncio.create_task(self._fetch_and_store_reactions(message))
+        # Free-group reactions are ingested by the userbot service
+        # (per-user reaction lists are only available to user accounts)
 
         # detect manual signals from owner
         if not message.from_user or not message.text:
@@ -819,20 +948,24 @@ class TelegramTradingBot:
             await self.log_to_debug(
                 f"Parsed manual signal: {pair} {action} @ {entry_price}")
 
-            # For excluded pairs, we track them manually but don't auto-check prices
-            manual_tracking_only = pair in EXCLUDED_FROM_TRACKING
+            # Excluded pairs without a secondary feed are tracked manually, no auto price checks
+            manual_tracking_only = self.is_manual_tracking_pair(pair)
             if manual_tracking_only:
                 await self.log_to_debug(
                     f"Adding {pair} to manual tracking only (no automatic price monitoring). Will be visible in /activetrades."
                 )
 
-            assigned_api = await self.get_working_api_for_pair(
+            assigned_api = await self.price_feeds.get_working_api_for_pair(
                 pair) if not manual_tracking_only else 'manual'
 
-            live_price = await self.get_live_price(pair)
+            # "buy limit" -> "limit" selects the per-strategy ladder
+            strategy = (trade_data.get('entry_type')
+                        or 'execution').split()[-1]
+
+            live_price = await self.price_feeds.get_live_price(pair)
             if live_price:
                 live_tracking_levels = self.calculate_tp_sl_levels(
-                    live_price, pair, action)
+                    live_price, pair, action, strategy)
                 await self.log_to_debug(
                     f"Manual signal tracking setup for {pair}:\n"
                     f"- User entered price: {entry_price}\n"
@@ -843,7 +976,7 @@ class TelegramTradingBot:
                     f"- Tracking SL: {live_tracking_levels['sl']:.5f}")
             else:
                 live_tracking_levels = self.calculate_tp_sl_levels(
-                    entry_price, pair, action)
+                    entry_price, pair, action, strategy)
                 live_price = entry_price
                 await self.log_to_debug(
                     f"Could not get live price for {pair}, using entered price for tracking"
@@ -1023,20 +1156,41 @@ class TelegramTradingBot:
             logger.error(f"Error parsing signal message: {e}")
             return None
 
+    def render_onboarding_widget(self, user_id: int, step: int,
+                                 total_steps: int, status_text: str):
+        # Standard professional header
+        msg_text = f"👤 **Member Onboarding: {user_id}**\n\n"
+        msg_text += f"📊 **Progress:** Step {step}/{total_steps}\n"
+        msg_text += f"📝 **Status:** {status_text}\n"
+        msg_text += f"\n👤 **User ID:** `{user_id}`"
+
+        # Build the button URL to open user's profile
+        button_url = f"tg://user?id={user_id}"
+        keyboard = InlineKeyboardMarkup(
+            [[InlineKeyboardButton("👤 View User Profile", url=button_url)]])
+        return msg_text, keyboard
+
     async def update_onboarding_widget(self,
                                        user_id: int,
                                        step: int,
                                        total_steps: int,
                                        status_text: str,
                                        message_id: Optional[int] = None):
-        """Updates a consolidated onboarding message for a specific user."""
+        """Updates a consolidated onboarding message for a specific user.
+
+        The first state of a widget is sent right away so callers get its
+        message id; later states are debounced and only the last one of a
+        burst is edited in.
+        """
         try:
-            # If message_id is not provided, try to fetch it from memory or DB
+            pending = self.widget_pending.get(user_id)
             if not message_id:
-                message_id = getattr(self, 'onboarding_widgets',
-                                     {}).get(user_id)
+                message_id = (pending or {}).get(
+                    'message_id') or self.onboarding_widgets.get(user_id)
 
-            if not message_id and self.db_pool:
+            # Only look the widget up in the DB the first time we see this user
+            if not message_id and self.db_pool and user_id not in self.widget_lookups:
+                self.widget_lookups.add(user_id)
                 try:
                     async with self.db_pool.acquire() as conn:
                         val = await conn.fetchval(
@@ -1047,53 +1201,109 @@ class TelegramTradingBot:
                 except Exception:
                     pass
 
-            # Standard professional header
-            msg_text = f"👤 **Member Onboarding: {user_id}**\n\n"
-            msg_text += f"📊 **Progress:** Step {step}/{total_steps}\n"
-            msg_text += f"📝 **Status:** {status_text}\n"
-            msg_text += f"\n👤 **User ID:** `{user_id}`"
+            if not message_id:
+                msg_text, keyboard = self.render_onboarding_widget(
+                    user_id, step, total_steps, status_text)
+                sent_msg = await self.send_scheduled(DEBUG_GROUP_ID,
+                                                     msg_text,
+                                                     PRIORITY_ONBOARDING,
+                                                     "onboarding widget",
+                                                     reply_markup=keyboard)
+                self.remember_onboarding_widget(user_id, sent_msg.id)
+                return sent_msg.id
 
-            # Build the button URL to open user's profile
-            button_url = f"tg://user?id={user_id}"
-            keyboard = InlineKeyboardMarkup(
-                [[InlineKeyboardButton("👤 View User Profile",
-                                       url=button_url)]])
+            self.onboarding_widgets[user_id] = message_id
+            self.widget_pending[user_id] = {
+                'message_id': message_id,
+                'state': (step, total_steps, status_text)
+            }
+            if user_id not in self.widget_flush_tasks:
+                self.widget_flush_tasks[user_id] = asyncio.create_task(
+                    self.flush_onboarding_widget(user_id))
+            return message_id
+        except Exception as e:
+            logger.error(f"Failed to update onboarding widget: {e}")
+            return None
 
-            if message_id:
-                try:
-                    await self.app.edit_message_text(DEBUG_GROUP_ID,
-                                                     message_id,
+    async def flush_onboarding_widget(self, user_id: int):
+        """Edit the latest state of a widget in once its burst has settled."""
+        try:
+            await asyncio.sleep(ONBOARDING_WIDGET_DEBOUNCE_SECONDS)
+        finally:
+            self.widget_flush_tasks.pop(user_id, None)
+        pending = self.widget_pending.pop(user_id, None)
+        if not pending:
+            return
+
+        message_id = pending['message_id']
+        msg_text, keyboard = self.render_onboarding_widget(
+            user_id, *pending['state'])
+        try:
+            await self.send_scheduler.submit(
+                DEBUG_GROUP_ID,
+                lambda: self.app.edit_message_text(DEBUG_GROUP_ID,
+                                                   message_id,
+                                                   msg_text,
+                                                   reply_markup=keyboard),
+                PRIORITY_ONBOARDING, "onboarding widget")
+        except Exception as e:
+            # If edit fails (e.g. message too old or deleted), send new one
+            logger.debug(f"Edit failed for widget {message_id}: {e}")
+            try:
+                sent_msg = await self.send_scheduled(DEBUG_GROUP_ID,
                                                      msg_text,
+                                                     PRIORITY_ONBOARDING,
+                                                     "onboarding widget",
                                                      reply_markup=keyboard)
-                    return message_id
-                except Exception as e:
-                    # If edit fails (e.g. message too old or deleted), send new one
-                    logger.debug(f"Edit failed for widget {message_id}: {e}")
-                    pass
+                if user_id in self.onboarding_widgets:
+                    self.remember_onboarding_widget(user_id, sent_msg.id)
+            except Exception as e2:
+                logger.error(f"Failed to update onboarding widget: {e2}")
 
-            sent_msg = await self.app.send_message(DEBUG_GROUP_ID,
-                                                   msg_text,
-                                                   reply_markup=keyboard)
+    def remember_onboarding_widget(self, user_id: int, message_id: int):
+        self.onboarding_widgets[user_id] = message_id
+        self.widget_id_writes[user_id] = message_id
 
-            # Store the new message ID
-            if not hasattr(self, 'onboarding_widgets'):
-                self.onboarding_widgets = {}
-            self.onboarding_widgets[user_id] = sent_msg.id
+    def finish_onboarding_widget(self, user_id: int):
+        """Stop tracking a finished widget; its last pending edit still goes out."""
+        self.onboarding_widgets.pop(user_id, None)
+        self.widget_lookups.discard(user_id)
+        self.widget_id_writes[user_id] = None
 
-            if self.db_pool:
-                try:
-                    async with self.db_pool.acquire() as conn:
-                        await conn.execute(
+    async def persist_widget_ids(self):
+        """Write queued widget message-id changes to bot_status in one batch."""
+        if not self.widget_id_writes or not self.db_pool:
+            return
+        writes = self.widget_id_writes
+        self.widget_id_writes = {}
+        upserts = [(f"onboarding_msg_{user_id}", str(message_id))
+                   for user_id, message_id in writes.items()
+                   if message_id is not None]
+        deletes = [
+            f"onboarding_msg_{user_id}"
+            for user_id, message_id in writes.items() if message_id is None
+        ]
+        try:
+            async with self.db_pool.acquire() as conn:
+                async with conn.transaction():
+                    if upserts:
+                        await conn.executemany(
                             "INSERT INTO bot_status (status_key, status_value) VALUES ($1, $2) "
                             "ON CONFLICT (status_key) DO UPDATE SET status_value = $2",
-                            f"onboarding_msg_{user_id}", str(sent_msg.id))
-                except Exception:
-                    pass
-
-            return sent_msg.id
+                            upserts)
+                    if deletes:
+                        await conn.execute(
+                            "DELETE FROM bot_status WHERE status_key = ANY($1::text[])",
+                            deletes)
         except Exception as e:
-            logger.error(f"Failed to update onboarding widget: {e}")
-            return None
+            logger.error(f"Failed to persist onboarding widget ids: {e}")
+            # Keep anything newer that arrived meanwhile
+            self.widget_id_writes = {**writes, **self.widget_id_writes}
+
+    async def widget_persist_loop(self):
+        while self.running:
+            await asyncio.sleep(ONBOARDING_WIDGET_PERSIST_INTERVAL)
+            await self.persist_widget_ids()
 
     async def log_to_debug(self,
                            message: str,
@@ -1101,33 +1311,34 @@ class TelegramTradingBot:
                            user_id: Optional[int] = None,
                            failed_message: Optional[str] = None):
         if DEBUG_GROUP_ID:
-            try:
-                # Standardize professional debug headers
-                if is_error:
-                    msg_text = f"🚨 **SYSTEM ERROR**\n\n**Issue:** {message}\n\n[Owner](tg://user?id={BOT_OWNER_USER_ID})"
-                else:
-                    msg_text = f"📊 **SYSTEM LOG**\n\n**Event:** {message}"
+            self.debug_shipper.log(message, is_error, user_id)
+            self.debug_shipper.start()
+        log_level = logging.ERROR if is_error else logging.INFO
+        logger.log(log_level, message)
 
-                # Add user ID button if user_id is provided
-                keyboard = None
-                if user_id:
-                    msg_text += f"\n\n👤 **User ID:** `{user_id}`"
+    async def send_debug_digest(self, msg_text: str, user_id: Optional[int],
+                                is_error: bool):
+        """Deliver one digest from the debug log shipper to the Debug Group."""
+        if is_error:
+            msg_text += f"\n\n[Owner](tg://user?id={BOT_OWNER_USER_ID})"
 
-                    # Build the button URL to open user's profile
-                    button_url = f"tg://user?id={user_id}"
+        # Add user ID button if user_id is provided
+        keyboard = None
+        if user_id:
+            msg_text += f"\n\n👤 **User ID:** `{user_id}`"
 
-                    keyboard = InlineKeyboardMarkup([[
-                        InlineKeyboardButton("👤 View User Profile",
-                                             url=button_url)
-                    ]])
+            # Build the button URL to open user's profile
+            button_url = f"tg://user?id={user_id}"
 
-                await self.app.send_message(DEBUG_GROUP_ID,
-                                            msg_text,
-                                            reply_markup=keyboard)
-            except Exception as e:
-                logger.error(f"Failed to send debug log: {e}")
-        log_level = logging.ERROR if is_error else logging.INFO
-        logger.log(log_level, message)
+            keyboard = InlineKeyboardMarkup([[
+                InlineKeyboardButton("👤 View User Profile", url=button_url)
+            ]])
+
+        await self.send_scheduled(DEBUG_GROUP_ID,
+                                  msg_text,
+                                  PRIORITY_DEBUG,
+                                  "debug log",
+                                  reply_markup=keyboard)
 
     def is_weekend_time(self, check_time: datetime) -> bool:
         if PYTZ_AVAILABLE:
@@ -1203,30 +1414,33 @@ class TelegramTradingBot:
 
         return expiry_time.astimezone(AMSTERDAM_TZ)
 
-    def calculate_tp_sl_levels(self, entry_price: float, pair: str,
-                               action: str) -> dict:
-        if pair.upper() in PAIR_CONFIG:
-            pip_value = PAIR_CONFIG[pair.upper()]['pip_value']
+    def calculate_tp_sl_levels(self,
+                               entry_price: float,
+                               pair: str,
+                               action: str,
+                               strategy: str = 'default') -> dict:
+        ladder = self.get_ladder(pair, strategy)
+
+        if ladder['mode'] == 'percent':
+            offsets = {
+                level: entry_price * ladder[level]
+                for level in ('tp1', 'tp2', 'tp3', 'sl')
+            }
         else:
-            pip_value = 0.0001
-
-        tp1_pips = 20 * pip_value
-        tp2_pips = 40 * pip_value
-        tp3_pips = 70 * pip_value
-        sl_pips = 50 * pip_value
+            offsets = ladder
 
         is_buy = action.upper() == "BUY"
 
         if is_buy:
-            tp1 = entry_price + tp1_pips
-            tp2 = entry_price + tp2_pips
-            tp3 = entry_price + tp3_pips
-            sl = entry_price - sl_pips
+            tp1 = entry_price + offsets['tp1']
+            tp2 = entry_price + offsets['tp2']
+            tp3 = entry_price + offsets['tp3']
+            sl = entry_price - offsets['sl']
         else:
-            tp1 = entry_price - tp1_pips
-            tp2 = entry_price - tp2_pips
-            tp3 = entry_price - tp3_pips
-            sl = entry_price + sl_pips
+            tp1 = entry_price - offsets['tp1']
+            tp2 = entry_price - offsets['tp2']
+            tp3 = entry_price - offsets['tp3']
+            sl = entry_price + offsets['sl']
 
         return {
             'entry': entry_price,
@@ -1236,6 +1450,182 @@ class TelegramTradingBot:
             'sl': sl
         }
 
+    def _fixed_pip_ladder(self, pair: str, pips: tuple) -> dict:
+        pip_value = PAIR_CONFIG.get(pair, {}).get('pip_value', 0.0001)
+        return {
+            'mode': 'offset',
+            'source': 'pips',
+            'tp1': pips[0] * pip_value,
+            'tp2': pips[1] * pip_value,
+            'tp3': pips[2] * pip_value,
+            'sl': pips[3] * pip_value
+        }
+
+    def get_ladder(self, pair: str, strategy: str = 'default') -> dict:
+        """O(1) lookup in the precomputed ladder tables; falls back to the fixed pip ladder"""
+        pair = pair.upper()
+        strategy = (strategy or 'default').lower()
+        tables = self.ladder_tables
+        return (tables.get((pair, strategy)) or tables.get((pair, 'default'))
+                or tables.get(('*', strategy)) or tables.get(('*', 'default'))
+                or self._fixed_pip_ladder(pair, LADDER_CONFIG['default_pips']))
+
+    def _profile_ladder(self, mode: str, pair: str, values: tuple,
+                        volatility: dict) -> dict:
+        if mode == 'percent':
+            return {
+                'mode': 'percent',
+                'source': 'percent',
+                'tp1': values[0] / 100,
+                'tp2': values[1] / 100,
+                'tp3': values[2] / 100,
+                'sl': values[3] / 100
+            }
+        if mode == 'atr':
+            atr = volatility.get(pair)
+            if not atr:
+                return self._fixed_pip_ladder(pair,
+                                              LADDER_CONFIG['default_pips'])
+            return {
+                'mode': 'offset',
+                'source': 'atr',
+                'tp1': values[0] * atr,
+                'tp2': values[1] * atr,
+                'tp3': values[2] * atr,
+                'sl': values[3] * atr
+            }
+        return self._fixed_pip_ladder(pair, values)
+
+    def build_ladder_tables(self, profiles: list, volatility: dict) -> dict:
+        """Turn tp_sl_profiles rows into per-pair offset tables.
+
+        Wildcard ('*') profiles are expanded for every configured pair so lookups
+        never compute anything. ATR profiles without a volatility reading yet fall
+        back to the fixed pip ladder for that pair.
+        """
+        tables = {}
+        # Specific pairs are applied after wildcards so they always win
+        for row in sorted(profiles, key=lambda r: r['pair'] != '*'):
+            strategy = (row['strategy'] or 'default').lower()
+            values = (float(row['tp1']), float(row['tp2']), float(row['tp3']),
+                      float(row['sl']))
+
+            if row['pair'] == '*':
+                pairs = list(PAIR_CONFIG.keys())
+                # Pairs missing from PAIR_CONFIG use the wildcard entry directly
+                if row['mode'] != 'atr':
+                    tables[('*', strategy)] = self._profile_ladder(
+                        row['mode'], '*', values, volatility)
+            else:
+                pairs = [row['pair'].upper()]
+
+            for pair in pairs:
+                tables[(pair, strategy)] = self._profile_ladder(
+                    row['mode'], pair, values, volatility)
+        return tables
+
+    async def load_ladder_profiles(self):
+        """Reload profiles and cached volatility from the DB and rebuild the level tables"""
+        if not self.db_pool:
+            return
+        try:
+            async with self.db_pool.acquire() as conn:
+                profiles = await conn.fetch(
+                    "SELECT pair, strategy, mode, tp1, tp2, tp3, sl FROM tp_sl_profiles"
+                )
+                volatility_rows = await conn.fetch(
+                    "SELECT pair, atr FROM pair_volatility")
+            volatility = {
+                row['pair']: float(row['atr'])
+                for row in volatility_rows if row['atr']
+            }
+            self.ladder_tables = self.build_ladder_tables(
+                list(profiles), volatility)
+            logger.info(
+                f"Loaded {len(profiles)} TP/SL profiles into {len(self.ladder_tables)} ladder tables"
+            )
+        except Exception as e:
+            logger.error(f"Error loading TP/SL profiles: {e}")
+
+    async def refresh_pair_volatility(self):
+        """Recompute ATR for pairs that use ATR-scaled profiles and persist it"""
+        async with self.db_pool.acquire() as conn:
+            rows = await conn.fetch(
+                "SELECT DISTINCT pair FROM tp_sl_profiles WHERE mode = 'atr'")
+        pairs = set()
+        for row in rows:
+            if row['pair'] == '*':
+                pairs.update(PAIR_CONFIG.keys())
+            else:
+                pairs.add(row['pair'].upper())
+        if not pairs:
+            return
+
+        period = LADDER_CONFIG['atr_period']
+        timeframe = LADDER_CONFIG['atr_timeframe_minutes']
+        end = datetime.now(pytz.UTC)
+        start = end - timedelta(minutes=timeframe * (period + 2))
+
+        async with aiohttp.ClientSession() as session:
+
+            async def pair_atr(pair: str) -> tuple:
+                candles = await self.get_historical_candles(
+                    session, pair, start, end)
+                if not candles:
+                    return pair, None
+                return pair, signal_replay.average_true_range(
+                    candles, period, timeframe)
+
+            results = await asyncio.gather(
+                *[pair_atr(pair) for pair in sorted(pairs)],
+                return_exceptions=True)
+
+        readings = [
+            result for result in results
+            if not isinstance(result, Exception) and result[1]
+        ]
+        if readings:
+            async with self.db_pool.acquire() as conn:
+                await conn.executemany(
+                    """INSERT INTO pair_volatility (pair, atr, updated_at)
+                       VALUES ($1, $2, NOW())
+                       ON CONFLICT (pair) DO UPDATE SET atr = $2, updated_at = NOW()""",
+                    readings)
+
+    async def ladder_refresh_loop(self):
+        """Refresh volatility inputs and rebuild ladder tables on a schedule"""
+        while self.running:
+            try:
+                if self.db_pool:
+                    await self.refresh_pair_volatility()
+                    await self.load_ladder_profiles()
+            except Exception as e:
+                logger.error(f"Error in ladder refresh loop: {e}")
+
+            await asyncio.sleep(LADDER_CONFIG['refresh_interval'])
+
+    async def partition_retention_loop(self):
+        """Create upcoming history partitions and retire expired ones daily"""
+        while self.running:
+            try:
+                if self.db_pool:
+                    async with self.db_pool.acquire() as conn:
+                        summary = await run_retention(conn)
+                        await purge_sent(
+                            conn, NOTIFICATION_OUTBOX_CONFIG['keep_sent_days'])
+                    if summary['dropped']:
+                        await self.log_to_debug(
+                            f"🗄️ Retired {len(summary['dropped'])} history partitions: {', '.join(summary['dropped'])}"
+                        )
+                    if summary['kept']:
+                        logger.warning(
+                            f"Partitions past retention kept (set PARTITION_ARCHIVE_DIR to export them): {', '.join(summary['kept'])}"
+                        )
+            except Exception as e:
+                logger.error(f"Error in partition retention loop: {e}")
+
+            await asyncio.sleep(PARTITION_RETENTION['interval'])
+
     async def handle_entry(self, client: Client, message: Message):
         if not await self.is_owner(message.from_user.id):
             return
@@ -1421,6 +1811,15 @@ class TelegramTradingBot:
             f"Ready to send?",
             reply_markup=keyboard)
 
+    async def signal_price_snapshot(self, pair: str,
+                                    manual_tracking_only: bool) -> tuple:
+        """(assigned API, live price) for a new signal, fetched concurrently"""
+        if manual_tracking_only:
+            return 'manual', await self.price_feeds.get_live_price(pair)
+        return tuple(await asyncio.gather(
+            self.price_feeds.get_working_api_for_pair(pair),
+            self.price_feeds.get_live_price(pair)))
+
     async def execute_entry_signal(self, client: Client,
                                    callback_query: CallbackQuery,
                                    entry_data: dict):
@@ -1433,7 +1832,7 @@ class TelegramTradingBot:
         signal_channels = entry_data['groups']
 
         if not entry_price:
-            live_price = await self.get_live_price(pair)
+            live_price = await self.price_feeds.get_live_price(pair)
             if live_price:
                 entry_price = live_price
             else:
@@ -1443,7 +1842,8 @@ class TelegramTradingBot:
                 PENDING_ENTRIES.pop(user_id, None)
                 return
 
-        levels = self.calculate_tp_sl_levels(entry_price, pair, action)
+        levels = self.calculate_tp_sl_levels(entry_price, pair, action,
+                                             entry_type)
         decimals = PAIR_CONFIG.get(pair, {}).get('decimals', 5)
 
         def fmt(price):
@@ -1466,40 +1866,51 @@ class TelegramTradingBot:
         if not signal_channels:
             signal_channels = [callback_query.message.chat.id]
 
-        sent_count = 0
-        sent_messages = []
-
-        for channel_id in signal_channels:
-            try:
-                sent_msg = await self.app.send_message(channel_id, signal_text)
-                sent_count += 1
-                if channel_id == VIP_GROUP_ID:
-                    group_name = "VIP"
-                elif channel_id == FREE_GROUP_ID:
-                    group_name = "Free"
-                else:
-                    group_name = "Manual Signal"
-                sent_messages.append({
-                    'message': sent_msg,
-                    'channel_id': channel_id,
-                    'group_name': group_name
-                })
-            except Exception as e:
-                logger.error(
-                    f"Failed to send signal to channel {channel_id}: {e}")
-
         track_price = entry_data.get('track_price', True)
 
-        # BTCUSD, XAUUSD, GER40, US100 are still tracked but not automatically monitored
-        manual_tracking_only = pair.upper() in EXCLUDED_FROM_TRACKING
+        # BTCUSD, XAUUSD, GER40, US100 are only monitored automatically when a secondary feed is set
+        manual_tracking_only = self.is_manual_tracking_pair(pair)
 
-        if sent_messages and (track_price or manual_tracking_only):
-            assigned_api = await self.get_working_api_for_pair(pair) if not manual_tracking_only else 'manual'
+        # The tracking price snapshot is taken while the posts go out, and
+        # shared by every channel's trade
+        snapshot_task = None
+        if track_price or manual_tracking_only:
+            snapshot_task = asyncio.create_task(
+                self.signal_price_snapshot(pair, manual_tracking_only))
 
-            live_price = await self.get_live_price(pair)
+        # All channels at once; the send scheduler only serialises per chat
+        results = await asyncio.gather(*(self.send_scheduled(
+            channel_id, signal_text, PRIORITY_SIGNAL, "signal")
+                                          for channel_id in signal_channels),
+                                       return_exceptions=True)
+
+        sent_messages = []
+        for channel_id, sent_msg in zip(signal_channels, results):
+            if isinstance(sent_msg, Exception) or sent_msg is None:
+                logger.error(
+                    f"Failed to send signal to channel {channel_id}: {sent_msg}"
+                )
+                continue
+            if channel_id == VIP_GROUP_ID:
+                group_name = "VIP"
+            elif channel_id == FREE_GROUP_ID:
+                group_name = "Free"
+            else:
+                group_name = "Manual Signal"
+            sent_messages.append({
+                'message': sent_msg,
+                'channel_id': channel_id,
+                'group_name': group_name
+            })
+        sent_count = len(sent_messages)
+
+        if snapshot_task and not sent_messages:
+            snapshot_task.cancel()
+        elif snapshot_task:
+            assigned_api, live_price = await snapshot_task
             if live_price:
                 live_tracking_levels = self.calculate_tp_sl_levels(
-                    live_price, pair, action)
+                    live_price, pair, action, entry_type)
                 await self.log_to_debug(
                     f"Price tracking setup for {pair}:\n"
                     f"- User entered price: {entry_price}\n"
@@ -1515,82 +1926,87 @@ class TelegramTradingBot:
                     f"Could not get live price for {pair}, using user-entered price for tracking"
                 )
 
-            for msg_info in sent_messages:
-                sent_msg = msg_info['message']
-                channel_id = msg_info['channel_id']
-                group_name = msg_info['group_name']
-
-                trade_key = f"{channel_id}_{sent_msg.id}"
-
-                trade_data = {
-                    'message_id':
-                    str(sent_msg.id),
-                    'trade_key':
-                    trade_key,
-                    'chat_id':
-                    sent_msg.chat.id,
-                    'pair':
-                    pair,
-                    'action':
-                    action,
-                    'entry_type':
-                    entry_type,
-                    'entry_price':
-                    float(entry_price),
-                    'tp1_price':
-                    float(live_tracking_levels['tp1']),
-                    'tp2_price':
-                    float(live_tracking_levels['tp2']),
-                    'tp3_price':
-                    float(live_tracking_levels['tp3']),
-                    'sl_price':
-                    float(live_tracking_levels['sl']),
-                    'entry':
-                    float(live_price),
-                    'tp1':
-                    float(live_tracking_levels['tp1']),
-                    'tp2':
-                    float(live_tracking_levels['tp2']),
-                    'tp3':
-                    float(live_tracking_levels['tp3']),
-                    'sl':
-                    float(live_tracking_levels['sl']),
-                    'telegram_entry':
-                    float(entry_price),
-                    'telegram_tp1':
-                    float(levels['tp1']),
-                    'telegram_tp2':
-                    float(levels['tp2']),
-                    'telegram_tp3':
-                    float(levels['tp3']),
-                    'telegram_sl':
-                    float(levels['sl']),
-                    'live_entry':
-                    float(live_price),
-                    'assigned_api':
-                    assigned_api,
-                    'status':
-                    'active',
-                    'tp_hits': [],
-                    'manual_overrides': [],
-                    'breakeven_active':
-                    False,
-                    'manual_tracking_only':
-                    manual_tracking_only,
-                    'created_at':
-                    datetime.now(pytz.UTC).astimezone(AMSTERDAM_TZ).isoformat(),
-                    'group_name':
-                    group_name,
-                    'channel_id':
-                    channel_id
-                }
-
-                PRICE_TRACKING_CONFIG['active_trades'][trade_key] = trade_data
-                await self.save_trade_to_db(trade_key, trade_data)
-                asyncio.create_task(
-                    self.check_single_trade_immediately(trade_key, trade_data))
-
-        if pair in EXCLUDED_FROM_TRACKING:
+            # One tracked position for the signal, linked to every channel
+            # post: priced and persisted once, hit replies go to each post
+            primary = sent_messages[0]
+            sent_msg = primary['message']
+            channel_id = primary['channel_id']
+            trade_key = f"{channel_id}_{sent_msg.id}"
+
+            trade_data = {
+                'message_id':
+                str(sent_msg.id),
+                'trade_key':
+                trade_key,
+                'chat_id':
+                sent_msg.chat.id,
+                'pair':
+                pair,
+                'action':
+                action,
+                'entry_type':
+                entry_type,
+                'entry_price':
+                float(entry_price),
+                'tp1_price':
+                float(live_tracking_levels['tp1']),
+                'tp2_price':
+                float(live_tracking_levels['tp2']),
+                'tp3_price':
+                float(live_tracking_levels['tp3']),
+                'sl_price':
+                float(live_tracking_levels['sl']),
+                'entry':
+                float(live_price),
+                'tp1':
+                float(live_tracking_levels['tp1']),
+                'tp2':
+                float(live_tracking_levels['tp2']),
+                'tp3':
+                float(live_tracking_levels['tp3']),
+                'sl':
+                float(live_tracking_levels['sl']),
+                'telegram_entry':
+                float(entry_price),
+                'telegram_tp1':
+                float(levels['tp1']),
+                'telegram_tp2':
+                float(levels['tp2']),
+                'telegram_tp3':
+                float(levels['tp3']),
+                'telegram_sl':
+                float(levels['sl']),
+                'live_entry':
+                float(live_price),
+                'assigned_api':
+                assigned_api,
+                'status':
+                'active',
+                'tp_hits': [],
+                'manual_overrides': [],
+                'breakeven_active':
+                False,
+                'manual_tracking_only':
+                manual_tracking_only,
+                'created_at':
+                datetime.now(pytz.UTC).astimezone(AMSTERDAM_TZ).isoformat(),
+                'group_name':
+                " + ".join(m['group_name'] for m in sent_messages),
+                'channel_id':
+                channel_id,
+                'channel_message_map': {
+                    str(m['channel_id']): m['message'].id
+                    for m in sent_messages
+                },
+                'all_channel_ids': [m['channel_id'] for m in sent_messages]
+            }
+
+            PRICE_TRACKING_CONFIG['active_trades'][trade_key] = trade_data
+            await self.save_trade_to_db(trade_key, trade_data)
+            asyncio.create_task(
+                self.check_single_trade_immediately(trade_key, trade_data))
+
+        if manual_tracking_only:
             tracking_status = f"No price tracking ({pair} is manually tracked)."
         elif track_price:
             tracking_status = "Live price tracking is now active."
@@ -1629,10 +2045,6 @@ class TelegramTradingBot:
                     session_string = await temp_client.export_session_string()
 
                     async with self.db_pool.acquire() as conn:
-                        # Ensure bot_settings table exists
-                        await conn.execute(
-                            "CREATE TABLE IF NOT EXISTS bot_settings (setting_key TEXT PRIMARY KEY, setting_value TEXT)"
-                        )
                         await conn.execute(
                             """
                             INSERT INTO bot_settings (setting_key, setting_value)
@@ -1831,7 +2243,7 @@ class TelegramTradingBot:
                           dict) and awaiting_data.get('type') == 'pricetest':
                 await message.reply(f"Fetching live price for **{pair}**...")
 
-                price = await self.get_live_price(pair)
+                price = await self.price_feeds.get_live_price(pair)
                 if price:
                     pair_name = PAIR_CONFIG.get(pair, {}).get('name', pair)
                     decimals = PAIR_CONFIG.get(pair, {}).get('decimals', 5)
@@ -1962,7 +2374,7 @@ class TelegramTradingBot:
             tp3 = trade.get('tp3_price', trade.get('tp3', 0))
             sl = trade.get('sl_price', trade.get('sl', 0))
 
-            live_price = await self.get_live_price(pair)
+            live_price = await self.price_feeds.get_live_price(pair)
 
             if live_price:
                 position_info = self.analyze_trade_position(
@@ -2256,7 +2668,9 @@ class TelegramTradingBot:
                     failed_trades.append(f"ID {idx}: Not found")
                     continue
 
-                trade = PRICE_TRACKING_CONFIG['active_trades'][full_msg_id]
+                # Edited on a copy; memory follows only once the DB write commits
+                trade = dict(
+                    PRICE_TRACKING_CONFIG['active_trades'][full_msg_id])
                 pair = trade.get('pair', 'Unknown')
                 action = trade.get('action', 'Unknown')
                 group_name = trade.get('group_name', '')
@@ -2265,10 +2679,14 @@ class TelegramTradingBot:
                 try:
                     if action_type == 'slhit':
                         trade['status'] = 'closed (sl hit - manual override)'
-                        await self.remove_trade_from_db(
-                            full_msg_id, 'manual_sl_hit')
-                        await self.send_sl_notification(
-                            full_msg_id, trade, trade.get('sl_price', 0))
+                        if not await self.remove_trade_from_db(
+                            full_msg_id,
+                            'manual_sl_hit',
+                            trade,
+                            notifications=self.trade_notification(
+                                full_msg_id, trade, 'SL',
+                                self.sl_notification_text())):
+                            raise RuntimeError("not saved, try again")
                         successful_trades.append(
                             f"{pair} {action}{group_label} - SL Hit")
 
@@ -2277,23 +2695,36 @@ class TelegramTradingBot:
                             trade['tp_hits'] = trade.get('tp_hits',
                                                          []) + ['TP1']
                         trade['status'] = 'active (tp1 hit - manual override)'
-                        await self.update_trade_in_db(full_msg_id, trade)
-                        await self.send_tp_notification(
-                            full_msg_id, trade, 'TP1',
-                            trade.get('tp1_price', 0))
+                        if not await self.append_trade_event(
+                            full_msg_id,
+                            'tp1_hit',
+                            trade.get('tp1_price'),
+                            trade['status'],
+                            'manual_tp1_hit',
+                            notifications=self.trade_notification(
+                                full_msg_id, trade, 'TP1',
+                                self.tp_notification_text('TP1'))):
+                            raise RuntimeError("not saved, try again")
                         successful_trades.append(
                             f"{pair} {action}{group_label} - TP1 Hit")
+                        PRICE_TRACKING_CONFIG['active_trades'][
+                            full_msg_id].update(trade)
 
                     elif action_type == 'tp2hit':
                         current_tp_hits = trade.get('tp_hits', [])
                         if 'TP1' not in current_tp_hits:
                             trade['tp_hits'] = trade.get('tp_hits',
                                                          []) + ['TP1']
-                            await self.update_trade_in_db(full_msg_id, trade)
-                            await self.send_tp_notification(
-                                full_msg_id, trade, 'TP1',
-                                trade.get('tp1_price', 0))
-                            await asyncio.sleep(1)
+                            if not await self.append_trade_event(
+                                full_msg_id,
+                                'tp1_hit',
+                                trade.get('tp1_price'),
+                                None,
+                                'manual_tp1_hit',
+                                notifications=self.trade_notification(
+                                    full_msg_id, trade, 'TP1',
+                                    self.tp_notification_text('TP1'))):
+                                raise RuntimeError("not saved, try again")
 
                         if 'TP2' not in trade.get('tp_hits', []):
                             trade['tp_hits'] = trade.get('tp_hits',
@@ -2301,62 +2732,88 @@ class TelegramTradingBot:
                         trade['breakeven_active'] = True
                         trade[
                             'status'] = 'active (tp2 hit - manual override - breakeven active)'
-                        await self.update_trade_in_db(full_msg_id, trade)
-                        await self.send_tp_notification(
-                            full_msg_id, trade, 'TP2',
-                            trade.get('tp2_price', 0))
+                        if not await self.append_trade_event(
+                            full_msg_id,
+                            'tp2_hit',
+                            trade.get('tp2_price'),
+                            trade['status'],
+                            'manual_tp2_hit',
+                            notifications=self.trade_notification(
+                                full_msg_id, trade, 'TP2',
+                                self.tp_notification_text('TP2'))):
+                            raise RuntimeError("not saved, try again")
                         successful_trades.append(
                             f"{pair} {action}{group_label} - TP2 Hit")
+                        PRICE_TRACKING_CONFIG['active_trades'][
+                            full_msg_id].update(trade)
 
                     elif action_type == 'tp3hit':
                         current_tp_hits = trade.get('tp_hits', [])
                         if 'TP1' not in current_tp_hits:
                             trade['tp_hits'] = trade.get('tp_hits',
                                                          []) + ['TP1']
-                            await self.update_trade_in_db(full_msg_id, trade)
-                            await self.send_tp_notification(
-                                full_msg_id, trade, 'TP1',
-                                trade.get('tp1_price', 0))
-                            await asyncio.sleep(1)
+                            if not await self.append_trade_event(
+                                full_msg_id,
+                                'tp1_hit',
+                                trade.get('tp1_price'),
+                                None,
+                                'manual_tp1_hit',
+                                notifications=self.trade_notification(
+                                    full_msg_id, trade, 'TP1',
+                                    self.tp_notification_text('TP1'))):
+                                raise RuntimeError("not saved, try again")
 
                         if 'TP2' not in trade.get('tp_hits', []):
                             trade['tp_hits'] = trade.get('tp_hits',
                                                          []) + ['TP2']
                             trade['breakeven_active'] = True
-                            await self.update_trade_in_db(full_msg_id, trade)
-                            await self.send_tp_notification(
-                                full_msg_id, trade, 'TP2',
-                                trade.get('tp2_price', 0))
-                            await asyncio.sleep(1)
+                            if not await self.append_trade_event(
+                                full_msg_id,
+                                'tp2_hit',
+                                trade.get('tp2_price'),
+                                None,
+                                'manual_tp2_hit',
+                                notifications=self.trade_notification(
+                                    full_msg_id, trade, 'TP2',
+                                    self.tp_notification_text('TP2'))):
+                                raise RuntimeError("not saved, try again")
 
                         if 'TP3' not in trade.get('tp_hits', []):
                             trade['tp_hits'] = trade.get('tp_hits',
                                                          []) + ['TP3']
                         trade[
                             'status'] = 'completed (tp3 hit - manual override)'
-                        await self.remove_trade_from_db(
-                            full_msg_id, 'manual_tp3_hit')
-                        await self.send_tp_notification(
-                            full_msg_id, trade, 'TP3',
-                            trade.get('tp3_price', 0))
+                        if not await self.remove_trade_from_db(
+                            full_msg_id,
+                            'manual_tp3_hit',
+                            trade,
+                            notifications=self.trade_notification(
+                                full_msg_id, trade, 'TP3',
+                                self.tp_notification_text('TP3'))):
+                            raise RuntimeError("not saved, try again")
                         successful_trades.append(
                             f"{pair} {action}{group_label} - TP3 Hit")
 
                     elif action_type == 'behit':
                         trade[
                             'status'] = 'closed (breakeven after tp2 - manual override)'
-                        await self.remove_trade_from_db(
-                            full_msg_id, 'manual_breakeven_hit')
-                        await self.send_breakeven_notification(
-                            full_msg_id, trade)
+                        if not await self.remove_trade_from_db(
+                            full_msg_id,
+                            'manual_breakeven_hit',
+                            trade,
+                            notifications=self.trade_notification(
+                                full_msg_id, trade, 'breakeven',
+                                self.breakeven_notification_text())):
+                            raise RuntimeError("not saved, try again")
                         successful_trades.append(
                             f"{pair} {action}{group_label} - Breakeven After TP2"
                         )
 
                     elif action_type == 'endhit':
                         trade['status'] = 'closed (ended by manual override)'
-                        await self.remove_trade_from_db(
-                            full_msg_id, 'manual_end_tracking')
+                        if not await self.remove_trade_from_db(
+                            full_msg_id, 'manual_end_tracking', trade):
+                            raise RuntimeError("not saved, try again")
                         successful_trades.append(
                             f"{pair} {action}{group_label} - Tracking Ended")
 
@@ -2435,7 +2892,7 @@ class TelegramTradingBot:
     async def _execute_price_test(self, message: Message, pair: str):
         pair_name = PAIR_CONFIG.get(pair, {}).get('name', pair)
 
-        price = await self.get_live_price(pair)
+        price = await self.price_feeds.get_live_price(pair)
 
         if price:
             decimals = PAIR_CONFIG.get(pair, {}).get('decimals', 5)
@@ -2473,7 +2930,7 @@ class TelegramTradingBot:
             await callback_query.message.edit_text(
                 f"Fetching live price for **{pair}**...")
 
-            price = await self.get_live_price(pair)
+            price = await self.price_feeds.get_live_price(pair)
 
             if price:
                 pair_name = PAIR_CONFIG.get(pair, {}).get('name', pair)
@@ -2496,7 +2953,7 @@ class TelegramTradingBot:
 
         if self.db_pool:
             try:
-                async with self.db_pool.acquire() as conn:
+                async with self.db_pool.acquire('admin') as conn:
                     result = await conn.fetchval("SELECT 1")
                     active_trades = await conn.fetchval(
                         "SELECT COUNT(*) FROM active_trades")
@@ -2506,12 +2963,24 @@ class TelegramTradingBot:
                         "SELECT COUNT(*) FROM dm_schedule")
                     role_history = await conn.fetchval(
                         "SELECT COUNT(*) FROM role_history")
+                    stats = await trade_event_stats(conn, 30)
+                    outbox = await conn.fetchrow(
+                        "SELECT COUNT(*) FILTER (WHERE status IN ('pending', 'sending')) AS queued, "
+                        "COUNT(*) FILTER (WHERE status = 'failed') AS failed FROM notification_outbox"
+                    )
 
+                win_rate = f"{stats['win_rate']}%" if stats[
+                    'win_rate'] is not None else "n/a"
                 status += (f"**Connection:** Connected\n"
                            f"**Active Trades:** {active_trades}\n"
                            f"**Trial Members:** {active_members}\n"
                            f"**DM Scheduled:** {dm_scheduled}\n"
-                           f"**Anti-abuse Records:** {role_history}\n")
+                           f"**Anti-abuse Records:** {role_history}\n"
+                           f"**Notification Outbox:** {outbox['queued']} queued, {outbox['failed']} failed\n"
+                           f"\n**Signals (30d):** {stats['signals']} | "
+                           f"TP1 {stats['tp1']} / TP2 {stats['tp2']} / "
+                           f"TP3 {stats['tp3']} / SL {stats['sl']} / "
+                           f"BE {stats['breakeven']} | Win rate {win_rate}\n")
             except Exception as e:
                 status += f"**Connection:** Error - {str(e)}\n"
         else:
@@ -2530,7 +2999,7 @@ class TelegramTradingBot:
             return
 
         try:
-            async with self.db_pool.acquire() as conn:
+            async with self.db_pool.acquire('admin') as conn:
                 total = await conn.fetchval("SELECT COUNT(*) FROM dm_schedule")
                 dm_3_sent = await conn.fetchval(
                     "SELECT COUNT(*) FROM dm_schedule WHERE dm_3_sent = TRUE")
@@ -2744,7 +3213,7 @@ class TelegramTradingBot:
             monday = monday - timedelta(weeks=week_offset)
             sunday = (monday + timedelta(days=6)).replace(hour=23, minute=59, second=59, microsecond=999999)
 
-            async with self.db_pool.acquire() as conn:
+            async with self.db_pool.acquire('admin') as conn:
                 joins = await conn.fetch(
                     '''SELECT user_id, joined_at FROM free_group_joins 
                        WHERE joined_at >= $1 AND joined_at <= $2
@@ -2807,7 +3276,7 @@ class TelegramTradingBot:
             date_range_str = f"Monday {monday.strftime('%d-%m-%Y')} to Sunday {sunday.strftime('%d-%m-%Y')}"
             week_label = "This Week" if week_offset == 0 else f"{week_offset} Week(s) Ago"
 
-            async with self.db_pool.acquire() as conn:
+            async with self.db_pool.acquire('admin') as conn:
                 # Direct database fetch to ensure we have the latest data
                 # Filter by those who joined in the specified week
                 active_members = await conn.fetch(
@@ -3172,7 +3641,8 @@ class TelegramTradingBot:
                 except Exception:
                     pass
             await asyncio.sleep(1)
-            await self.app.send_message(user_id, welcome_msg)
+            await self.send_scheduled(user_id, welcome_msg,
+                                      PRIORITY_ONBOARDING, "welcome DM")
 
             # ✅ SYNC WITH PEER_ID_CHECKS TABLE
             if self.db_pool:
@@ -3882,90 +4352,157 @@ class TelegramTradingBot:
             )
             return
 
-        try:
-            user_id = join_request.from_user.id
-            user_id_str = str(user_id)
-            user_name = join_request.from_user.first_name or str(user_id)
+        self.join_request_buffer.append(
+            (join_request.from_user.id, join_request.from_user.first_name
+             or str(join_request.from_user.id)))
+        if len(self.join_request_buffer
+               ) >= JOIN_REQUEST_BATCH_CONFIG['max_batch']:
+            self.join_request_event.set()
 
-            # Check if user already used their trial BEFORE approving
-            has_used_trial = user_id_str in AUTO_ROLE_CONFIG['role_history']
+    async def join_request_flush_loop(self):
+        while self.running:
+            try:
+                await asyncio.wait_for(
+                    self.join_request_event.wait(),
+                    timeout=JOIN_REQUEST_BATCH_CONFIG['flush_interval'])
+            except asyncio.TimeoutError:
+                pass
+            self.join_request_event.clear()
 
-            if not has_used_trial and self.db_pool:
+            while self.join_request_buffer:
+                batch = self.join_request_buffer[:JOIN_REQUEST_BATCH_CONFIG[
+                    'max_batch']]
+                del self.join_request_buffer[:len(batch)]
                 try:
-                    async with self.db_pool.acquire() as conn:
-                        db_history = await conn.fetchrow(
-                            "SELECT * FROM role_history WHERE member_id = $1",
-                            user_id)
-                        if db_history:
-                            has_used_trial = True
+                    await self.process_join_request_batch(batch)
                 except Exception as e:
-                    logger.error(f"Error checking role_history: {e}")
+                    logger.error(f"Error processing join request batch: {e}")
 
-            # Reject if they already used trial
-            if has_used_trial:
-                await self.log_to_debug(
-                    f"❌ Rejected join request from {user_name} (ID: {user_id}) - trial already used before"
-                )
+    async def answer_join_request(self, user_id: int, approve: bool):
+        async with self.join_request_limiter:
+            call = self.app.approve_chat_join_request if approve else self.app.decline_chat_join_request
+            try:
+                await call(VIP_GROUP_ID, user_id)
+            except FloodWait as e:
+                await asyncio.sleep(e.value)
+                await call(VIP_GROUP_ID, user_id)
 
-                try:
-                    await join_request.decline()
-                    logger.info(
-                        f"✅ Declined join request for {user_name} (ID: {user_id})"
-                    )
-                except Exception as e:
-                    logger.error(f"Error declining join request: {e}")
+    async def process_join_request_batch(self, batch: List[tuple]):
+        """Approve or decline a batch of VIP trial join requests.
 
-                # Send friendly DM about re-using trial
-                try:
-                    rejection_dm = MESSAGE_TEMPLATES["Trial Status & Expiry"][
-                        "Trial Rejected (Used Before)"]["message"].replace(
-                            "{user_name}", user_name)
-                    await client.send_message(user_id,
-                                              rejection_dm,
-                                              disable_web_page_preview=True)
-                    logger.info(f"Sent rejection DM to {user_name}")
-                except Exception as e:
-                    logger.error(
-                        f"Could not send rejection DM to {user_name}: {e}")
-                return
+        Trial re-use is checked for the whole batch with one role_history
+        query; answers go out concurrently and rejection DMs are queued for
+        the userbot in one statement.
+        """
+        names = dict(batch)  # also drops duplicate requests from the same user
 
-            # Track this user as trial approval (they're joining via trial link with approval)
-            self.trial_pending_approvals.add(user_id)
-            logger.info(f"✅ Added {user_id} to trial_pending_approvals set")
+        # Check if users already used their trial BEFORE approving
+        used_trial = {
+            user_id
+            for user_id in names
+            if str(user_id) in AUTO_ROLE_CONFIG['role_history']
+        }
+        unknown = [user_id for user_id in names if user_id not in used_trial]
+        if unknown and self.db_pool:
+            try:
+                async with self.db_pool.acquire() as conn:
+                    rows = await conn.fetch(
+                        "SELECT member_id FROM role_history WHERE member_id = ANY($1::bigint[])",
+                        unknown)
+                used_trial.update(row['member_id'] for row in rows)
+            except Exception as e:
+                logger.error(f"Error checking role_history: {e}")
 
-            # Actually approve the request
-            await join_request.approve()
-            logger.info(
-                f"✅ Successfully approved join request for {user_name} (ID: {user_id})"
-            )
+        approve_ids = [user_id for user_id in names if user_id not in used_trial]
+        decline_ids = [user_id for user_id in names if user_id in used_trial]
 
-            widget_id = getattr(self, 'onboarding_widgets', {}).get(user_id)
-            await self.update_onboarding_widget(
-                user_id, 3, 5,
-                "VIP Join Request Approved - waiting for user to enter chat...",
-                widget_id)
-        except Exception as e:
-            logger.error(
-                f"❌ Error processing join request from {join_request.from_user.first_name}: {type(e).__name__}: {e}"
-            )
-            # await self.log_to_debug(
-            #     f"❌ Failed to process join request from {join_request.from_user.first_name} (ID: {join_request.from_user.id}): {e}"
-            # )
+        # Track these users as trial approvals (they're joining via trial link with approval)
+        self.trial_pending_approvals.update(approve_ids)
 
-    async def process_member_update(self, client: Client,
-                                    member_update: ChatMemberUpdated):
-        if not member_update.new_chat_member:
-            return
+        results = await asyncio.gather(
+            *[self.answer_join_request(user_id, True) for user_id in approve_ids],
+            *[self.answer_join_request(user_id, False) for user_id in decline_ids],
+            return_exceptions=True)
 
-        old_status = member_update.old_chat_member.status if member_update.old_chat_member else None
-        new_status = member_update.new_chat_member.status
+        approved, declined = [], []
+        for user_id, result in zip(approve_ids + decline_ids, results):
+            is_approval = user_id not in used_trial
+            if isinstance(result, Exception):
+                action = "approving" if is_approval else "declining"
+                logger.error(
+                    f"❌ Error {action} join request from {names[user_id]} (ID: {user_id}): {type(result).__name__}: {result}"
+                )
+                if is_approval:
+                    self.trial_pending_approvals.discard(user_id)
+                continue
+            (approved if is_approval else declined).append(user_id)
+        logger.info(
+            f"✅ Join request batch: {len(approved)} approved, {len(declined)} declined"
+        )
 
-        is_new_join = (old_status in [
-            None, ChatMemberStatus.LEFT, ChatMemberStatus.BANNED
-        ] and new_status in [
-            ChatMemberStatus.MEMBER, ChatMemberStatus.ADMINISTRATOR,
-            ChatMemberStatus.OWNER
-        ])
+        # Send friendly DM about re-using trial (queued for the userbot)
+        if decline_ids:
+            template = MESSAGE_TEMPLATES["Trial Status & Expiry"][
+                "Trial Rejected (Used Before)"]["message"]
+            rows = [(user_id, template.replace("{user_name}", names[user_id]))
+                    for user_id in decline_ids]
+            if self.db_pool:
+                try:
+                    async with self.db_pool.acquire() as conn:
+                        await conn.executemany(
+                            """
+                            INSERT INTO userbot_dm_queue (user_id, message_text, label)
+                            SELECT $1::bigint, $2::text, 'Trial Rejected'
+                            WHERE NOT EXISTS (
+                                SELECT 1 FROM userbot_dm_queue
+                                WHERE user_id = $1 AND label = 'Trial Rejected' AND status = 'pending')
+                        """, rows)
+                except Exception as e:
+                    logger.error(
+                        f"Could not queue {len(rows)} rejection DMs: {e}")
+            else:
+                for user_id, rejection_dm in rows:
+                    try:
+                        await self.send_scheduled(
+                            user_id,
+                            rejection_dm,
+                            PRIORITY_ONBOARDING,
+                            "rejection DM",
+                            disable_web_page_preview=True)
+                    except Exception as e:
+                        logger.error(
+                            f"Could not send rejection DM to {names[user_id]}: {e}"
+                        )
+
+        if len(names) < JOIN_REQUEST_BATCH_CONFIG['widget_threshold']:
+            for user_id in declined:
+                await self.log_to_debug(
+                    f"❌ Rejected join request from {names[user_id]} (ID: {user_id}) - trial already used before"
+                )
+            for user_id in approved:
+                await self.update_onboarding_widget(
+                    user_id, 3, 5,
+                    "VIP Join Request Approved - waiting for user to enter chat...",
+                    self.onboarding_widgets.get(user_id))
+        else:
+            await self.log_to_debug(
+                f"📨 **VIP Join Requests:** {len(approved)} approved, {len(declined)} declined (trial used before), {len(names) - len(approved) - len(declined)} failed"
+            )
+
+    async def process_member_update(self, client: Client,
+                                    member_update: ChatMemberUpdated):
+        if not member_update.new_chat_member:
+            return
+
+        old_status = member_update.old_chat_member.status if member_update.old_chat_member else None
+        new_status = member_update.new_chat_member.status
+
+        is_new_join = (old_status in [
+            None, ChatMemberStatus.LEFT, ChatMemberStatus.BANNED
+        ] and new_status in [
+            ChatMemberStatus.MEMBER, ChatMemberStatus.ADMINISTRATOR,
+            ChatMemberStatus.OWNER
+        ])
 
         if not is_new_join:
             return
@@ -3981,74 +4518,100 @@ class TelegramTradingBot:
             await self.handle_vip_group_join(client, user, invite_link)
 
     async def handle_free_group_join(self, client: Client, user):
-        # Initialize onboarding widget - 5 steps now
-        widget_id = await self.update_onboarding_widget(
-            user.id, 1, 5, "Joined FREE Group - Waiting 10m for Welcome DM")
-        if widget_id:
-            if not hasattr(self, 'onboarding_widgets'):
-                self.onboarding_widgets = {}
-            self.onboarding_widgets[user.id] = widget_id
-
-        # Check if member tracking is enabled
-        tracking_enabled = True
-        if self.db_pool:
+        """Buffer a Free-group join; join_flush_loop writes joins in batches."""
+        self.join_buffer.append(
+            (user.id, user.first_name or "Trader",
+             datetime.now(pytz.UTC).astimezone(AMSTERDAM_TZ)))
+        if len(self.join_buffer) >= FREE_JOIN_BATCH_CONFIG['max_batch']:
+            self.join_flush_event.set()
+
+    async def join_flush_loop(self):
+        while self.running:
             try:
-                async with self.db_pool.acquire() as conn:
-                    val = await conn.fetchval(
-                        "SELECT setting_value FROM bot_settings WHERE setting_key = 'member_tracking_enabled'"
-                    )
-                    if val == 'false':
-                        tracking_enabled = False
-            except Exception as e:
-                logger.error(f"Error checking tracking status: {e}")
+                await asyncio.wait_for(
+                    self.join_flush_event.wait(),
+                    timeout=FREE_JOIN_BATCH_CONFIG['flush_interval'])
+            except asyncio.TimeoutError:
+                pass
+            self.join_flush_event.clear()
 
-        # Always record in free_group_joins for /newmemberslist regardless of tracking toggle
+            while self.join_buffer:
+                batch = self.join_buffer[:FREE_JOIN_BATCH_CONFIG['max_batch']]
+                del self.join_buffer[:len(batch)]
+                try:
+                    await self.process_free_group_joins(batch)
+                except Exception as e:
+                    logger.error(f"Error processing join batch: {e}")
+
+    async def process_free_group_joins(self, batch: List[tuple]):
+        """Record a batch of Free-group joins and queue their Welcome DMs in one transaction."""
+        # Small batches keep the per-member widget; bursts get one summary
+        per_user_widgets = len(batch) < FREE_JOIN_BATCH_CONFIG[
+            'widget_threshold']
+
+        widget_ids = {}
+        if per_user_widgets:
+            for user_id, _, _ in batch:
+                widget_ids[user_id] = await self.update_onboarding_widget(
+                    user_id, 1, 5,
+                    "Joined FREE Group - Waiting 10m for Welcome DM")
+
+        tracking_enabled = self.settings.get_bool('member_tracking_enabled',
+                                                  True)
         try:
-            current_time = datetime.now(pytz.UTC).astimezone(AMSTERDAM_TZ)
             if self.db_pool:
                 async with self.db_pool.acquire() as conn:
-                    await conn.execute(
-                        '''INSERT INTO free_group_joins (user_id, joined_at, discount_sent)
-                           VALUES ($1, $2, FALSE)
-                           ON CONFLICT (user_id) DO NOTHING''', user.id,
-                        current_time)
-
-            if not tracking_enabled:
-                if widget_id:
+                    welcome_template = MESSAGE_TEMPLATES[
+                        "Welcome & Onboarding"][
+                            "Welcome DM (New Free Group Member)"]["message"]
+                    async with conn.transaction():
+                        # Always record in free_group_joins for /newmemberslist regardless of tracking toggle
+                        await conn.executemany(
+                            '''INSERT INTO free_group_joins (user_id, joined_at, discount_sent)
+                               VALUES ($1, $2, FALSE)
+                               ON CONFLICT (user_id) DO NOTHING''',
+                            [(user_id, joined_at)
+                             for user_id, _, joined_at in batch])
+
+                        if tracking_enabled:
+                            # Queue Welcome DM for Userbot - with 10 min delay handled by userbot_service
+                            await conn.executemany(
+                                "INSERT INTO userbot_dm_queue (user_id, message_text, label, status, created_at) VALUES ($1, $2, 'Welcome DM', 'pending', $3)",
+                                [(user_id,
+                                  welcome_template.replace(
+                                      "{user_name}", first_name), joined_at)
+                                 for user_id, first_name, joined_at in batch])
+        except Exception as e:
+            error_msg = f"❌ Error tracking {len(batch)} free group joins: {e}"
+            logger.error(error_msg)
+            if per_user_widgets and tracking_enabled:
+                for user_id, widget_id in widget_ids.items():
                     await self.update_onboarding_widget(
-                        user.id, 1, 5, "Joined FREE Group (Tracking Disabled)",
-                        widget_id)
-                return
+                        user_id, 1, 4, f"Error: {e}", widget_id)
+            else:
+                await self.log_to_debug(error_msg, is_error=True)
+            return
 
-            if self.db_pool:
-                async with self.db_pool.acquire() as conn:
-                    # Queue Welcome DM for Userbot - with 10 min delay handled by userbot_service
-                    welcome_dm = MESSAGE_TEMPLATES["Welcome & Onboarding"][
-                        "Welcome DM (New Free Group Member)"][
-                            "message"].replace("{user_name}", user.first_name
-                                               or "Trader")
-                    await conn.execute(
-                        "INSERT INTO userbot_dm_queue (user_id, message_text, label, status, created_at) VALUES ($1, $2, 'Welcome DM', 'pending', $3)",
-                        user.id, welcome_dm, current_time)
+        if per_user_widgets:
+            if not tracking_enabled:
+                for user_id, widget_id in widget_ids.items():
+                    if widget_id:
+                        await self.update_onboarding_widget(
+                            user_id, 1, 5,
+                            "Joined FREE Group (Tracking Disabled)",
+                            widget_id)
+            return
 
-                    # Database entry: Track onboarding message IDs for persistence
-                    await conn.execute(
-                        "INSERT INTO bot_status (status_key, status_value) VALUES ($1, $2) "
-                        "ON CONFLICT (status_key) DO UPDATE SET status_value = $2",
-                        f"onboarding_msg_{user.id}", str(widget_id))
-        except Exception as e:
-            error_msg = f"❌ Error tracking free group join for {user.id}: {e}"
-            logger.error(error_msg)
-            if tracking_enabled:
-                await self.update_onboarding_widget(user.id, 1, 4,
-                                                    f"Error: {e}", widget_id)
+        tracking_note = "Welcome DMs queued" if tracking_enabled else "tracking disabled, no DMs queued"
+        await self.log_to_debug(
+            f"👥 **Free Group Join Burst:** {len(batch)} new members recorded ({tracking_note})"
+        )
 
     async def show_member_db_widget(self, message):
-        async with self.db_pool.acquire() as conn:
-            val = await conn.fetchval(
-                "SELECT setting_value FROM bot_settings WHERE setting_key = 'member_tracking_enabled'"
-            )
-            status = "🟢 ENABLED" if val != 'false' else "🔴 DISABLED"
+        if self.settings.get_bool('member_tracking_enabled', True):
+            status = "🟢 ENABLED"
+        else:
+            status = "🔴 DISABLED"
 
         keyboard = InlineKeyboardMarkup(
             [[
@@ -4075,14 +4638,7 @@ class TelegramTradingBot:
             await self.show_member_db_widget(callback_query.message)
             return
 
-        new_val = 'true' if action == 'on' else 'false'
-        async with self.db_pool.acquire() as conn:
-            await conn.execute(
-                """
-                INSERT INTO bot_settings (setting_key, setting_value)
-                VALUES ('member_tracking_enabled', $1)
-                ON CONFLICT (setting_key) DO UPDATE SET setting_value = $1
-            """, new_val)
+        await self.settings.set('member_tracking_enabled', action == 'on')
 
         status_text = "ENABLED" if action == 'on' else "DISABLED"
         await callback_query.answer(f"✅ Tracking is now {status_text}")
@@ -4098,18 +4654,8 @@ class TelegramTradingBot:
         Paid members joining via main link are not registered/tracked.
         """
         # Check if member tracking is enabled
-        tracking_enabled = True
-        if self.db_pool:
-            try:
-                async with self.db_pool.acquire() as conn:
-                    val = await conn.fetchval(
-                        "SELECT setting_value FROM bot_settings WHERE setting_key = 'member_tracking_enabled'"
-                    )
-                    if val == 'false':
-                        tracking_enabled = False
-            except Exception as e:
-                logger.error(
-                    f"Error checking tracking status in VIP join: {e}")
+        tracking_enabled = self.settings.get_bool('member_tracking_enabled',
+                                                  True)
 
         # Record participation for /newmemberslist regardless of tracking (tracking only affects automated DMs)
         # unless user is in brand deal mode where they want zero logs.
@@ -4117,7 +4663,7 @@ class TelegramTradingBot:
 
         user_id_str = str(user.id)
         current_time = datetime.now(pytz.UTC).astimezone(AMSTERDAM_TZ)
-        widget_id = getattr(self, 'onboarding_widgets', {}).get(user.id)
+        widget_id = self.onboarding_widgets.get(user.id)
 
         # Determine if this is a trial user (they were approved for trial access)
         is_trial_user = user.id in self.trial_pending_approvals
@@ -4130,25 +4676,13 @@ class TelegramTradingBot:
             await self.update_onboarding_widget(
                 user.id, 5, 5, "Joined VIP via Paid Link (Success)", widget_id)
             # Clean up tracking after success
-            if hasattr(self, 'onboarding_widgets'):
-                self.onboarding_widgets.pop(user.id, None)
-            if self.db_pool:
-                try:
-                    async with self.db_pool.acquire() as conn:
-                        await conn.execute(
-                            "DELETE FROM bot_status WHERE status_key = $1",
-                            f"onboarding_msg_{user.id}")
-                except Exception:
-                    pass
+            self.finish_onboarding_widget(user.id)
             return
 
         new_widget_id = await self.update_onboarding_widget(
             user.id, 3, 5, "Trial Join Detected - Registering Trial...",
             widget_id)
         if new_widget_id and not widget_id:
-            if not hasattr(self, 'onboarding_widgets'):
-                self.onboarding_widgets = {}
-            self.onboarding_widgets[user.id] = new_widget_id
             widget_id = new_widget_id
 
         # Check if this user has already used their trial
@@ -4203,9 +4737,11 @@ class TelegramTradingBot:
                                 "INSERT INTO userbot_dm_queue (user_id, message_text, label) VALUES ($1, $2, $3)",
                                 user.id, rejection_dm, "Trial Rejected")
                 else:
-                    await client.send_message(user.id,
-                                          rejection_dm,
-                                          disable_web_page_preview=True)
+                    await self.send_scheduled(user.id,
+                                              rejection_dm,
+                                              PRIORITY_ONBOARDING,
+                                              "rejection DM",
+                                              disable_web_page_preview=True)
             except Exception as e:
                 logger.error(f"Could not queue rejection DM to {user.first_name}: {e}")
 
@@ -4285,199 +4821,50 @@ class TelegramTradingBot:
                 widget_id)
 
         # Success reached, remove from memory tracking to allow fresh starts if needed
-        if hasattr(self, 'onboarding_widgets'):
-            self.onboarding_widgets.pop(user.id, None)
+        self.finish_onboarding_widget(user.id)
 
-        if self.db_pool:
-            try:
-                async with self.db_pool.acquire() as conn:
-                    await conn.execute(
-                        "DELETE FROM bot_status WHERE status_key = $1",
-                        f"onboarding_msg_{user.id}")
-            except Exception:
-                pass
-
-    async def get_working_api_for_pair(self, pair: str) -> str:
-        pair_clean = pair.upper().replace("/",
-                                          "").replace("-",
-                                                      "").replace("_", "")
+    def is_manual_tracking_pair(self, pair: str) -> bool:
+        """Excluded pairs only fall back to manual tracking when no secondary feed is configured"""
+        return (pair.upper() in EXCLUDED_FROM_TRACKING
+                and not self.price_feeds.has_secondary_feed())
 
-        for api_name in PRICE_TRACKING_CONFIG['api_priority_order']:
-            try:
-                api_key = PRICE_TRACKING_CONFIG['api_keys'].get(
-                    f"{api_name}_key")
-                if not api_key:
-                    continue
-
-                price = await self.get_price_from_api(api_name, pair_clean)
-                if price is not None:
-                    logger.info(
-                        f"API assignment: {pair_clean} will use {api_name}")
-                    return api_name
-            except Exception as e:
-                logger.warning(
-                    f"{api_name} failed for {pair_clean}: {str(e)[:100]}")
-                continue
-
-        logger.warning(
-            f"All APIs failed for {pair_clean}, defaulting to currencybeacon")
-        return "currencybeacon"
-
-    async def get_live_price(self, pair: str) -> Optional[float]:
-        pair_clean = pair.upper().replace("/",
-                                          "").replace("-",
-                                                      "").replace("_", "")
-
-        for api_name in PRICE_TRACKING_CONFIG['api_priority_order']:
-            try:
-                price = await self.get_price_from_api(api_name, pair_clean)
-                if price:
-                    return price
-            except Exception as e:
-                logger.error(f"Error getting price from {api_name}: {e}")
-                continue
+    async def check_message_still_exists(self, message_id: str,
+                                         trade_data: dict) -> bool:
+        """Check if the original trading signal message still exists in Telegram
 
-        return None
+        A signal linked to several posts (channel_message_map) only counts as
+        deleted once every post is gone; a single deleted post is dropped
+        from the trade so only that group stops getting replies.
 
-    async def get_live_price_with_fallback(
-            self,
-            pair: str,
-            assigned_api: Optional[str] = None) -> Optional[float]:
-        """Get live price - try assigned API first, then fallback to all APIs if assigned fails"""
-        pair_clean = pair.upper().replace("/",
-                                          "").replace("-",
-                                                      "").replace("_", "")
-
-        priority = PRICE_TRACKING_CONFIG["api_priority_order"]
-
-        # Ensure we have a valid session
-        if not self.client_session or self.client_session.closed:
-            self.client_session = aiohttp.ClientSession(
-                timeout=aiohttp.ClientTimeout(total=30))
-
-        # If an API is already assigned to this trade, try that first
-        search_order = priority.copy()
-        if assigned_api and assigned_api in search_order:
-            search_order.remove(assigned_api)
-            search_order.insert(0, assigned_api)
-
-        for api_name in search_order:
+        SECURITY: Only deletes trades if message explicitly verified as deleted.
+        Assumes message exists on any error to prevent accidental deletion of active trades.
+        """
+        posts = {}
+        for chat_id, post_id in (trade_data.get('channel_message_map')
+                                 or {}).items():
             try:
-                price = await self.get_price_from_api(api_name, pair_clean)
-                if price is not None:
-                    return price
-            except Exception as e:
-                logger.debug(f"Price fallback error for {api_name}: {e}")
+                if int(post_id):
+                    posts[int(chat_id)] = int(post_id)
+            except (ValueError, TypeError):
                 continue
 
-        return None
-
-    async def get_price_from_api(self, api_name: str,
-                                 pair: str) -> Optional[float]:
-        api_keys = PRICE_TRACKING_CONFIG['api_keys']
-
-        try:
-            if api_name == "currencybeacon":
-                key = api_keys.get('currencybeacon_key')
-                if not key:
-                    return None
-
-                if pair.startswith("XAU"):
-                    base, quote = "XAU", pair[3:]
-                elif pair.startswith("XAG"):
-                    base, quote = "XAG", pair[3:]
-                elif len(pair) == 6:
-                    base, quote = pair[:3], pair[3:]
-                else:
-                    return None
-
-                url = f"https://api.currencybeacon.com/v1/latest?api_key={key}&base={base}&symbols={quote}"
-
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(
-                            url, timeout=ClientTimeout(total=10)) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            if 'rates' in data and quote in data['rates']:
-                                return float(data['rates'][quote])
-
-            elif api_name == "exchangerate_api":
-                key = api_keys.get('exchangerate_api_key')
-                if not key:
-                    return None
-
-                if len(pair) == 6:
-                    base, quote = pair[:3], pair[3:]
-                else:
-                    return None
-
-                url = f"https://v6.exchangerate-api.com/v6/{key}/pair/{base}/{quote}"
-
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(
-                            url, timeout=ClientTimeout(total=10)) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            if 'conversion_rate' in data:
-                                return float(data['conversion_rate'])
-
-            elif api_name == "currencylayer":
-                key = api_keys.get('currencylayer_key')
-                if not key:
-                    return None
-
-                if len(pair) == 6:
-                    base, quote = pair[:3], pair[3:]
-                else:
-                    return None
-
-                url = f"https://api.currencylayer.com/live?access_key={key}&currencies={quote}&source={base}"
-
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(
-                            url, timeout=ClientTimeout(total=10)) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            if data.get('success') and 'quotes' in data:
-                                rate_key = f"{base}{quote}"
-                                if rate_key in data['quotes']:
-                                    return float(data['quotes'][rate_key])
-
-            elif api_name == "abstractapi":
-                key = api_keys.get('abstractapi_key')
-                if not key:
-                    return None
-
-                if len(pair) == 6:
-                    base, quote = pair[:3], pair[3:]
-                else:
-                    return None
-
-                url = f"https://exchange-rates.abstractapi.com/v1/live?api_key={key}&base={base}&target={quote}"
+        if not posts:
+            return await self.check_primary_post_exists(message_id, trade_data)
 
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(
-                            url, timeout=ClientTimeout(total=10)) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            if 'exchange_rates' in data and quote in data[
-                                    'exchange_rates']:
-                                return float(data['exchange_rates'][quote])
-
-        except asyncio.TimeoutError:
-            logger.warning(f"Timeout getting price from {api_name}")
-        except Exception as e:
-            logger.error(f"Error with {api_name}: {e}")
+        missing = [
+            chat_id for chat_id, post_id in posts.items()
+            if not await self.post_still_exists(message_id, chat_id, post_id)
+        ]
+        if len(missing) == len(posts):
+            return False
 
-        return None
+        for chat_id in missing:
+            await self.drop_linked_post(message_id, chat_id)
+        return True
 
-    async def check_message_still_exists(self, message_id: str,
-                                         trade_data: dict) -> bool:
-        """Check if the original trading signal message still exists in Telegram
-        
-        SECURITY: Only deletes trades if message explicitly verified as deleted.
-        Assumes message exists on any error to prevent accidental deletion of active trades.
-        """
+    async def check_primary_post_exists(self, message_id: str,
+                                        trade_data: dict) -> bool:
+        """Existence check for trades saved before posts were linked"""
         try:
             # Validate input
             chat_id = trade_data.get('group_id')
@@ -4510,24 +4897,35 @@ class TelegramTradingBot:
                 )
                 return True  # Safer to assume exists
 
-            # Try to fetch the message from the group with timeout
-            try:
-                message = await asyncio.wait_for(self.app.get_messages(
-                    chat_id_int, actual_msg_id),
-                                                 timeout=10)
-                return message is not None
-            except asyncio.TimeoutError:
-                logger.warning(
-                    f"Timeout checking if message {message_id} exists in chat {chat_id}. Assuming it still exists."
-                )
-                return True  # Timeout = assume exists, don't delete
+        except Exception as e:
+            logger.warning(
+                f"Unexpected error checking message {message_id}: {type(e).__name__}: {e}. Assuming message still exists to prevent accidental deletion."
+            )
+            return True
+
+        return await self.post_still_exists(message_id, chat_id_int,
+                                            actual_msg_id)
 
+    async def post_still_exists(self, message_id: str, chat_id: int,
+                                post_id: int) -> bool:
+        """Fetch one channel post; only an explicit "not found" counts as deleted"""
+        try:
+            # Try to fetch the message from the group with timeout
+            message = await asyncio.wait_for(self.app.get_messages(
+                chat_id, post_id),
+                                             timeout=10)
+            return message is not None
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Timeout checking if message {message_id} exists in chat {chat_id}. Assuming it still exists."
+            )
+            return True  # Timeout = assume exists, don't delete
         except Exception as e:
             # Only treat as deleted if it's a specific "not found" error
             error_str = str(e).lower()
             if "not found" in error_str or "message_id_invalid" in error_str or "message deleted" in error_str:
                 logger.info(
-                    f"Message {message_id} verified as deleted from Telegram: {e}"
+                    f"Message {message_id} verified as deleted from chat {chat_id}: {e}"
                 )
                 return False
 
@@ -4538,25 +4936,61 @@ class TelegramTradingBot:
             )
             return True
 
+    async def drop_linked_post(self, message_id: str, chat_id: int):
+        """Unlink one deleted post; the trade keeps tracking for the other groups"""
+        if not await self.append_trade_event(message_id,
+                                             'post_deleted',
+                                             detail=str(chat_id),
+                                             fenced=True):
+            return
+
+        trade = PRICE_TRACKING_CONFIG['active_trades'].get(message_id)
+        if trade:
+            trade['channel_message_map'] = {
+                key: post_id
+                for key, post_id in (trade.get('channel_message_map')
+                                     or {}).items() if int(key) != chat_id
+            }
+            trade['all_channel_ids'] = [
+                cid for cid in trade.get('all_channel_ids', [])
+                if int(cid) != chat_id
+            ]
+        await self.log_to_debug(
+            f"Signal post in {chat_id} deleted - {message_id} keeps tracking for its other groups"
+        )
+
     async def check_single_trade_immediately(self, message_id: str,
                                              trade_data: dict):
         await asyncio.sleep(5)
+        # Standbys only register the trade; the leader picks it up in sync_new_trades
+        if not self.runs_signal_engine():
+            return
         await self.check_price_levels(message_id, trade_data)
 
     async def verify_trade_data_consistency(self, message_id: str,
-                                            trade_data: dict) -> dict:
+                                            trade_data: dict) -> Optional[dict]:
         """Verify trade data consistency between memory and database - prevents missed hits"""
         try:
             if not self.db_pool:
                 return trade_data
 
             # Fetch latest data from database
-            async with self.db_pool.acquire() as conn:
+            async with self.db_pool.acquire('price') as conn:
                 db_trade = await conn.fetchrow(
                     'SELECT * FROM active_trades WHERE message_id = $1',
                     message_id)
 
                 if not db_trade:
+                    # Closed by another replica (e.g. an override there)
+                    if await conn.fetchval(
+                            'SELECT 1 FROM trade_events WHERE message_id = $1 AND event_type = ANY($2::text[]) LIMIT 1',
+                            message_id, CLOSING_EVENTS):
+                        PRICE_TRACKING_CONFIG['active_trades'].pop(
+                            message_id, None)
+                        logger.info(
+                            f"Trade {message_id} was closed elsewhere - stopped tracking"
+                        )
+                        return None
                     logger.warning(
                         f"Trade {message_id} not found in database - may have been deleted"
                     )
@@ -4607,165 +5041,131 @@ class TelegramTradingBot:
             )
             return trade_data
 
-    async def check_price_levels(self, message_id: str, trade_data: dict):
+    async def prepare_price_check(self, message_id: str,
+                                  trade_data: dict) -> Optional[dict]:
+        """Cleanup before pricing a trade; None means it should not be priced"""
         # Skip price monitoring for manually-tracked pairs (e.g., XAUUSD, BTCUSD, GER40, US100)
         if trade_data.get('manual_tracking_only', False):
-            return
+            return None
 
         # First check if the original message still exists (cleanup deleted signals)
         if not await self.check_message_still_exists(message_id, trade_data):
+            # Leaves memory once the close commits; otherwise retried next check
             await self.remove_trade_from_db(message_id, "message_deleted")
-            if message_id in PRICE_TRACKING_CONFIG['active_trades']:
-                del PRICE_TRACKING_CONFIG['active_trades'][message_id]
-            return
+            return None
 
         # Verify trade data consistency between memory and database
-        trade_data = await self.verify_trade_data_consistency(
-            message_id, trade_data)
-
-        pair = trade_data.get('pair')
-        action = trade_data.get('action')
-        tp1 = trade_data.get('tp1_price')
-        tp2 = trade_data.get('tp2_price')
-        tp3 = trade_data.get('tp3_price')
-        sl = trade_data.get('sl_price')
-        tp_hits = trade_data.get('tp_hits', [])
-        breakeven_active = trade_data.get('breakeven_active', False)
-        live_entry = trade_data.get('live_entry') or trade_data.get('entry')
-
-        # Rule 1: If TP2 was already hit, ensure breakeven protection is active
-        if 'TP2' in tp_hits:
-            breakeven_active = True
+        return await self.verify_trade_data_consistency(message_id, trade_data)
+
+    async def check_price_levels(self, message_id: str, trade_data: dict):
+        trade_data = await self.prepare_price_check(message_id, trade_data)
+        if trade_data is None:
+            return
 
         # Try assigned API first, then fallback to all APIs if it fails
-        current_price = await self.get_live_price_with_fallback(
-            pair, trade_data.get('assigned_api'))
+        current_price = await self.price_feeds.get_live_price_with_fallback(
+            trade_data.get('pair'), trade_data.get('assigned_api'))
         if not current_price:
             return
 
-        is_buy = action.upper() == "BUY"
-
-        if is_buy:
-            if breakeven_active and live_entry:
-                if current_price <= live_entry:
-                    await self.handle_breakeven_hit(message_id, trade_data)
-                    return
-            elif current_price <= sl:
-                # Rule 2: SL cannot hit after TP2 (breakeven protection)
-                if 'TP2' not in tp_hits:
-                    await self.handle_sl_hit(message_id, trade_data,
-                                             current_price)
-                    return
-
-            if 'TP1' not in tp_hits and current_price >= tp1:
-                await self.handle_tp_hit(message_id, trade_data, 'TP1',
-                                         current_price)
-            if 'TP2' not in tp_hits and current_price >= tp2:
-                await self.handle_tp_hit(message_id, trade_data, 'TP2',
-                                         current_price)
-            if 'TP3' not in tp_hits and current_price >= tp3:
-                await self.handle_tp_hit(message_id, trade_data, 'TP3',
-                                         current_price)
-                return
-        else:
-            if breakeven_active and live_entry:
-                if current_price >= live_entry:
-                    await self.handle_breakeven_hit(message_id, trade_data)
-                    return
-            elif current_price >= sl:
-                # Rule 2: SL cannot hit after TP2 (breakeven protection)
-                if 'TP2' not in tp_hits:
-                    await self.handle_sl_hit(message_id, trade_data,
-                                             current_price)
-                    return
-
-            if 'TP1' not in tp_hits and current_price <= tp1:
-                await self.handle_tp_hit(message_id, trade_data, 'TP1',
-                                         current_price)
-            if 'TP2' not in tp_hits and current_price <= tp2:
-                await self.handle_tp_hit(message_id, trade_data, 'TP2',
-                                         current_price)
-            if 'TP3' not in tp_hits and current_price <= tp3:
-                await self.handle_tp_hit(message_id, trade_data, 'TP3',
-                                         current_price)
-                return
+        hits = evaluate_price_hits(trade_data, current_price)
+        await self.apply_price_hits(message_id, trade_data, hits,
+                                    current_price)
+
+    async def apply_price_hits(self, message_id: str, trade_data: dict,
+                               hits: List[str], current_price: float) -> int:
+        """Run the hit handlers for levels returned by evaluate_price_hits"""
+        applied = 0
+        for hit in hits:
+            if hit == 'BREAKEVEN':
+                return applied + await self.handle_breakeven_hit(
+                    message_id, trade_data)
+            if hit == 'SL':
+                return applied + await self.handle_sl_hit(
+                    message_id, trade_data, current_price)
+
+            # A hit that did not commit is retried on the next check
+            if not await self.handle_tp_hit(message_id, trade_data, hit,
+                                            current_price):
+                break
+            applied += 1
+            if hit == 'TP3':
+                break
+        return applied
 
     async def handle_tp_hit(self, message_id: str, trade_data: dict,
-                            tp_level: str, hit_price: float):
+                            tp_level: str, hit_price: float) -> bool:
+        """Record a TP hit; memory only changes once the fenced write has committed"""
         trade = PRICE_TRACKING_CONFIG['active_trades'].get(message_id)
         if not trade:
-            return
+            return False
 
         if tp_level in trade.get('tp_hits', []):
-            return
+            return False
 
-        trade['tp_hits'] = trade.get('tp_hits', []) + [tp_level]
+        updated = dict(trade)
+        updated['tp_hits'] = trade.get('tp_hits', []) + [tp_level]
 
-        # Use create_task for non-blocking notification
-        asyncio.create_task(
-            self.send_tp_notification(message_id, trade, tp_level, hit_price))
+        # Queued in the same transaction as the hit; the outbox loop sends it
+        notifications = self.trade_notification(
+            message_id, updated, tp_level,
+            self.tp_notification_text(tp_level))
 
         if tp_level == 'TP2' and not trade.get('breakeven_active'):
-            trade['breakeven_active'] = True
+            updated['breakeven_active'] = True
 
         if tp_level == 'TP3':
-            # ARCHIVE FIRST before deleting from memory
-            try:
-                await self.archive_trade_to_completed(message_id, trade,
-                                                      "TP3 Hit")
-            except Exception as e:
-                logger.error(
-                    f"Failed to archive TP3 hit for {message_id}: {e}")
-
-            trade['status'] = 'completed'
-            del PRICE_TRACKING_CONFIG['active_trades'][message_id]
-            await self.remove_trade_from_db(message_id, 'tp3_hit')
+            updated['status'] = 'completed'
+            if not await self.remove_trade_from_db(message_id,
+                                                   "TP3 Hit",
+                                                   updated,
+                                                   hit_price,
+                                                   notifications,
+                                                   fenced=True):
+                return False
         else:
-            await self.update_trade_in_db(message_id, trade)
+            if not await self.append_trade_event(message_id,
+                                                 f"{tp_level.lower()}_hit",
+                                                 hit_price,
+                                                 notifications=notifications,
+                                                 fenced=True):
+                return False
+            trade.update(updated)
 
         await self.log_to_debug(
             f"{trade['pair']} {trade['action']} hit {tp_level} @ {hit_price:.5f}"
         )
+        return True
 
     async def handle_sl_hit(self, message_id: str, trade_data: dict,
-                            hit_price: float):
+                            hit_price: float) -> bool:
         trade = PRICE_TRACKING_CONFIG['active_trades'].get(message_id)
         if not trade:
-            return
-
-        # ARCHIVE FIRST before deleting from memory
-        try:
-            await self.archive_trade_to_completed(message_id, trade, "SL Hit")
-        except Exception as e:
-            logger.error(f"Failed to archive SL hit for {message_id}: {e}")
-
-        trade['status'] = 'sl_hit'
-
-        # Use create_task for non-blocking notification
-        asyncio.create_task(
-            self.send_sl_notification(message_id, trade, hit_price))
+            return False
 
-        if message_id in PRICE_TRACKING_CONFIG['active_trades']:
-            del PRICE_TRACKING_CONFIG['active_trades'][message_id]
-        await self.remove_trade_from_db(message_id, 'sl_hit')
+        # remove_trade_from_db drops the trade from memory once the close commits
+        trade = dict(trade, status='sl_hit')
+        if not await self.remove_trade_from_db(
+                message_id,
+                "SL Hit",
+                trade,
+                hit_price,
+                self.trade_notification(message_id, trade, 'SL',
+                                        self.sl_notification_text()),
+                fenced=True):
+            return False
 
         await self.log_to_debug(
             f"{trade['pair']} {trade['action']} hit SL @ {hit_price:.5f}")
+        return True
 
-    async def handle_breakeven_hit(self, message_id: str, trade_data: dict):
+    async def handle_breakeven_hit(self, message_id: str,
+                                   trade_data: dict) -> bool:
         trade = PRICE_TRACKING_CONFIG['active_trades'].get(message_id)
         if not trade:
-            return
-
-        # ARCHIVE FIRST before deleting from memory
-        try:
-            await self.archive_trade_to_completed(message_id, trade,
-                                                  "Breakeven Hit")
-        except Exception as e:
-            logger.error(
-                f"Failed to archive Breakeven hit for {message_id}: {e}")
+            return False
 
-        trade['status'] = 'breakeven'
+        trade = dict(trade, status='breakeven')
 
         pair = trade.get('pair', 'Unknown')
         action = trade.get('action', 'Unknown')
@@ -4775,58 +5175,31 @@ class TelegramTradingBot:
 
         tp_status = f"TPs hit: {', '.join(tp_hits)}" if tp_hits else ""
 
-        # Professional randomized breakeven templates
-        breakeven_templates = [
-            "TP2 has been hit & price has reversed to breakeven, so as usual, we're out safe 🫡",
-            "Price returned to breakeven after hitting TP2. Smart exit, we secured profits and protected capital 💼✅",
-            "Breakeven reached after TP2 hit. Clean trade management - we're out with gains secured 🎯🔒",
-            "TP2 was hit, now back to breakeven. Perfect trade execution, we exit safe and profitable 📊🛡️",
-            "Price reversed to entry after TP2. Textbook risk management - we're out with profits locked in 💰🧠",
-            "Breakeven hit after TP2. Smart trading discipline pays off. We're out safe and ahead 🚀⚖️",
-            "Back to breakeven post-TP2. This is how we protect profits. Clean exit, clean conscience 💎🔐",
-            "TP2 secured, now at breakeven. Professional trade management - we exit with gains protected 📈🛡️",
-            "Price action brought us back to entry after TP2. Strategic exit with profits in the bag 🎯💼",
-            "Breakeven reached after TP2 hit. This is disciplined trading - we're out safe with profits secured 🧘‍♂️💸"
-        ]
-        import random
-        selected_text = random.choice(breakeven_templates)
+        selected_text = self.breakeven_notification_text()
 
         notification = (f"**BREAKEVEN HIT** {pair} {action}\n\n"
                         f"{selected_text}\n\n"
                         f"Price returned to entry ({live_entry:.5f})\n"
                         f"{tp_status}")
 
-        chat_id = trade.get('chat_id') or trade.get('channel_id')
-        if chat_id:
-            original_msg_id = trade.get('message_id', message_id)
-            if '_' in str(original_msg_id):
-                original_msg_id = str(original_msg_id).split('_', 1)[1]
-
-            try:
-                await self.app.send_message(
-                    chat_id,
-                    notification,
-                    reply_to_message_id=int(original_msg_id))
-            except Exception as e:
-                logger.error(
-                    f"Failed to send breakeven hit notification to {chat_id}: {e}"
-                )
-                try:
-                    await self.app.send_message(chat_id, notification)
-                except Exception as e2:
-                    logger.error(
-                        f"Failed to send breakeven hit notification without reply: {e2}"
-                    )
-
-        del PRICE_TRACKING_CONFIG['active_trades'][message_id]
         try:
-            await self.remove_trade_from_db(message_id, 'breakeven_hit')
+            if not await self.remove_trade_from_db(
+                    message_id,
+                    "Breakeven Hit",
+                    trade,
+                    None,
+                    self.trade_notification(message_id, trade, 'breakeven',
+                                            notification),
+                    fenced=True):
+                return False
         except Exception as e:
             logger.error(f"Error removing breakeven trade from DB: {e}")
+            return False
 
         await self.log_to_debug(
             f"{trade['pair']} {trade['action']} hit breakeven @ {trade['entry_price']:.5f}"
         )
+        return True
 
     def validate_chronological_hits(self, hits: list) -> list:
         """Validate hits chronologically according to trading rules (Feature 3: Chronological Hit Validation)"""
@@ -4940,11 +5313,36 @@ class TelegramTradingBot:
         except Exception as e:
             logger.error(f"Error during missed signal recovery: {e}")
 
-    async def send_tp_notification(self, message_id: str, trade_data: dict,
-                                   tp_level: str, hit_price: float):
-        pair = trade_data.get('pair', 'Unknown')
-        action = trade_data.get('action', 'Unknown')
+    async def send_scheduled(self, chat_id: int, text: str, priority: int,
+                             label: str, **kwargs):
+        """Send a message through the shared send scheduler."""
+        return await self.send_scheduler.submit(
+            chat_id, lambda: self.app.send_message(chat_id, text, **kwargs),
+            priority, label)
 
+    async def send_trade_reply(self, chat_id: int, text: str,
+                               reply_to_message_id: int, label: str):
+        """Reply to a signal message, falling back to a plain send"""
+        try:
+            return await self.send_scheduled(
+                chat_id,
+                text,
+                PRIORITY_TRADE_UPDATE,
+                label,
+                reply_to_message_id=reply_to_message_id)
+        except Exception as e:
+            logger.error(
+                f"Failed to send {label} notification to {chat_id}: {e}")
+            try:
+                return await self.send_scheduled(chat_id, text,
+                                                 PRIORITY_TRADE_UPDATE, label)
+            except Exception as e2:
+                logger.error(
+                    f"Failed to send {label} notification without reply: {e2}"
+                )
+        return None
+
+    def tp_notification_text(self, tp_level: str) -> str:
         tp1_messages = [
             "TP1 has been hit. First target secured, let's keep it going. Next stop: TP2 📈🔥",
             "TP1 smashed. Secure some profits if you'd like and let's aim for TP2 🎯💪",
@@ -4985,42 +5383,14 @@ class TelegramTradingBot:
         ]
 
         if tp_level.lower() == "tp1":
-            notification = random.choice(tp1_messages)
+            return random.choice(tp1_messages)
         elif tp_level.lower() == "tp2":
-            notification = random.choice(tp2_messages)
+            return random.choice(tp2_messages)
         elif tp_level.lower() == "tp3":
-            notification = random.choice(tp3_messages)
-        else:
-            notification = f"**{tp_level.upper()} HAS BEEN HIT!** 🎯"
-
-        chat_id = trade_data.get('chat_id') or trade_data.get('channel_id')
-        if not chat_id:
-            logger.error(f"No chat_id found for trade {message_id}")
-            return
-
-        original_msg_id = trade_data.get('message_id', message_id)
-        if '_' in str(original_msg_id):
-            original_msg_id = str(original_msg_id).split('_', 1)[1]
-
-        try:
-            await self.app.send_message(
-                chat_id,
-                notification,
-                reply_to_message_id=int(original_msg_id))
-        except Exception as e:
-            logger.error(f"Failed to send TP notification to {chat_id}: {e}")
-            try:
-                await self.app.send_message(chat_id, notification)
-            except Exception as e2:
-                logger.error(
-                    f"Failed to send TP notification without reply: {e2}")
-
-    async def send_sl_notification(self, message_id: str, trade_data: dict,
-                                   hit_price: float):
-        pair = trade_data.get('pair', 'Unknown')
-        action = trade_data.get('action', 'Unknown')
-        tp_hits = trade_data.get('tp_hits', [])
+            return random.choice(tp3_messages)
+        return f"**{tp_level.upper()} HAS BEEN HIT!** 🎯"
 
+    def sl_notification_text(self) -> str:
         sl_messages = [
             "This one hit SL. It happens. Let's stay focused and get the next one 🔄🧠",
             "SL has been hit. Risk was managed, we move on 💪📉",
@@ -5034,36 +5404,9 @@ class TelegramTradingBot:
             "SL triggered. Part of proper risk management. Next setup coming soon 💪⚡"
         ]
 
-        notification = random.choice(sl_messages)
-
-        chat_id = trade_data.get('chat_id') or trade_data.get('channel_id')
-        if not chat_id:
-            logger.error(f"No chat_id found for trade {message_id}")
-            return
-
-        original_msg_id = trade_data.get('message_id', message_id)
-        if '_' in str(original_msg_id):
-            original_msg_id = str(original_msg_id).split('_', 1)[1]
-
-        try:
-            await self.app.send_message(
-                chat_id,
-                notification,
-                reply_to_message_id=int(original_msg_id))
-        except Exception as e:
-            logger.error(f"Failed to send SL notification to {chat_id}: {e}")
-            try:
-                await self.app.send_message(chat_id, notification)
-            except Exception as e2:
-                logger.error(
-                    f"Failed to send SL notification without reply: {e2}")
-
-    async def send_breakeven_notification(self, message_id: str,
-                                          trade_data: dict):
-        pair = trade_data.get('pair', 'Unknown')
-        action = trade_data.get('action', 'Unknown')
-        entry_price = trade_data.get('entry_price', 0)
+        return random.choice(sl_messages)
 
+    def breakeven_notification_text(self) -> str:
         breakeven_messages = [
             "TP2 has been hit & price has reversed to breakeven, so as usual, we're out safe 🫡",
             "Price returned to breakeven after hitting TP2. Smart exit, we secured profits and protected capital 💼✅",
@@ -5077,321 +5420,112 @@ class TelegramTradingBot:
             "Breakeven reached after TP2 hit. This is disciplined trading - we're out safe with profits secured 🧘‍♂️💸"
         ]
 
-        notification = random.choice(breakeven_messages)
+        return random.choice(breakeven_messages)
 
-        chat_id = trade_data.get('chat_id') or trade_data.get('channel_id')
-        if not chat_id:
-            logger.error(f"No chat_id found for trade {message_id}")
-            return
+    def trade_notification(self, message_id: str, trade_data: dict,
+                           label: str, text: str) -> List[Dict]:
+        """One reply per linked channel post, ready for the notification outbox"""
+        targets = {}
+        for chat_id, post_id in (trade_data.get('channel_message_map')
+                                 or {}).items():
+            targets[int(chat_id)] = int(post_id) or None
 
-        original_msg_id = trade_data.get('message_id', message_id)
-        if '_' in str(original_msg_id):
-            original_msg_id = str(original_msg_id).split('_', 1)[1]
+        if not targets:
+            chat_id = trade_data.get('chat_id') or trade_data.get('channel_id')
+            if not chat_id:
+                logger.error(f"No chat_id found for trade {message_id}")
+                return []
 
+            original_msg_id = trade_data.get('message_id', message_id)
+            if '_' in str(original_msg_id):
+                original_msg_id = str(original_msg_id).split('_', 1)[1]
+            targets[int(chat_id)] = int(original_msg_id)
+
+        return [{
+            'key': f"{chat_id}_{reply_to or message_id}",
+            'label': label,
+            'chat_id': chat_id,
+            'reply_to': reply_to,
+            'text': text
+        } for chat_id, reply_to in targets.items()]
+
+    async def queue_trade_notification(self, conn,
+                                       notifications: List[Dict]):
+        """Add replies to the outbox inside the caller's transaction"""
+        for notification in notifications or []:
+            await enqueue_notification(conn, notification['key'],
+                                       notification['label'],
+                                       notification['chat_id'],
+                                       notification['reply_to'],
+                                       notification['text'])
+
+    async def deliver_trade_notification(self, row) -> bool:
+        """Send one outbox row; True once Telegram has accepted it"""
         try:
-            await self.app.send_message(
-                chat_id,
-                notification,
-                reply_to_message_id=int(original_msg_id))
+            sent = await self.send_trade_reply(row['chat_id'], row['text'],
+                                               row['reply_to'], row['label'])
+            error = None if sent else "send failed"
         except Exception as e:
-            logger.error(
-                f"Failed to send breakeven notification to {chat_id}: {e}")
-            try:
-                await self.app.send_message(chat_id, notification)
-            except Exception as e2:
-                logger.error(
-                    f"Failed to send breakeven notification without reply: {e2}"
-                )
-
-                await conn.execute("""
-                    CREATE TABLE IF NOT EXISTS completed_trades (
-                        message_id VARCHAR(100) PRIMARY KEY,
-                        channel_id BIGINT NOT NULL,
-                        guild_id BIGINT NOT NULL,
-                        pair VARCHAR(20) NOT NULL,
-                        action VARCHAR(10) NOT NULL,
-                        entry_price DECIMAL(30,15) NOT NULL,
-                        tp1_price DECIMAL(30,15) NOT NULL,
-                        tp2_price DECIMAL(30,15) NOT NULL,
-                        tp3_price DECIMAL(30,15) NOT NULL,
-                        sl_price DECIMAL(30,15) NOT NULL,
-                        telegram_entry DECIMAL(30,15),
-                        telegram_tp1 DECIMAL(30,15),
-                        telegram_tp2 DECIMAL(30,15),
-                        telegram_tp3 DECIMAL(30,15),
-                        telegram_sl DECIMAL(30,15),
-                        live_entry DECIMAL(30,15),
-                        assigned_api VARCHAR(30) DEFAULT 'currencybeacon',
-                        final_status VARCHAR(100) NOT NULL,
-                        tp_hits TEXT DEFAULT '',
-                        breakeven_active BOOLEAN DEFAULT FALSE,
-                        entry_type VARCHAR(30),
-                        manual_overrides TEXT DEFAULT '',
-                        created_at TIMESTAMP WITH TIME ZONE NOT NULL,
-                        completed_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-                        completion_reason VARCHAR(50) NOT NULL
-                    )
-                """)
-
-                await conn.execute("""
-                    CREATE TABLE IF NOT EXISTS missed_hits (
-                        id SERIAL PRIMARY KEY,
-                        message_id VARCHAR(20) NOT NULL,
-                        hit_type VARCHAR(10) NOT NULL,
-                        hit_level VARCHAR(10) NOT NULL,
-                        hit_price DECIMAL(12,8) NOT NULL,
-                        hit_time TIMESTAMP WITH TIME ZONE NOT NULL,
-                        processed BOOLEAN DEFAULT FALSE,
-                        created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
-                    )
-                """)
-
-                await conn.execute("""
-                    CREATE TABLE IF NOT EXISTS emoji_reactions (
-                        id SERIAL PRIMARY KEY,
-                        user_id BIGINT NOT NULL,
-                        message_id BIGINT NOT NULL,
-                        emoji VARCHAR(10) NOT NULL,
-                        reaction_time TIMESTAMP WITH TIME ZONE NOT NULL,
-                        created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-                        UNIQUE(user_id, message_id, emoji)
-                    )
-                """)
-
-                await conn.execute("""
-                    CREATE TABLE IF NOT EXISTS free_group_joins (
-                        user_id BIGINT PRIMARY KEY,
-                        joined_at TIMESTAMP WITH TIME ZONE NOT NULL,
-                        discount_sent BOOLEAN DEFAULT FALSE
-                    )
-                """)
-
-                await conn.execute("""
-                    CREATE TABLE IF NOT EXISTS pending_welcome_dms (
-                        user_id BIGINT PRIMARY KEY,
-                        first_name VARCHAR(255) NOT NULL,
-                        message_type VARCHAR(20) NOT NULL,
-                        message_content TEXT NOT NULL,
-                        failed_attempts INT DEFAULT 0,
-                        last_attempt TIMESTAMP WITH TIME ZONE,
-                        created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
-                    )
-                """)
+            sent, error = None, str(e)
 
-                await conn.execute("""
-                    CREATE TABLE IF NOT EXISTS vip_trial_activations (
-                        user_id BIGINT PRIMARY KEY,
-                        activation_date TIMESTAMP WITH TIME ZONE NOT NULL,
-                        expiry_date TIMESTAMP WITH TIME ZONE NOT NULL,
-                        created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
-                    )
-                """)
-
-                await conn.execute("""
-                    CREATE TABLE IF NOT EXISTS trial_offer_history (
-                        user_id BIGINT PRIMARY KEY,
-                        offer_sent_date TIMESTAMP WITH TIME ZONE NOT NULL,
-                        accepted BOOLEAN DEFAULT FALSE,
-                        created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
-                    )
-                """)
+        async with self.db_pool.acquire() as conn:
+            if sent:
+                await mark_sent(conn, row['id'], getattr(sent, 'id', None))
+                return True
+            if not await mark_failed(conn, row['id'], row['attempts'],
+                                     error):
+                await self.log_to_debug(
+                    f"❌ Gave up on {row['label']} notification for {row['message_id']} after {row['attempts']} attempts: {error}",
+                    is_error=True)
+        return False
 
-                await conn.execute("""
-                    CREATE TABLE IF NOT EXISTS peer_id_checks (
-                        user_id BIGINT PRIMARY KEY,
-                        joined_at TIMESTAMP WITH TIME ZONE NOT NULL,
-                        peer_id_established BOOLEAN DEFAULT FALSE,
-                        established_at TIMESTAMP WITH TIME ZONE,
-                        current_delay_minutes INT DEFAULT 30,
-                        current_interval_minutes INT DEFAULT 3,
-                        last_check_at TIMESTAMP WITH TIME ZONE,
-                        next_check_at TIMESTAMP WITH TIME ZONE,
-                        welcome_dm_sent BOOLEAN DEFAULT FALSE,
-                        created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
-                    )
-                """)
+    async def deliver_chat_notifications(self, rows: list):
+        # One chat's replies go out in order (TP1 before TP2): after a failed
+        # send the rest of the batch waits for that row's retry
+        for position, row in enumerate(rows):
+            if await self.deliver_trade_notification(row):
+                continue
+            remaining = [later['id'] for later in rows[position + 1:]]
+            if remaining:
+                try:
+                    async with self.db_pool.acquire() as conn:
+                        await release_after(conn, remaining, row['id'])
+                except Exception as e:
+                    # The claims age out after stale_claim and are retried
+                    logger.error(f"Could not release outbox rows {remaining}: {e}")
+            break
 
-                await conn.execute("""
-                    CREATE TABLE IF NOT EXISTS userbot_dm_queue (
-                        id SERIAL PRIMARY KEY,
-                        user_id BIGINT NOT NULL,
-                        message_text TEXT NOT NULL,
-                        label TEXT NOT NULL,
-                        status VARCHAR(20) DEFAULT 'pending',
-                        retry_count INTEGER DEFAULT 0,
-                        last_attempt TIMESTAMP WITH TIME ZONE,
-                        created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-                        sent_at TIMESTAMP WITH TIME ZONE
-                    )
-                """)
+    async def notification_outbox_loop(self):
+        """Drain notification_outbox: due rows are sent concurrently per chat"""
+        config = NOTIFICATION_OUTBOX_CONFIG
+        while self.running:
+            self.outbox_wakeup.clear()
+            claimed = []
+            try:
+                if self.db_pool:
+                    async with self.db_pool.acquire() as conn:
+                        async with conn.transaction():
+                            await self.fence(conn)
+                            claimed = await claim_notifications(
+                                conn, config['batch_size'],
+                                config['stale_claim'])
+
+                    by_chat = {}
+                    for row in claimed:
+                        by_chat.setdefault(row['chat_id'], []).append(row)
+                    await asyncio.gather(*(self.deliver_chat_notifications(rows)
+                                           for rows in by_chat.values()))
+            except Exception as e:
+                logger.error(f"Error in notification outbox loop: {e}")
 
+            # A full batch means more is due; otherwise wait for a new hit
+            if len(claimed) < config['batch_size']:
                 try:
-                    await conn.execute(
-                        "ALTER TABLE userbot_dm_queue ADD COLUMN IF NOT EXISTS sent_at TIMESTAMP WITH TIME ZONE"
-                    )
-                except:
+                    await asyncio.wait_for(self.outbox_wakeup.wait(),
+                                           config['poll_interval'])
+                except asyncio.TimeoutError:
                     pass
 
-            logger.info("Database tables initialized")
-            await self.load_config_from_db()
-            await self.load_active_trades_from_db()
-
-        except Exception as e:
-            logger.error(f"Database initialization failed: {e}")
-            self.db_pool = None
-
-    async def initialize_all_tables(self, conn):
-        """Ensures every single required table exists with the correct schema."""
-        try:
-            # 1. Userbot DM Queue
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS userbot_dm_queue (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT NOT NULL,
-                    message_text TEXT NOT NULL,
-                    label TEXT NOT NULL,
-                    status TEXT DEFAULT 'pending',
-                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                    sent_at TIMESTAMP WITH TIME ZONE
-                );
-            """)
-
-            # 2. Completed Trades
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS completed_trades (
-                    id SERIAL PRIMARY KEY,
-                    pair VARCHAR(20) NOT NULL,
-                    entry_price DECIMAL,
-                    exit_price DECIMAL,
-                    pips DECIMAL,
-                    result VARCHAR(20),
-                    closed_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                    message_id BIGINT,
-                    completion_reason TEXT
-                );
-            """)
-
-            # 3. Active Trades
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS active_trades (
-                    message_id BIGINT PRIMARY KEY,
-                    pair VARCHAR(20) NOT NULL,
-                    entry_price DECIMAL NOT NULL,
-                    tp1 DECIMAL,
-                    tp2 DECIMAL,
-                    tp3 DECIMAL,
-                    sl DECIMAL,
-                    status VARCHAR(20) DEFAULT 'active',
-                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-                );
-            """)
-
-            # 4. VIP & Trial Management
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS role_history (
-                    member_id BIGINT PRIMARY KEY,
-                    first_granted TIMESTAMP WITH TIME ZONE,
-                    times_granted INTEGER DEFAULT 1,
-                    last_expired TIMESTAMP WITH TIME ZONE
-                );
-            """)
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS active_members (
-                    member_id BIGINT PRIMARY KEY,
-                    role_added_time TIMESTAMP WITH TIME ZONE NOT NULL,
-                    role_id BIGINT NOT NULL,
-                    guild_id BIGINT NOT NULL,
-                    weekend_delayed BOOLEAN DEFAULT FALSE,
-                    expiry_time TIMESTAMP WITH TIME ZONE,
-                    custom_duration BOOLEAN DEFAULT FALSE,
-                    monday_notification_sent BOOLEAN DEFAULT FALSE
-                )
-            """)
-
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS peer_id_checks (
-                    user_id BIGINT PRIMARY KEY,
-                    joined_at TIMESTAMP WITH TIME ZONE NOT NULL,
-                    peer_id_established BOOLEAN DEFAULT FALSE,
-                    established_at TIMESTAMP WITH TIME ZONE,
-                    current_delay_minutes INT DEFAULT 30,
-                    current_interval_minutes INT DEFAULT 3,
-                    last_check_at TIMESTAMP WITH TIME ZONE,
-                    next_check_at TIMESTAMP WITH TIME ZONE,
-                    welcome_dm_sent BOOLEAN DEFAULT FALSE,
-                    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-                    last_daily_offer_at TIMESTAMP WITH TIME ZONE
-                )
-            """)
-
-            logger.info("Database tables initialized successfully")
-        except Exception as e:
-            logger.error(f"Error in initialize_all_tables: {e}")
-            raise
-
-    async def initialize_additional_tables(self, conn):
-        """Ensures any other required tables exist."""
-        try:
-            # 5. Bot Settings
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS bot_settings (
-                    setting_key VARCHAR(100) PRIMARY KEY,
-                    setting_value TEXT NOT NULL
-                );
-            """)
-
-            # 6. DM Schedule
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS dm_schedule (
-                    member_id BIGINT PRIMARY KEY,
-                    role_expired TIMESTAMP WITH TIME ZONE NOT NULL,
-                    guild_id BIGINT NOT NULL,
-                    dm_3_sent BOOLEAN DEFAULT FALSE,
-                    dm_7_sent BOOLEAN DEFAULT FALSE,
-                    dm_14_sent BOOLEAN DEFAULT FALSE
-                );
-            """)
-
-            # 7. Bot Status
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS bot_status (
-                    status_key TEXT PRIMARY KEY,
-                    status_value TEXT NOT NULL
-                );
-            """)
-
-            # 8. Engagement & Discovery
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS free_group_joins (
-                    user_id BIGINT PRIMARY KEY,
-                    joined_at TIMESTAMP WITH TIME ZONE,
-                    discount_sent BOOLEAN DEFAULT FALSE
-                );
-            """)
-
-            # 9. Safety Migrations
-            await conn.execute("""
-                DO $$ 
-                BEGIN 
-                    IF EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name='userbot_dm_queue' AND column_name='message') THEN
-                        ALTER TABLE userbot_dm_queue RENAME COLUMN message TO message_text;
-                    END IF;
-                    IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name='userbot_dm_queue' AND column_name='sent_at') THEN
-                        ALTER TABLE userbot_dm_queue ADD COLUMN sent_at TIMESTAMP WITH TIME ZONE;
-                    END IF;
-                    
-                    -- Fix bot_status table if it uses 'id' instead of 'status_key'
-                    IF EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name='bot_status' AND column_name='id') THEN
-                        ALTER TABLE bot_status RENAME COLUMN id TO status_key;
-                    END IF;
-                END $$;
-            """)
-
-            logger.info("Additional database tables initialized successfully")
-        except Exception as e:
-            logger.error(f"Error in initialize_additional_tables: {e}")
-            raise
-
     async def load_config_from_db(self):
         if not self.db_pool:
             return
@@ -5525,15 +5659,22 @@ class TelegramTradingBot:
         except Exception as e:
             logger.error(f"Error saving auto role config: {e}")
 
-    async def load_active_trades_from_db(self):
+    async def load_active_trades_from_db(self,
+                                         message_ids: Optional[List[str]] = None):
+        """Load active trades into memory; message_ids limits it to those trades"""
         if not self.db_pool:
             return
 
         try:
             async with self.db_pool.acquire() as conn:
                 # Ensure status is explicitly 'active' for query consistency
-                rows = await conn.fetch(
-                    "SELECT * FROM active_trades WHERE status IN ('active', 'pending_entry')")
+                if message_ids is None:
+                    rows = await conn.fetch(
+                        "SELECT * FROM active_trades WHERE status IN ('active', 'pending_entry')")
+                else:
+                    rows = await conn.fetch(
+                        "SELECT * FROM active_trades WHERE status IN ('active', 'pending_entry') AND message_id = ANY($1::text[])",
+                        message_ids)
 
                 for row in rows:
                     trade_key = row['message_id']
@@ -5560,9 +5701,10 @@ class TelegramTradingBot:
                     try:
                         raw_ids = row.get('all_channel_ids', '')
                         if raw_ids and raw_ids.strip():
+                            # Channel ids are negative (-100...)
                             all_channel_ids = [
                                 int(cid) for cid in raw_ids.split(',')
-                                if cid.strip().isdigit()
+                                if cid.strip().lstrip('-').isdigit()
                             ]
                     except (ValueError, TypeError, KeyError):
                         pass
@@ -5663,59 +5805,56 @@ class TelegramTradingBot:
                         'group_name':
                         row.get('group_name', ''),
                         'manual_tracking_only':
-                        row.get('manual_tracking_only', False)
+                        bool(row.get('manual_tracking_only', False))
+                        and self.is_manual_tracking_pair(row['pair'])
                     }
 
                 logger.info(
-                    f"Loaded {len(PRICE_TRACKING_CONFIG['active_trades'])} active trades from database"
-                )
+                    f"Loaded {len(rows)} active trades from database")
         except Exception as e:
             logger.error(f"Error loading active trades: {e}")
 
+    def active_trade_args(self, message_id: str, trade_data: dict) -> tuple:
+        """Parameters for ACTIVE_TRADE_UPSERT"""
+        all_channel_ids = trade_data.get('all_channel_ids', [])
+        return (message_id, trade_data.get('chat_id', 0),
+                trade_data.get('chat_id', 0), trade_data.get('pair'),
+                trade_data.get('action'), trade_data.get('entry_price'),
+                trade_data.get('tp1_price'), trade_data.get('tp2_price'),
+                trade_data.get('tp3_price'), trade_data.get('sl_price'),
+                trade_data.get('telegram_entry'),
+                trade_data.get('telegram_tp1'),
+                trade_data.get('telegram_tp2'),
+                trade_data.get('telegram_tp3'),
+                trade_data.get('telegram_sl'), trade_data.get('live_entry'),
+                trade_data.get('assigned_api', 'currencybeacon'),
+                trade_data.get('status', 'active'),
+                ','.join(trade_data.get('tp_hits', [])),
+                trade_data.get('breakeven_active', False),
+                trade_data.get('entry_type', 'execution'),
+                ','.join(trade_data.get('manual_overrides', [])),
+                json.dumps(trade_data.get('channel_message_map', {})),
+                ','.join(str(cid) for cid in all_channel_ids),
+                trade_data.get('group_name', ''),
+                trade_data.get('manual_tracking_only', False))
+
     async def save_trade_to_db(self, message_id: str, trade_data: dict):
         if not self.db_pool:
             return
 
         try:
-            async with self.db_pool.acquire() as conn:
-                tp_hits_str = ','.join(trade_data.get('tp_hits', []))
-                manual_overrides_str = ','.join(
-                    trade_data.get('manual_overrides', []))
-                channel_message_map_str = json.dumps(
-                    trade_data.get('channel_message_map', {}))
-                all_channel_ids = trade_data.get('all_channel_ids', [])
-                all_channel_ids_str = ','.join(
-                    str(cid) for cid in all_channel_ids)
-                group_name = trade_data.get('group_name', '')
-
-                await conn.execute(
-                    '''
-                    INSERT INTO active_trades 
-                    (message_id, channel_id, guild_id, pair, action, entry_price, tp1_price, tp2_price, tp3_price, sl_price,
-                     telegram_entry, telegram_tp1, telegram_tp2, telegram_tp3, telegram_sl, live_entry, assigned_api,
-                     status, tp_hits, breakeven_active, entry_type, manual_overrides, channel_message_map, all_channel_ids, group_name, manual_tracking_only)
-                    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, $15, $16, $17, $18, $19, $20, $21, $22, $23, $24, $25, $26)
-                    ON CONFLICT (message_id) DO UPDATE SET
-                    status = $18, tp_hits = $19, breakeven_active = $20, manual_overrides = $22, 
-                    channel_message_map = $23, all_channel_ids = $24, group_name = $25, manual_tracking_only = $26, last_updated = NOW()
-                ''', message_id, trade_data.get('chat_id', 0),
-                    trade_data.get('chat_id', 0), trade_data.get('pair'),
-                    trade_data.get('action'), trade_data.get('entry_price'),
-                    trade_data.get('tp1_price'), trade_data.get('tp2_price'),
-                    trade_data.get('tp3_price'), trade_data.get('sl_price'),
-                    trade_data.get('telegram_entry'),
-                    trade_data.get('telegram_tp1'),
-                    trade_data.get('telegram_tp2'),
-                    trade_data.get('telegram_tp3'),
-                    trade_data.get('telegram_sl'),
-                    trade_data.get('live_entry'),
-                    trade_data.get('assigned_api', 'currencybeacon'),
-                    trade_data.get('status', 'active'), tp_hits_str,
-                    trade_data.get('breakeven_active', False),
-                    trade_data.get('entry_type',
-                                   'execution'), manual_overrides_str,
-                    channel_message_map_str, all_channel_ids_str, group_name,
-                    trade_data.get('manual_tracking_only', False))
+            async with self.db_pool.acquire('price') as conn:
+                async with conn.transaction():
+                    inserted = await conn.fetchval(
+                        ACTIVE_TRADE_UPSERT,
+                        *self.active_trade_args(message_id, trade_data))
+
+                    # xmax = 0 only for a fresh row, not the ON CONFLICT update
+                    if inserted:
+                        await conn.execute_named(
+                            'trade_event', message_id, 'signal_created',
+                            trade_data.get('entry_price'),
+                            trade_data.get('status', 'active'), None)
 
                 await self.log_to_debug(
                     f"Database INSERT successful for message_id: {message_id}")
@@ -5725,120 +5864,165 @@ class TelegramTradingBot:
                 f"Database INSERT failed for message_id {message_id}: {str(e)}"
             )
 
-    async def update_trade_in_db(self, message_id: str, trade_data: dict):
+    async def append_trade_event(self,
+                                 message_id: str,
+                                 event_type: str,
+                                 price: Optional[float] = None,
+                                 status: Optional[str] = None,
+                                 detail: Optional[str] = None,
+                                 notifications: Optional[List[Dict]] = None,
+                                 fenced: bool = False) -> bool:
+        """Record one trade event and its replies in one transaction; a trigger updates active_trades
+
+        fenced=True for price-engine hits, which only the leader may commit.
+        Returns True once committed; callers only update memory after that.
+        """
         if not self.db_pool:
-            return
+            self.send_notifications_directly(notifications)
+            return True
 
         try:
-            async with self.db_pool.acquire() as conn:
-                tp_hits_str = ','.join(trade_data.get('tp_hits', []))
-                manual_overrides_str = ','.join(
-                    trade_data.get('manual_overrides', []))
-
-                await conn.execute(
-                    '''
-                    UPDATE active_trades 
-                    SET status = $2, tp_hits = $3, breakeven_active = $4, 
-                        manual_overrides = $5, live_entry = $6, last_updated = NOW()
-                    WHERE message_id = $1
-                ''', message_id, trade_data.get('status',
-                                                'active'), tp_hits_str,
-                    trade_data.get('breakeven_active', False),
-                    manual_overrides_str, trade_data.get('live_entry'))
+            async with self.db_pool.acquire('price') as conn:
+                async with conn.transaction():
+                    if fenced:
+                        await self.fence(conn)
+                    await conn.execute_named(
+                        'trade_event', message_id, event_type,
+                        float(price) if price is not None else None, status,
+                        detail)
+                    await self.queue_trade_notification(conn, notifications)
+        except FencedOut as e:
+            logger.warning(f"⚠️ Dropped {event_type} for {message_id}: {e}")
+            return False
         except Exception as e:
-            logger.error(f"Error updating trade in database: {e}")
+            # Nothing committed: no reply goes out, memory is unchanged and
+            # the hit is evaluated and written again on the next check
+            logger.error(f"Error recording {event_type} for {message_id}: {e}")
+            return False
 
-    async def archive_trade_to_completed(self, message_id: str,
-                                         trade_data: dict,
-                                         completion_reason: str):
-        if not self.db_pool:
-            return
+        if notifications:
+            self.outbox_wakeup.set()
+        return True
 
-        try:
-            async with self.db_pool.acquire() as conn:
-                tp_hits_str = ','.join(trade_data.get('tp_hits', []))
-                manual_overrides_str = ','.join(
-                    trade_data.get('manual_overrides', []))
-
-                created_at = trade_data.get('created_at')
-                if isinstance(created_at, str):
-                    created_at = datetime.fromisoformat(
-                        created_at.replace('Z', '+00:00'))
-                if created_at is None:
-                    created_at = datetime.now(
-                        pytz.UTC).astimezone(AMSTERDAM_TZ)
+    def send_notifications_directly(self,
+                                    notifications: Optional[List[Dict]]):
+        """Send replies straight away when running without a database (no outbox)"""
+        for notification in notifications or []:
+            asyncio.create_task(
+                self.send_trade_reply(notification['chat_id'],
+                                      notification['text'],
+                                      notification['reply_to'],
+                                      notification['label']))
+
+    async def _insert_completed_trade(self, conn, message_id: str,
+                                      trade_data: dict,
+                                      completion_reason: str) -> bool:
+        """Archive a trade into completed_trades; False if it already is."""
+        tp_hits_str = ','.join(trade_data.get('tp_hits', []))
+        manual_overrides_str = ','.join(trade_data.get('manual_overrides', []))
+
+        created_at = trade_data.get('created_at')
+        if isinstance(created_at, str):
+            created_at = datetime.fromisoformat(
+                created_at.replace('Z', '+00:00'))
+        if created_at is None:
+            created_at = datetime.now(pytz.UTC).astimezone(AMSTERDAM_TZ)
+
+        # completed_trades is partitioned by created_at, so there is
+        # no unique index on message_id alone to conflict on
+        if await conn.fetchval(
+                'SELECT 1 FROM completed_trades WHERE message_id = $1',
+                message_id):
+            return False
 
-                await conn.execute(
-                    '''
-                    INSERT INTO completed_trades 
-                    (message_id, channel_id, guild_id, pair, action, entry_price, tp1_price, tp2_price, tp3_price, sl_price,
-                     telegram_entry, telegram_tp1, telegram_tp2, telegram_tp3, telegram_sl, live_entry, assigned_api,
-                     final_status, tp_hits, breakeven_active, entry_type, manual_overrides, created_at, completion_reason)
-                    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, $15, $16, $17, $18, $19, $20, $21, $22, $23, $24)
-                    ON CONFLICT (message_id) DO NOTHING
-                ''', message_id, trade_data.get('chat_id', 0),
-                    trade_data.get('chat_id', 0), trade_data.get('pair'),
-                    trade_data.get('action'),
-                    trade_data.get('entry_price') or trade_data.get('entry'),
-                    trade_data.get('tp1_price') or trade_data.get('tp1'),
-                    trade_data.get('tp2_price') or trade_data.get('tp2'),
-                    trade_data.get('tp3_price') or trade_data.get('tp3'),
-                    trade_data.get('sl_price') or trade_data.get('sl'),
-                    trade_data.get('telegram_entry'),
-                    trade_data.get('telegram_tp1'),
-                    trade_data.get('telegram_tp2'),
-                    trade_data.get('telegram_tp3'),
-                    trade_data.get('telegram_sl'),
-                    trade_data.get('live_entry'),
-                    trade_data.get('assigned_api', 'currencybeacon'),
-                    trade_data.get('status', 'completed'), tp_hits_str,
-                    trade_data.get('breakeven_active', False),
-                    trade_data.get('entry_type', 'execution'),
-                    manual_overrides_str, created_at, completion_reason)
+        await conn.execute(
+            '''
+            INSERT INTO completed_trades 
+            (message_id, channel_id, guild_id, pair, action, entry_price, tp1_price, tp2_price, tp3_price, sl_price,
+             telegram_entry, telegram_tp1, telegram_tp2, telegram_tp3, telegram_sl, live_entry, assigned_api,
+             final_status, tp_hits, breakeven_active, entry_type, manual_overrides, created_at, completion_reason)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, $15, $16, $17, $18, $19, $20, $21, $22, $23, $24)
+            ON CONFLICT DO NOTHING
+        ''', message_id, trade_data.get('chat_id', 0),
+            trade_data.get('chat_id', 0), trade_data.get('pair'),
+            trade_data.get('action'),
+            trade_data.get('entry_price') or trade_data.get('entry'),
+            trade_data.get('tp1_price') or trade_data.get('tp1'),
+            trade_data.get('tp2_price') or trade_data.get('tp2'),
+            trade_data.get('tp3_price') or trade_data.get('tp3'),
+            trade_data.get('sl_price') or trade_data.get('sl'),
+            trade_data.get('telegram_entry'), trade_data.get('telegram_tp1'),
+            trade_data.get('telegram_tp2'), trade_data.get('telegram_tp3'),
+            trade_data.get('telegram_sl'), trade_data.get('live_entry'),
+            trade_data.get('assigned_api', 'currencybeacon'),
+            trade_data.get('status', 'completed'), tp_hits_str,
+            trade_data.get('breakeven_active', False),
+            trade_data.get('entry_type', 'execution'), manual_overrides_str,
+            created_at, completion_reason)
+        return True
+
+    async def remove_trade_from_db(self,
+                                   message_id: str,
+                                   reason: str,
+                                   trade_data: Optional[dict] = None,
+                                   price: Optional[float] = None,
+                                   notifications: Optional[List[Dict]] = None,
+                                   fenced: bool = False) -> bool:
+        """Close a trade: closing event, replies, archive and delete in one transaction.
+
+        The trade leaves memory only once the close has committed; returns
+        whether it did.
+        """
+        if not self.db_pool:
+            self.send_notifications_directly(notifications)
+            PRICE_TRACKING_CONFIG['active_trades'].pop(message_id, None)
+            return True
 
-                await self.log_to_debug(
-                    f"Trade {message_id} archived to completed_trades: {completion_reason}"
-                )
+        if trade_data is None:
+            trade_data = PRICE_TRACKING_CONFIG['active_trades'].get(
+                message_id, {})
+
+        try:
+            async with self.db_pool.acquire('price') as conn:
+                async with conn.transaction():
+                    if fenced:
+                        await self.fence(conn)
+                    await conn.execute_named(
+                        'trade_event', message_id, completion_event(reason),
+                        float(price) if price is not None else None,
+                        trade_data.get('status'), reason)
+                    archived = False
+                    if trade_data:
+                        archived = await self._insert_completed_trade(
+                            conn, message_id, trade_data, reason)
+                    await conn.execute_named('trade_delete', message_id)
+                    await self.queue_trade_notification(conn, notifications)
+        except FencedOut as e:
+            # The new leader owns this trade now
+            logger.warning(f"⚠️ Dropped close of {message_id}: {e}")
+            return False
         except Exception as e:
+            # Nothing was committed: the trade stays in active_trades and in
+            # memory, so the close (and its replies) is retried on the next check
             logger.error(
-                f"CRITICAL: Error archiving trade to completed_trades: {e}")
+                f"CRITICAL: Failed to close trade {message_id} ({reason}): {e}")
             await self.log_to_debug(
-                f"CRITICAL: Archive FAILED for {message_id} (reason: {completion_reason}): {e}"
+                f"CRITICAL: Archive FAILED for {message_id} (reason: {reason}): {e}"
             )
-            raise
-
-    async def remove_trade_from_db(self, message_id: str, reason: str):
-        if not self.db_pool:
-            return
-
-        try:
-            trade_data = PRICE_TRACKING_CONFIG['active_trades'].get(
-                message_id, {})
-            if trade_data:
-                try:
-                    await self.archive_trade_to_completed(
-                        message_id, trade_data, reason)
-                except Exception as archive_err:
-                    logger.error(
-                        f"CRITICAL: Failed to archive trade {message_id} before deletion: {archive_err}"
-                    )
-                    await self.log_to_debug(
-                        f"CRITICAL: Archive failed for {message_id}: {archive_err}"
-                    )
+            return False
 
-            async with self.db_pool.acquire() as conn:
-                await conn.execute(
-                    'DELETE FROM active_trades WHERE message_id = $1',
-                    message_id)
+        if notifications:
+            self.outbox_wakeup.set()
 
-            if message_id in PRICE_TRACKING_CONFIG['active_trades']:
-                del PRICE_TRACKING_CONFIG['active_trades'][message_id]
+        if message_id in PRICE_TRACKING_CONFIG['active_trades']:
+            del PRICE_TRACKING_CONFIG['active_trades'][message_id]
 
-            logger.info(
-                f"Trade {message_id} removed from database (reason: {reason})")
-        except Exception as e:
-            logger.error(f"Error removing trade from database: {e}")
-            await self.log_to_debug(f"Error removing trade {message_id}: {e}")
+        if archived:
+            await self.log_to_debug(
+                f"Trade {message_id} archived to completed_trades: {reason}")
+        logger.info(
+            f"Trade {message_id} removed from database (reason: {reason})")
+        return True
 
     async def restore_trades_from_completed(
             self, reason_filter: str = "message_deleted"):
@@ -5959,87 +6143,299 @@ class TelegramTradingBot:
             f"Checking {len(PRICE_TRACKING_CONFIG['active_trades'])} active trades for TP/SL hits that occurred while offline..."
         )
 
-        offline_hits_found = 0
-
+        # Group trades by pair so every pair is quoted once, no matter how many trades share it
+        trades_by_pair = {}
         for message_id, trade_data in list(
                 PRICE_TRACKING_CONFIG['active_trades'].items()):
-            try:
-                current_price = await self.get_live_price(trade_data['pair'])
-                if current_price is None:
-                    continue
+            if trade_data.get('manual_tracking_only', False):
+                continue
+            pair_clean = str(trade_data.get('pair', '')).upper().replace(
+                "/", "").replace("-", "").replace("_", "")
+            trades_by_pair.setdefault(pair_clean, []).append(
+                (message_id, trade_data))
 
-                action = trade_data['action']
-                live_entry = trade_data.get('live_entry') or trade_data.get(
-                    'entry', 0)
-                tp_hits = trade_data.get('tp_hits', [])
-                breakeven_active = trade_data.get('breakeven_active', False)
-
-                if action == "BUY":
-                    if breakeven_active and live_entry:
-                        if current_price <= live_entry:
-                            await self.handle_breakeven_hit(
-                                message_id, trade_data)
-                            offline_hits_found += 1
-                            continue
-                    elif current_price <= trade_data['sl_price']:
-                        await self.handle_sl_hit(message_id, trade_data,
-                                                 current_price)
-                        offline_hits_found += 1
-                        continue
-                elif action == "SELL":
-                    if breakeven_active and live_entry:
-                        if current_price >= live_entry:
-                            await self.handle_breakeven_hit(
-                                message_id, trade_data)
-                            offline_hits_found += 1
-                            continue
-                    elif current_price >= trade_data['sl_price']:
-                        await self.handle_sl_hit(message_id, trade_data,
-                                                 current_price)
-                        offline_hits_found += 1
-                        continue
+        if not trades_by_pair:
+            return
+
+        # Replay candles first so spikes that reversed while offline are not lost
+        try:
+            await self.backfill_missed_hits(trades_by_pair)
+        except Exception as e:
+            logger.error(f"Error backfilling missed hits: {e}")
 
-                tp_levels_hit = []
-
-                if action == "BUY":
-                    if "tp1" not in tp_hits and current_price >= trade_data[
-                            'tp1_price']:
-                        tp_levels_hit.append("tp1")
-                    if "tp2" not in tp_hits and current_price >= trade_data[
-                            'tp2_price']:
-                        tp_levels_hit.append("tp2")
-                    if "tp3" not in tp_hits and current_price >= trade_data[
-                            'tp3_price']:
-                        tp_levels_hit.append("tp3")
-                elif action == "SELL":
-                    if "tp1" not in tp_hits and current_price <= trade_data[
-                            'tp1_price']:
-                        tp_levels_hit.append("tp1")
-                    if "tp2" not in tp_hits and current_price <= trade_data[
-                            'tp2_price']:
-                        tp_levels_hit.append("tp2")
-                    if "tp3" not in tp_hits and current_price <= trade_data[
-                            'tp3_price']:
-                        tp_levels_hit.append("tp3")
-
-                if tp_levels_hit:
-                    for tp_level in ["tp1", "tp2", "tp3"]:
-                        if tp_level in tp_levels_hit:
-                            await self.handle_tp_hit(message_id, trade_data,
-                                                     tp_level, current_price)
-                            offline_hits_found += 1
+        for pair_clean in list(trades_by_pair.keys()):
+            trades_by_pair[pair_clean] = [
+                (message_id, trade_data)
+                for message_id, trade_data in trades_by_pair[pair_clean]
+                if message_id in PRICE_TRACKING_CONFIG['active_trades']
+            ]
+            if not trades_by_pair[pair_clean]:
+                del trades_by_pair[pair_clean]
+
+        if not trades_by_pair:
+            return
+
+        prices = await self.price_feeds.get_live_prices(
+            list(trades_by_pair.keys()))
+
+        pending_hits = []
+        for pair_clean, pair_trades in trades_by_pair.items():
+            current_price = prices.get(pair_clean)
+            if current_price is None:
+                continue
+            for message_id, trade_data in pair_trades:
+                try:
+                    hits = evaluate_price_hits(trade_data, current_price)
+                except Exception as e:
+                    logger.error(
+                        f"Error checking offline TP/SL for {message_id}: {e}")
                     continue
+                if hits:
+                    pending_hits.append(
+                        (message_id, trade_data, hits, current_price))
+
+        # Trades are independent, so their hits are applied concurrently;
+        # notifications are paced by the send scheduler
+        results = await asyncio.gather(*[
+            self.apply_price_hits(message_id, trade_data, hits, current_price)
+            for message_id, trade_data, hits, current_price in pending_hits
+        ],
+                                       return_exceptions=True)
 
-            except Exception as e:
+        offline_hits_found = 0
+        for (message_id, _, _, _), result in zip(pending_hits, results):
+            if isinstance(result, Exception):
                 logger.error(
-                    f"Error checking offline TP/SL for {message_id}: {e}")
-                continue
+                    f"Error applying offline TP/SL for {message_id}: {result}")
+            else:
+                offline_hits_found += result
 
         if offline_hits_found > 0:
             logger.info(
                 f"Found and processed {offline_hits_found} TP/SL hits that occurred while offline"
             )
 
+    async def record_price_check_heartbeat(self):
+        """Remember when prices were last checked so a restart knows its offline window"""
+        if not self.db_pool:
+            return
+        try:
+            async with self.db_pool.acquire('price') as conn:
+                await conn.execute_named('price_heartbeat',
+                                         datetime.now(pytz.UTC).isoformat())
+        except Exception as e:
+            logger.error(f"Error recording price check heartbeat: {e}")
+
+    async def read_userbot_db_metrics(self) -> dict:
+        """Latest pool metrics the userbot published to bot_status"""
+        if not self.db_pool:
+            return {}
+        try:
+            async with self.db_pool.acquire() as conn:
+                value = await conn.fetchval(
+                    "SELECT status_value FROM bot_status WHERE status_key = 'userbot_db_metrics'"
+                )
+            return json.loads(value) if value else {}
+        except Exception as e:
+            logger.error(f"Error reading userbot DB metrics: {e}")
+            return {}
+
+    async def get_offline_window_start(self) -> datetime:
+        now = datetime.now(pytz.UTC)
+        earliest = now - timedelta(
+            hours=PRICE_TRACKING_CONFIG['offline_backfill_max_hours'])
+        try:
+            async with self.db_pool.acquire() as conn:
+                value = await conn.fetchval(
+                    "SELECT status_value FROM bot_status WHERE status_key = 'price_check_heartbeat'"
+                )
+            if value:
+                return max(datetime.fromisoformat(value), earliest)
+        except Exception as e:
+            logger.error(f"Error reading price check heartbeat: {e}")
+        return earliest
+
+    async def get_historical_candles(self, session: aiohttp.ClientSession,
+                                     pair: str, start: datetime,
+                                     end: datetime) -> Optional[dict]:
+        """Minute candles for the offline window, or None if no candle source is configured"""
+        data_dir = PRICE_TRACKING_CONFIG.get('candle_data_dir')
+        if data_dir:
+            return await asyncio.to_thread(
+                signal_replay.load_candles_from_file, data_dir, pair, start,
+                end)
+
+        api_key = PRICE_TRACKING_CONFIG['api_keys'].get('twelvedata_key')
+        if api_key:
+            return await signal_replay.fetch_candles_twelvedata(
+                session, api_key, pair, start, end,
+                PAIR_CONFIG.get(pair, {}).get('feed_symbol'))
+
+        return None
+
+    async def _replay_pair_offline(self, session: aiohttp.ClientSession,
+                                   pair: str, pair_trades: list,
+                                   window_start: datetime,
+                                   window_end: datetime) -> list:
+        """Replay every open trade of one pair over its candles in a single vectorised pass"""
+        starts = []
+        for _, trade_data in pair_trades:
+            start = window_start
+            created_at = trade_data.get('created_at')
+            if isinstance(created_at, str):
+                created_at = datetime.fromisoformat(
+                    created_at.replace('Z', '+00:00'))
+            if created_at and created_at > start:
+                start = created_at
+            starts.append(int(start.timestamp()))
+
+        candles = await self.get_historical_candles(
+            session, pair, datetime.fromtimestamp(min(starts), pytz.UTC),
+            window_end)
+        if not candles or len(candles['time']) == 0:
+            return []
+
+        def column(key: str) -> np.ndarray:
+            return np.array([float(t.get(key) or 0) for _, t in pair_trades],
+                            dtype=np.float64)
+
+        trades = {
+            'is_buy':
+            np.array([
+                str(t.get('action', '')).upper() == 'BUY'
+                for _, t in pair_trades
+            ]),
+            'entry':
+            np.array([
+                float(t.get('live_entry') or t.get('entry') or 0)
+                for _, t in pair_trades
+            ]),
+            'tp1':
+            column('tp1_price'),
+            'tp2':
+            column('tp2_price'),
+            'tp3':
+            column('tp3_price'),
+            'sl':
+            column('sl_price'),
+            'start_time':
+            np.array(starts, dtype=np.int64),
+            'tp1_done':
+            np.array(['TP1' in t.get('tp_hits', []) for _, t in pair_trades]),
+            'tp2_done':
+            np.array(['TP2' in t.get('tp_hits', []) for _, t in pair_trades]),
+            'tp3_done':
+            np.array(['TP3' in t.get('tp_hits', []) for _, t in pair_trades]),
+            'breakeven_active':
+            np.array([
+                bool(t.get('breakeven_active', False)) for _, t in pair_trades
+            ]),
+        }
+        result = signal_replay.replay_trades(candles, trades)
+
+        replayed = []
+        for row, (message_id, trade_data) in enumerate(pair_trades):
+            hits = []
+            for key, hit_type, hit_level, price in (
+                ('tp1', 'tp', 'TP1', trades['tp1'][row]),
+                ('tp2', 'tp', 'TP2', trades['tp2'][row]),
+                ('tp3', 'tp', 'TP3', trades['tp3'][row]),
+                ('sl', 'sl', 'SL', trades['sl'][row]),
+                ('breakeven', 'breakeven', 'BREAKEVEN', trades['entry'][row]),
+            ):
+                idx = result[key][row]
+                if idx == signal_replay.NO_HIT:
+                    continue
+                hits.append({
+                    'hit_type':
+                    hit_type,
+                    'hit_level':
+                    hit_level,
+                    'hit_price':
+                    float(price),
+                    'hit_time':
+                    datetime.fromtimestamp(int(candles['time'][idx]),
+                                           pytz.UTC)
+                })
+            if hits:
+                replayed.append((message_id, trade_data, hits))
+        return replayed
+
+    async def _apply_missed_hits(self, message_id: str, trade_data: dict,
+                                 hits: list) -> int:
+        applied = 0
+        for hit in self.validate_chronological_hits(hits):
+            if message_id not in PRICE_TRACKING_CONFIG['active_trades']:
+                break
+            if hit['hit_type'] == 'tp':
+                await self.handle_tp_hit(message_id, trade_data,
+                                         hit['hit_level'], hit['hit_price'])
+            elif hit['hit_type'] == 'sl':
+                await self.handle_sl_hit(message_id, trade_data,
+                                         hit['hit_price'])
+            elif hit['hit_type'] == 'breakeven':
+                await self.handle_breakeven_hit(message_id, trade_data)
+            applied += 1
+        return applied
+
+    async def backfill_missed_hits(self, trades_by_pair: dict) -> int:
+        """Replay minute candles for the offline window and apply hits a spot check can't see"""
+        if not self.db_pool:
+            return 0
+
+        window_end = datetime.now(pytz.UTC)
+        window_start = await self.get_offline_window_start()
+
+        async with aiohttp.ClientSession() as session:
+            results = await asyncio.gather(*[
+                self._replay_pair_offline(session, pair, pair_trades,
+                                          window_start, window_end)
+                for pair, pair_trades in trades_by_pair.items()
+            ],
+                                           return_exceptions=True)
+
+        replayed = []
+        for pair, result in zip(trades_by_pair.keys(), results):
+            if isinstance(result, Exception):
+                logger.error(f"Candle replay failed for {pair}: {result}")
+                continue
+            replayed.extend(result)
+
+        if not replayed:
+            return 0
+
+        async with self.db_pool.acquire() as conn:
+            await conn.executemany(
+                """INSERT INTO missed_hits (message_id, hit_type, hit_level, hit_price, hit_time)
+                   VALUES ($1, $2, $3, $4, $5)""",
+                [(message_id, hit['hit_type'], hit['hit_level'],
+                  hit['hit_price'], hit['hit_time'])
+                 for message_id, _, hits in replayed for hit in hits])
+
+        applied = await asyncio.gather(*[
+            self._apply_missed_hits(message_id, trade_data, hits)
+            for message_id, trade_data, hits in replayed
+        ],
+                                       return_exceptions=True)
+
+        total = 0
+        for (message_id, _, _), result in zip(replayed, applied):
+            if isinstance(result, Exception):
+                logger.error(
+                    f"Error applying missed hits for {message_id}: {result}")
+            else:
+                total += result
+
+        async with self.db_pool.acquire() as conn:
+            await conn.execute(
+                "UPDATE missed_hits SET processed = TRUE WHERE message_id = ANY($1::varchar[]) AND processed = FALSE",
+                [message_id for message_id, _, _ in replayed])
+
+        await self.log_to_debug(
+            f"📼 Offline backfill: replayed {sum(len(t) for t in trades_by_pair.values())} trades, applied {total} missed hits"
+        )
+        return total
+
     # REMOVED: check_offline_joiners() was redundant.
     # New members are already registered in peer_id_checks via handle_free_group_join()
     # which triggers on every member_update event (including on bot restart when cached events replay)
@@ -6085,13 +6481,7 @@ class TelegramTradingBot:
 
                 async with self.db_pool.acquire() as conn:
                     # Get all pending peer ID checks
-                    pending = await conn.fetch('''
-                        SELECT user_id, joined_at, peer_id_established, current_delay_minutes, 
-                               current_interval_minutes, next_check_at
-                        FROM peer_id_checks 
-                        WHERE NOT peer_id_established AND welcome_dm_sent = FALSE
-                        ORDER BY next_check_at ASC
-                    ''')
+                    pending = await conn.fetch_named('peer_checks_pending')
 
                     for row in pending:
                         user_id = row['user_id']
@@ -6144,8 +6534,9 @@ class TelegramTradingBot:
                                     welcome_dm = welcome_dm.replace(
                                         "{user_name}", first_name)
 
-                                    await self.app.send_message(
-                                        user_id, welcome_dm)
+                                    await self.send_scheduled(
+                                        user_id, welcome_dm,
+                                        PRIORITY_ONBOARDING, "welcome DM")
                                     await conn.execute(
                                         'UPDATE peer_id_checks SET welcome_dm_sent = TRUE WHERE user_id = $1',
                                         user_id)
@@ -6280,6 +6671,11 @@ class TelegramTradingBot:
         try:
             for member_id, data in list(
                     AUTO_ROLE_CONFIG['dm_schedule'].items()):
+                # Sequence finished, nothing left to recover
+                if data.get('dm_3_sent') and data.get(
+                        'dm_7_sent') and data.get('dm_14_sent'):
+                    continue
+
                 role_expired = datetime.fromisoformat(data['role_expired'])
                 if role_expired.tzinfo is None:
                     role_expired = AMSTERDAM_TZ.localize(role_expired)
@@ -6384,49 +6780,47 @@ class TelegramTradingBot:
                 f"Error validating trial expiry times: {e}", is_error=True)
 
     async def check_offline_engagement_discounts(self):
-        """Recover and send missed engagement discount DMs"""
+        """Queue engagement discount DMs that came due while the bot was offline"""
         if not self.db_pool:
             return
 
         current_time = datetime.now(pytz.UTC).astimezone(AMSTERDAM_TZ)
         recovered_discounts = 0
+        discount_dm = MESSAGE_TEMPLATES["Engagement & Offers"][
+            "Engagement Discount (50% Off)"]["message"]
 
         try:
             async with self.db_pool.acquire() as conn:
-                # Get users who should have received discount but didn't
-                joins = await conn.fetch(
-                    'SELECT user_id, joined_at, discount_sent FROM free_group_joins WHERE discount_sent = FALSE'
-                )
-
-            for join_row in joins:
-                user_id = join_row['user_id']
-                joined_at = join_row['joined_at']
-
-                thirty_days_ago = joined_at + timedelta(days=30)
-                if current_time < thirty_days_ago:
-                    continue
-
-                # Count reactions after 30-day mark
+                # Joined 30+ days ago, reacted to 5+ messages, no discount yet
+                eligible = await conn.fetch(
+                    '''SELECT j.user_id
+                       FROM engagement_counters c
+                       JOIN free_group_joins j ON j.user_id = c.user_id
+                       WHERE c.reacted_messages >= $2
+                         AND j.discount_sent = FALSE
+                         AND j.joined_at <= $1''',
+                    current_time - timedelta(days=30), 5)
+
+            for row in eligible:
+                user_id = row['user_id']
                 async with self.db_pool.acquire() as conn:
-                    reaction_count = await conn.fetchval(
-                        '''SELECT COUNT(DISTINCT message_id) FROM emoji_reactions
-                           WHERE user_id = $1 AND reaction_time > $2''',
-                        user_id, joined_at)
-
-                # If qualified, send discount DM
-                if reaction_count >= 5:
-                    await self.send_engagement_discount_dm(user_id)
-
-                    async with self.db_pool.acquire() as conn:
-                        await conn.execute(
-                            'UPDATE free_group_joins SET discount_sent = TRUE WHERE user_id = $1',
+                    async with conn.transaction():
+                        # Claim the discount first so the userbot's own pass
+                        # (or another replica) cannot queue it a second time
+                        claimed = await conn.execute(
+                            'UPDATE free_group_joins SET discount_sent = TRUE WHERE user_id = $1 AND discount_sent = FALSE',
                             user_id)
+                        if claimed == 'UPDATE 0':
+                            continue
+                        await conn.execute(
+                            "INSERT INTO userbot_dm_queue (user_id, message_text, label) VALUES ($1, $2, $3)",
+                            user_id, discount_dm, "Engagement Discount")
 
-                    recovered_discounts += 1
+                recovered_discounts += 1
 
             if recovered_discounts > 0:
                 await self.log_to_debug(
-                    f"✅ Recovered {recovered_discounts} missed engagement discount DMs"
+                    f"✅ Queued {recovered_discounts} missed engagement discount DMs"
                 )
 
         except Exception as e:
@@ -6437,17 +6831,27 @@ class TelegramTradingBot:
     async def price_tracking_loop(self):
         await asyncio.sleep(10)
 
+        shards = PRICE_SHARD_CONFIG['shards']
+        if shards > 1:
+            await self.run_price_shards(shards)
+            return
+
         while self.running:
             try:
                 # Record when this price check cycle started
                 PRICE_TRACKING_CONFIG['last_price_check_time'] = datetime.now(
                     pytz.UTC).astimezone(AMSTERDAM_TZ)
+                await self.record_price_check_heartbeat()
 
                 if self.is_weekend_market_closed():
                     await asyncio.sleep(PRICE_TRACKING_CONFIG['check_interval']
                                         )
                     continue
 
+                # Signals registered on another replica since the last cycle
+                if self.leader:
+                    await self.sync_new_trades()
+
                 trades = dict(PRICE_TRACKING_CONFIG['active_trades'])
 
                 for message_id, trade_data in trades.items():
@@ -6463,6 +6867,115 @@ class TelegramTradingBot:
 
             await asyncio.sleep(PRICE_TRACKING_CONFIG['check_interval'])
 
+    async def run_price_shards(self, shards: int):
+        """Track trades in pair-hashed worker processes; hits are applied on this loop"""
+        self.price_shard_pool = PriceShardPool(shards)
+        self.price_shard_stats = {
+            shard: {
+                "trades": 0,
+                "pairs": 0,
+                "cycle_ms": None,
+                "hits": 0,
+                "recycles": 0
+            }
+            for shard in range(shards)
+        }
+        logger.info(f"📊 Price engine running {shards} shard workers")
+        try:
+            while self.running:
+                try:
+                    PRICE_TRACKING_CONFIG[
+                        'last_price_check_time'] = datetime.now(
+                            pytz.UTC).astimezone(AMSTERDAM_TZ)
+                    await self.record_price_check_heartbeat()
+
+                    if self.is_weekend_market_closed():
+                        await asyncio.sleep(
+                            PRICE_TRACKING_CONFIG['check_interval'])
+                        continue
+
+                    # Signals registered on another replica since the last cycle
+                    if self.leader:
+                        await self.sync_new_trades()
+
+                    await self.price_shard_cycle(shards)
+                except Exception as e:
+                    logger.error(f"Error in sharded price tracking: {e}")
+
+                await asyncio.sleep(PRICE_TRACKING_CONFIG['check_interval'])
+        finally:
+            self.price_shard_pool.close()
+            self.price_shard_pool = None
+
+    async def price_shard_cycle(self, shards: int):
+        """One tracking cycle: checks here, quotes and evaluation in the workers"""
+        limiter = asyncio.Semaphore(PRICE_SHARD_CONFIG['prepare_concurrency'])
+
+        async def prepare(message_id: str, trade_data: dict) -> tuple:
+            async with limiter:
+                return message_id, await self.prepare_price_check(
+                    message_id, trade_data)
+
+        prepared = await asyncio.gather(*[
+            prepare(message_id, trade_data) for message_id, trade_data in list(
+                PRICE_TRACKING_CONFIG['active_trades'].items())
+        ])
+        ready = {
+            message_id: trade_data
+            for message_id, trade_data in prepared if trade_data is not None
+        }
+
+        feed_config = self.price_feeds.worker_config(shares=shards)
+        owned = [(shard, trades)
+                 for shard, trades in enumerate(partition_trades(ready, shards))
+                 if trades]
+        results = await asyncio.gather(*[
+            self.price_shard_pool.evaluate(shard, feed_config, trades)
+            for shard, trades in owned
+        ],
+                                       return_exceptions=True)
+
+        for (shard, trades), result in zip(owned, results):
+            stats = self.price_shard_stats[shard]
+            stats['recycles'] = self.price_shard_pool.recycles[shard]
+            if isinstance(result, BaseException):
+                logger.error(
+                    f"Price shard {shard} failed: {type(result).__name__}: {result}"
+                )
+                continue
+            stats.update(trades=result['trades'],
+                         pairs=result['pairs'],
+                         cycle_ms=result['cycle_ms'])
+
+            for message_id, hits, price in result['hits']:
+                trade = PRICE_TRACKING_CONFIG['active_trades'].get(message_id)
+                if not trade:
+                    continue
+                try:
+                    stats['hits'] += await self.apply_price_hits(
+                        message_id, trade, hits, price)
+                except Exception as e:
+                    logger.error(
+                        f"Error applying price hits for {message_id}: {e}")
+
+    def price_shard_metrics(self) -> dict:
+        if not self.price_shard_stats:
+            return {}
+        return {"shards": self.price_shard_stats}
+
+    async def sync_new_trades(self):
+        """Load active_trades rows this process has not seen yet"""
+        async with self.db_pool.acquire('price') as conn:
+            rows = await conn.fetch(
+                "SELECT message_id FROM active_trades WHERE status IN ('active', 'pending_entry')"
+            )
+        missing = {row['message_id']
+                   for row in rows} - set(PRICE_TRACKING_CONFIG['active_trades'])
+        if missing:
+            # Only the new trades: reloading everything would overwrite hits
+            # this leader has evaluated but not yet committed
+            await self.load_active_trades_from_db(sorted(missing))
+
     async def trial_expiry_loop(self):
         await asyncio.sleep(60)
 
@@ -6475,10 +6988,8 @@ class TelegramTradingBot:
                 if self.db_pool:
                     try:
                         async with self.db_pool.acquire() as conn:
-                            rows = await conn.fetch(
-                                "SELECT member_id, expiry_time FROM active_members WHERE expiry_time <= $1",
-                                current_time
-                            )
+                            rows = await conn.fetch_named(
+                                'expired_members', current_time)
                             for row in rows:
                                 expired_members.append(str(row['member_id']))
                     except Exception as e:
@@ -6567,7 +7078,9 @@ class TelegramTradingBot:
                                 "INSERT INTO userbot_dm_queue (user_id, message_text, label) VALUES ($1, $2, $3)",
                                 int(member_id), expiry_msg, "Trial Expired")
                 else:
-                    await self.app.send_message(int(member_id), expiry_msg)
+                    await self.send_scheduled(int(member_id), expiry_msg,
+                                              PRIORITY_ONBOARDING,
+                                              "expiry DM")
             except Exception as e:
                 logger.error(f"Could not queue expiry DM to {member_id}: {e}")
 
@@ -6628,6 +7141,10 @@ class TelegramTradingBot:
 
                 for member_id, data in list(
                         AUTO_ROLE_CONFIG['dm_schedule'].items()):
+                    if data['dm_3_sent'] and data['dm_7_sent'] and data[
+                            'dm_14_sent']:
+                        continue
+
                     role_expired = datetime.fromisoformat(data['role_expired'])
                     if role_expired.tzinfo is None:
                         role_expired = AMSTERDAM_TZ.localize(role_expired)
@@ -6665,17 +7182,37 @@ class TelegramTradingBot:
 
             await asyncio.sleep(3600)
 
+    def update_vip_roster(self, member_update: ChatMemberUpdated):
+        """Apply a VIP group membership change to the in-memory roster."""
+        if member_update.chat.id != VIP_GROUP_ID:
+            return
+        member = member_update.new_chat_member or member_update.old_chat_member
+        if not member or not member.user:
+            return
+        self.vip_roster[member.user.id] = bool(
+            member_update.new_chat_member
+            and member_update.new_chat_member.status in [
+                ChatMemberStatus.MEMBER, ChatMemberStatus.ADMINISTRATOR,
+                ChatMemberStatus.OWNER
+            ])
+
     async def check_vip_membership(self, user_id: int) -> bool:
+        if user_id in self.vip_roster:
+            return self.vip_roster[user_id]
+
+        # Not seen in a member update yet, ask Telegram directly
         try:
             member = await self.app.get_chat_member(VIP_GROUP_ID, user_id)
-            return member.status in [
+            is_member = member.status in [
                 ChatMemberStatus.MEMBER, ChatMemberStatus.ADMINISTRATOR,
                 ChatMemberStatus.OWNER
             ]
         except UserNotParticipant:
-            return False
+            is_member = False
         except Exception:
             return False
+        self.vip_roster[user_id] = is_member
+        return is_member
 
     async def handle_welcome_dm_fallback(self, user_id: int, first_name: str,
                                          msg_type: str, message_content: str):
@@ -6780,38 +7317,190 @@ class TelegramTradingBot:
         pass
 
     async def handle_welcome_dm_status_check(self):
-        """Background task to check for Welcome DM status updates from Userbot."""
-        while True:
+        """Background task applying Welcome DM status events from the Userbot.
+
+        Holds one pooled connection that LISTENs on service_events; each
+        notification (or a slow fallback timer) triggers a single
+        claim-and-delete of the pending events for the main bot.
+        """
+        while self.running:
+            if not self.db_pool:
+                await asyncio.sleep(30)
+                continue
+
+            wakeup = asyncio.Event()
+
+            def on_notify(connection, pid, channel, payload):
+                if payload == 'main_bot':
+                    wakeup.set()
+
             try:
-                if self.db_pool:
-                    async with self.db_pool.acquire() as conn:
-                        # Find any pending widget status updates
-                        status_updates = await conn.fetch(
-                            "SELECT setting_key, setting_value FROM bot_settings WHERE setting_key LIKE 'widget_status_%'"
-                        )
-                        for update in status_updates:
+                async with self.db_pool.acquire('listen') as listen_conn:
+                    await listen_conn.add_listener('service_events', on_notify)
+                    try:
+                        while self.running and not listen_conn.is_closed():
+                            await self.process_service_events()
                             try:
-                                user_id = int(update['setting_key'].replace(
-                                    'widget_status_', ''))
-                                status_text = update['setting_value']
-
-                                widget_id = getattr(self, 'onboarding_widgets',
-                                                    {}).get(user_id)
-                                if widget_id:
-                                    # Update to Step 2/5 (Welcome DM Status)
-                                    await self.update_onboarding_widget(
-                                        user_id, 2, 5, status_text, widget_id)
-
-                                # Clear the update after processing
-                                await conn.execute(
-                                    "DELETE FROM bot_settings WHERE setting_key = $1",
-                                    update['setting_key'])
-                            except Exception as e:
-                                logger.error(
-                                    f"Error processing widget update: {e}")
+                                await asyncio.wait_for(
+                                    wakeup.wait(),
+                                    timeout=SERVICE_EVENTS_FALLBACK_POLL)
+                            except asyncio.TimeoutError:
+                                pass
+                            wakeup.clear()
+                    finally:
+                        if not listen_conn.is_closed():
+                            await listen_conn.remove_listener(
+                                'service_events', on_notify)
             except Exception as e:
                 logger.error(f"Error in welcome dm status loop: {e}")
-            await asyncio.sleep(30)
+                await asyncio.sleep(10)
+
+    async def process_service_events(self):
+        """Apply pending main-bot events; an event is only deleted once handled.
+
+        Widgets live in the memory of the replica that created them, so the
+        widget message id is also read from bot_status (persisted by
+        widget_persist_loop). An event whose widget id is not known anywhere
+        yet is kept for SERVICE_EVENTS_WIDGET_GRACE seconds and then dropped.
+        """
+        now = datetime.now(pytz.UTC)
+        updates = []
+        async with self.db_pool.acquire() as conn:
+            async with conn.transaction():
+                events = await conn.fetch("""
+                    SELECT e.id, e.event_type, e.user_id, e.payload, e.created_at,
+                           s.status_value AS widget_id
+                    FROM service_events e
+                    LEFT JOIN bot_status s
+                        ON s.status_key = 'onboarding_msg_' || e.user_id
+                    WHERE e.target = 'main_bot'
+                    ORDER BY e.id
+                    LIMIT 200
+                    FOR UPDATE OF e SKIP LOCKED
+                """)
+
+                handled = []
+                for event in events:
+                    if event['event_type'] != 'welcome_dm_status':
+                        handled.append(event['id'])
+                        continue
+                    user_id = event['user_id']
+                    local_id = self.onboarding_widgets.get(user_id)
+                    stored_id = event['widget_id']
+                    if local_id:
+                        updates.append((user_id, local_id, True, event['payload']))
+                    elif stored_id and stored_id.isdigit():
+                        updates.append(
+                            (user_id, int(stored_id), False, event['payload']))
+                    elif event['created_at'] and (
+                            now - event['created_at']
+                    ).total_seconds() < SERVICE_EVENTS_WIDGET_GRACE:
+                        continue
+                    handled.append(event['id'])
+
+                if handled:
+                    await conn.execute(
+                        "DELETE FROM service_events WHERE id = ANY($1::bigint[])",
+                        handled)
+
+        for user_id, widget_id, is_local, status_text in updates:
+            try:
+                # Update to Step 2/5 (Welcome DM Status)
+                if is_local:
+                    await self.update_onboarding_widget(
+                        user_id, 2, 5, status_text, widget_id)
+                else:
+                    await self.edit_remote_onboarding_widget(
+                        user_id, widget_id, 2, 5, status_text)
+            except Exception as e:
+                logger.error(f"Error processing widget update: {e}")
+
+    async def edit_remote_onboarding_widget(self, user_id: int,
+                                            message_id: int, step: int,
+                                            total_steps: int,
+                                            status_text: str):
+        """Edit a widget owned by another replica without adopting it here"""
+        msg_text, keyboard = self.render_onboarding_widget(
+            user_id, step, total_steps, status_text)
+        await self.send_scheduler.submit(
+            DEBUG_GROUP_ID,
+            lambda: self.app.edit_message_text(DEBUG_GROUP_ID,
+                                               message_id,
+                                               msg_text,
+                                               reply_markup=keyboard),
+            PRIORITY_ONBOARDING, "onboarding widget")
+
+    async def start_leader_loops(self, epoch: int):
+        """Take over the signal engine after winning the leader election"""
+        self.leader_tasks = [asyncio.create_task(self.leader_takeover(epoch))]
+
+    async def leader_takeover(self, epoch: int):
+        # A standby's memory is stale: reload the projection before tracking
+        if self.db_pool:
+            try:
+                PRICE_TRACKING_CONFIG['active_trades'].clear()
+                await self.load_active_trades_from_db()
+            except Exception as e:
+                logger.error(f"Leader trade loading failed: {e}")
+
+        # Restore any trades that were incorrectly marked as deleted
+        restored_trades = await self.restore_trades_from_completed(
+            "message_deleted")
+        if restored_trades:
+            logger.info(
+                f"✅ Restored {len(restored_trades)} trades that were incorrectly marked as deleted"
+            )
+            try:
+                if DEBUG_GROUP_ID:
+                    await self.send_scheduled(
+                        DEBUG_GROUP_ID,
+                        f"✅ **Recovery Complete:** Restored {len(restored_trades)} trades:\n"
+                        + "\n".join([
+                            f"- Message ID: {mid}"
+                            for mid in restored_trades[:5]
+                        ]) + (f"\n... and {len(restored_trades) - 5} more"
+                              if len(restored_trades) > 5 else ""),
+                        PRIORITY_DEBUG, "recovery")
+            except Exception as e:
+                logger.error(f"Could not send recovery message: {e}")
+
+        # Reconcile hits that happened while no leader was tracking
+        if self.db_pool and not self.is_weekend_market_closed():
+            try:
+                await self.check_offline_tp_sl_hits()
+            except Exception as e:
+                logger.error(f"Error in offline TP/SL reconciliation: {e}")
+
+        await self.check_offline_engagement_discounts()
+
+        self.leader_tasks += [
+            asyncio.create_task(loop()) for loop in (
+                self.price_tracking_loop, self.ladder_refresh_loop,
+                self.partition_retention_loop, self.notification_outbox_loop,
+                self.peer_id_escalation_loop,
+                self.handle_welcome_dm_status_check)
+        ]
+        if epoch:
+            await self.log_to_debug(
+                f"👑 Signal engine leader: {self.leader.holder} (epoch {epoch})")
+
+    async def stop_leader_loops(self):
+        """Stop the singleton loops when leadership is lost"""
+        for task in self.leader_tasks:
+            task.cancel()
+        self.leader_tasks = []
+        self.price_shard_stats = {}
+
+    def runs_signal_engine(self) -> bool:
+        """True on the elected leader, or on a single instance without a database"""
+        if self.leader:
+            return self.leader.is_leader
+        return not self.db_pool
+
+    async def fence(self, conn):
+        """Abort a leader-only write if another replica has taken over"""
+        if self.leader:
+            await self.leader.fence(conn)
 
     async def run(self):
         # Wait for database pool to initialize if it's still pending
@@ -6827,42 +7516,28 @@ class TelegramTradingBot:
                 await self.load_active_trades_from_db()
             except Exception as e:
                 logger.error(f"Post-startup trade loading failed: {e}")
+            await self.load_ladder_profiles()
+            try:
+                await self.settings.attach(self.db_pool)
+            except Exception as e:
+                logger.error(f"Failed to load bot settings: {e}")
 
         await self.app.start()
         logger.info("Telegram bot started!")
+        self.send_scheduler.start()
 
         await self.register_bot_commands()
 
         if DEBUG_GROUP_ID:
             try:
                 await self.app.get_chat(DEBUG_GROUP_ID)
-                await self.app.send_message(
+                await self.send_scheduled(
                     DEBUG_GROUP_ID,
-                    "**Bot Started!** Signal engine is online. DMs delegated to Userbot."
-                )
+                    "**Bot Started!** Signal engine is online. DMs delegated to Userbot.",
+                    PRIORITY_DEBUG, "startup")
             except Exception as e:
                 logger.error(f"Could not send startup message: {e}")
 
-        # Restore any trades that were incorrectly marked as deleted
-        restored_trades = await self.restore_trades_from_completed(
-            "message_deleted")
-        if restored_trades:
-            logger.info(
-                f"✅ Restored {len(restored_trades)} trades that were incorrectly marked as deleted"
-            )
-            try:
-                if DEBUG_GROUP_ID:
-                    await self.app.send_message(
-                        DEBUG_GROUP_ID,
-                        f"✅ **Recovery Complete:** Restored {len(restored_trades)} trades:\n"
-                        + "\n".join([
-                            f"- Message ID: {mid}"
-                            for mid in restored_trades[:5]
-                        ]) + (f"\n... and {len(restored_trades) - 5} more"
-                              if len(restored_trades) > 5 else ""))
-            except Exception as e:
-                logger.error(f"Could not send recovery message: {e}")
-
         # Peer escalation for discovery ONLY (helps userbot find users)
         try:
             await self.ensure_active_trial_peers()
@@ -6871,10 +7546,20 @@ class TelegramTradingBot:
 
         self.startup_complete = True
 
-        # ONLY Signal Engine loops remain
-        asyncio.create_task(self.price_tracking_loop())
-        asyncio.create_task(self.peer_id_escalation_loop())
-        asyncio.create_task(self.handle_welcome_dm_status_check())
+        # Signal engine loops run on the elected leader only, so replicas
+        # can run side by side (hot standby)
+        if self.db_pool:
+            self.leader = LeaderElection(self.db_pool, 'main_bot',
+                                         self.start_leader_loops,
+                                         self.stop_leader_loops)
+            asyncio.create_task(self.leader.run())
+        else:
+            await self.start_leader_loops(0)
+
+        # Per-replica loops: widgets and join buffers belong to this process
+        asyncio.create_task(self.widget_persist_loop())
+        asyncio.create_task(self.join_flush_loop())
+        asyncio.create_task(self.join_request_flush_loop())
 
         try:
             while self.running:
@@ -6888,14 +7573,36 @@ class TelegramTradingBot:
             await self.app.stop()
 
 
-async def run_web_server():
+async def run_web_server(bot: Optional['TelegramTradingBot'] = None):
 
     async def health_check(request):
         return web.Response(text="OK", status=200)
 
+    def metrics_allowed(request) -> bool:
+        if request.remote in ("127.0.0.1", "::1"):
+            return True
+        return bool(METRICS_TOKEN) and hmac.compare_digest(
+            request.headers.get("Authorization", ""),
+            f"Bearer {METRICS_TOKEN}")
+
+    async def metrics(request):
+        if not metrics_allowed(request):
+            return web.Response(text="Unauthorized", status=401)
+        if not bot:
+            return web.json_response({})
+        return web.json_response({
+            "send_scheduler": bot.send_scheduler.metrics(),
+            "debug_log": bot.debug_shipper.metrics(),
+            "db": bot.db_pool.metrics() if bot.db_pool else {},
+            "userbot_db": await bot.read_userbot_db_metrics(),
+            "leader": bot.leader.metrics() if bot.leader else {},
+            "price_shards": bot.price_shard_metrics()
+        })
+
     app = web.Application()
     app.router.add_get('/health', health_check)
     app.router.add_get('/', health_check)
+    app.router.add_get('/metrics', metrics)
     runner = web.AppRunner(app)
     await runner.setup()
     site = web.TCPSite(runner, '0.0.0.0', 8080)
@@ -6904,8 +7611,8 @@ async def run_web_server():
 
 
 async def main():
-    await run_web_server()
     bot = TelegramTradingBot()
+    await run_web_server(bot)
     await bot.run()
 
 
@@ -0,0 +1,59 @@
+"""Same-candle ordering checks for the signal_replay kernel (run with pytest)"""
+
+import numpy as np
+
+import signal_replay
+from signal_replay import NO_HIT, OUTCOME_BREAKEVEN, OUTCOME_TP3
+
+
+def _candles(rows):
+    return signal_replay._build_candles(list(rows))
+
+
+def _buy_trade(**flags):
+    trades = {
+        'is_buy': np.array([True]),
+        'entry': np.array([1.1000]),
+        'tp1': np.array([1.1020]),
+        'tp2': np.array([1.1040]),
+        'tp3': np.array([1.1060]),
+        'sl': np.array([1.0980]),
+        'start_time': np.array([0], dtype=np.int64),
+    }
+    trades.update({name: np.array([value]) for name, value in flags.items()})
+    return trades
+
+
+def test_tp3_and_breakeven_in_same_candle_resolves_to_breakeven():
+    candles = _candles([
+        (0, 1.1045, 1.1010, 1.1040),  # TP1 + TP2
+        (60, 1.1065, 1.0995, 1.1000),  # TP3 and the retrace to entry together
+    ])
+    result = signal_replay.replay_trades(candles, _buy_trade())
+
+    assert result['outcome'][0] == OUTCOME_BREAKEVEN
+    assert result['breakeven'][0] == 1
+    assert result['tp3'][0] == NO_HIT
+    assert result['tp1'][0] == 0 and result['tp2'][0] == 0
+
+
+def test_tp3_before_breakeven_candle_still_counts():
+    candles = _candles([
+        (0, 1.1045, 1.1010, 1.1040),
+        (60, 1.1065, 1.1030, 1.1050),  # TP3 only
+        (120, 1.1050, 1.0995, 1.1000),  # retrace after the trade is done
+    ])
+    result = signal_replay.replay_trades(candles, _buy_trade())
+
+    assert result['outcome'][0] == OUTCOME_TP3
+    assert result['tp3'][0] == 1
+    assert result['breakeven'][0] == NO_HIT
+
+
+def test_same_candle_when_breakeven_already_armed():
+    candles = _candles([(0, 1.1065, 1.0995, 1.1000)])
+    trades = _buy_trade(tp1_done=True, tp2_done=True, breakeven_active=True)
+    result = signal_replay.replay_trades(candles, trades)
+
+    assert result['outcome'][0] == OUTCOME_BREAKEVEN
+    assert result['tp3'][0] == NO_HIT
@@ -0,0 +1,72 @@
+"""
+Trade Events - Append-only history of every tracked signal
+
+Each state change of a trade is one small row in trade_events (schema
+migration 7) instead of a rewrite of its active_trades row. A trigger folds
+the events into active_trades, which stays the projection the price engine
+and the override menus read. Completion (event, completed_trades archive
+and active_trades delete) commits as one transaction in the main bot.
+
+Event types:
+- signal_created: trade saved for tracking (price = entry)
+- tp1_hit / tp2_hit / tp3_hit: level reached (tp2_hit also arms breakeven);
+  manual overrides set detail, which is appended to manual_overrides
+- sl_hit / breakeven_hit / signal_deleted / closed: trade left tracking
+  (detail = completion_reason)
+- post_deleted: one post of a multi-channel signal was deleted; it is
+  unlinked and the trade keeps tracking for the other groups
+  (detail = chat id)
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict
+
+import pytz
+
+# completion_reason -> closing event type (anything else is 'closed')
+COMPLETION_EVENTS = {
+    "TP3 Hit": "tp3_hit",
+    "manual_tp3_hit": "tp3_hit",
+    "SL Hit": "sl_hit",
+    "manual_sl_hit": "sl_hit",
+    "Breakeven Hit": "breakeven_hit",
+    "manual_breakeven_hit": "breakeven_hit",
+    "message_deleted": "signal_deleted",
+}
+
+# Events that end a trade (its active_trades row is deleted in the same transaction)
+CLOSING_EVENTS = ["tp3_hit", "sl_hit", "breakeven_hit", "signal_deleted", "closed"]
+
+TRADE_EVENT_STATS_QUERY = """
+    SELECT event_type, COUNT(DISTINCT message_id) AS trades
+    FROM trade_events
+    WHERE created_at >= $1
+    GROUP BY event_type
+"""
+
+
+def completion_event(reason: str) -> str:
+    return COMPLETION_EVENTS.get(reason, "closed")
+
+
+async def trade_event_stats(conn, days: int = 30) -> Dict:
+    """Outcome counts over the last `days`, computed from the event stream."""
+    since = datetime.now(pytz.UTC) - timedelta(days=days)
+    counts = {
+        row['event_type']: row['trades']
+        for row in await conn.fetch(TRADE_EVENT_STATS_QUERY, since)
+    }
+    signals = counts.get("signal_created", 0)
+    closed = sum(
+        counts.get(event, 0)
+        for event in ("tp3_hit", "sl_hit", "breakeven_hit"))
+    wins = counts.get("tp3_hit", 0) + counts.get("breakeven_hit", 0)
+    return {
+        "signals": signals,
+        "tp1": counts.get("tp1_hit", 0),
+        "tp2": counts.get("tp2_hit", 0),
+        "tp3": counts.get("tp3_hit", 0),
+        "sl": counts.get("sl_hit", 0),
+        "breakeven": counts.get("breakeven_hit", 0),
+        "win_rate": round(wins / closed * 100, 1) if closed else None,
+    }
@@ -20,16 +20,20 @@ if sys.platform == 'win32':
 loop = asyncio.new_event_loop()
 asyncio.set_event_loop(loop)
 
-import asyncpg
+import json
 import ssl
 from datetime import datetime, timedelta
 import pytz
 import random
 from pyrogram.client import Client
-from pyrogram import filters
+from pyrogram import filters, utils
 from pyrogram.raw import functions, types
 from pyrogram.errors import FloodWait, PeerIdInvalid, UserPrivacyRestricted
 
+from bot_settings_cache import BotSettingsCache
+from db_access import BudgetedPool
+from schema_migrations import run_migrations
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -43,10 +47,62 @@ DATABASE_URL = os.getenv("DATABASE_URL", "")
 DATABASE_URL_ENV = os.getenv("DATABASE_URL_OVERRIDE") or DATABASE_URL
 
 DEBUG_GROUP_ID = int(os.getenv("DEBUG_GROUP_ID", "0"))
+FREE_GROUP_ID = int(os.getenv("FREE_GROUP_ID", "0"))
+VIP_GROUP_ID = int(os.getenv("VIP_GROUP_ID", "0"))
 AMSTERDAM_TZ = pytz.timezone('Europe/Amsterdam')
 
 BOT_OWNER_USER_ID = int(os.getenv("BOT_OWNER_USER_ID") or "6664440870")
 
+# Free-group reaction ingestion (feeds emoji_reactions for engagement discounts)
+REACTION_TRACKING_CONFIG = {
+    "flush_interval": 10,  # seconds between buffer flushes / dirty fetches
+    "flush_batch_size": 2000,  # rows per executemany
+    "sweep_interval": 300,  # seconds between sweeps of recent messages
+    "sweep_messages": 50,  # how many recent Free-group messages to sweep
+    "page_size": 100,  # GetMessageReactionsList page size (API max)
+}
+
+# Inserts a batch of reactions and bumps engagement_counters by the number of
+# messages each user reacted to for the first time. The NOT EXISTS sees the
+# table as it was before this statement, so extra emojis on an already
+# counted message do not count again.
+REACTION_FLUSH_QUERY = """
+    WITH batch AS (
+        SELECT * FROM unnest($1::bigint[], $2::bigint[], $3::text[], $4::timestamptz[])
+            AS b(user_id, message_id, emoji, reaction_time)
+    ), inserted AS (
+        INSERT INTO emoji_reactions (user_id, message_id, emoji, reaction_time)
+        SELECT user_id, message_id, emoji, reaction_time FROM batch
+        ON CONFLICT (user_id, message_id, emoji) DO NOTHING
+        RETURNING user_id, message_id, reaction_time
+    ), first_reactions AS (
+        SELECT DISTINCT i.user_id, i.message_id FROM inserted i
+        WHERE NOT EXISTS (
+            SELECT 1 FROM emoji_reactions e
+            WHERE e.user_id = i.user_id AND e.message_id = i.message_id)
+    )
+    INSERT INTO engagement_counters (user_id, reacted_messages, last_reaction_at)
+    SELECT i.user_id,
+           (SELECT COUNT(*) FROM first_reactions f WHERE f.user_id = i.user_id),
+           MAX(i.reaction_time)
+    FROM inserted i
+    GROUP BY i.user_id
+    ON CONFLICT (user_id) DO UPDATE SET
+        reacted_messages = engagement_counters.reacted_messages + EXCLUDED.reacted_messages,
+        last_reaction_at = GREATEST(engagement_counters.last_reaction_at, EXCLUDED.last_reaction_at)
+"""
+
+# Free-group members who joined 30+ days ago, reacted to 5+ messages and have
+# not had the discount yet
+ENGAGEMENT_ELIGIBILITY_QUERY = """
+    SELECT j.user_id
+    FROM engagement_counters c
+    JOIN free_group_joins j ON j.user_id = c.user_id
+    WHERE c.reacted_messages >= $2
+      AND j.discount_sent = FALSE
+      AND j.joined_at <= $1
+"""
+
 
 class UserbotService:
 
@@ -54,6 +110,12 @@ class UserbotService:
         self.client = None
         self.db_pool = None
         self.running = True
+        self.settings = BotSettingsCache()
+        # Reaction ingestion state
+        self.reaction_buffer = []
+        self.dirty_reaction_messages = set()
+        self.reaction_totals = {}
+        self.reaction_seen = {}
 
     async def init_db(self):
         try:
@@ -81,12 +143,10 @@ class UserbotService:
             # Try up to 10 times with increasing wait to handle Render network jitter
             for attempt in range(10):
                 try:
-                    # Removed connect_timeout as it is not a valid argument for create_pool in asyncpg
-                    pool = await asyncpg.create_pool(
+                    # Sizing, budgets and timeouts come from db_access.DB_POOL_CONFIG
+                    pool = BudgetedPool('userbot')
+                    await pool.connect(
                         url,
-                        min_size=1,
-                        max_size=5,
-                        command_timeout=60,
                         ssl=ctx,
                         server_settings={
                             'tcp_keepalives_idle': '60',
@@ -96,165 +156,6 @@ class UserbotService:
                         })
                     self.db_pool = pool
                     logger.info("Database connected successfully")
-
-                    # FORCE MIGRATION IMMEDIATELY AFTER SUCCESSFUL CONNECTION
-                    async with self.db_pool.acquire() as conn:
-                        logger.info(
-                            "Running immediate database migration check...")
-                        try:
-                            # 1. Rename 'message' to 'message_text'
-                            msg_exists = await conn.fetchval("""
-                                SELECT count(*) FROM information_schema.columns 
-                                WHERE table_name = 'userbot_dm_queue' AND column_name = 'message'
-                            """)
-                            if msg_exists > 0:
-                                await conn.execute(
-                                    "ALTER TABLE userbot_dm_queue RENAME COLUMN message TO message_text"
-                                )
-                                logger.info(
-                                    "✅ Renamed 'message' to 'message_text'")
-
-                            # 2. Rename 'message_content' to 'message_text'
-                            try:
-                                content_exists = await conn.fetchval("""
-                                    SELECT count(*) FROM information_schema.columns 
-                                    WHERE table_name = 'userbot_dm_queue' AND column_name = 'message_content'
-                                """)
-                                text_exists = await conn.fetchval("""
-                                    SELECT count(*) FROM information_schema.columns 
-                                    WHERE table_name = 'userbot_dm_queue' AND column_name = 'message_text'
-                                """)
-                                if content_exists > 0 and text_exists == 0:
-                                    await conn.execute(
-                                        "ALTER TABLE userbot_dm_queue RENAME COLUMN message_content TO message_text"
-                                    )
-                                    logger.info(
-                                        "✅ Renamed 'message_content' to 'message_text'"
-                                    )
-                                elif content_exists > 0 and text_exists > 0:
-                                    # Handle case where both exist (failed partial migration)
-                                    await conn.execute(
-                                        "ALTER TABLE userbot_dm_queue DROP COLUMN message_content"
-                                    )
-                                    logger.info(
-                                        "✅ Dropped redundant 'message_content'"
-                                    )
-                            except Exception as e:
-                                logger.error(
-                                    f"Error migrating message_content: {e}")
-
-                            # 3. Rename 'message_type' to 'label'
-                            try:
-                                type_exists = await conn.fetchval("""
-                                    SELECT count(*) FROM information_schema.columns 
-                                    WHERE table_name = 'userbot_dm_queue' AND column_name = 'message_type'
-                                """)
-                                label_exists = await conn.fetchval("""
-                                    SELECT count(*) FROM information_schema.columns 
-                                    WHERE table_name = 'userbot_dm_queue' AND column_name = 'label'
-                                """)
-                                if type_exists > 0 and label_exists == 0:
-                                    await conn.execute(
-                                        "ALTER TABLE userbot_dm_queue RENAME COLUMN message_type TO label"
-                                    )
-                                    logger.info(
-                                        "✅ Renamed 'message_type' to 'label'")
-                                elif type_exists > 0 and label_exists > 0:
-                                    # Handle case where both exist
-                                    await conn.execute(
-                                        "ALTER TABLE userbot_dm_queue DROP COLUMN message_type"
-                                    )
-                                    logger.info(
-                                        "✅ Dropped redundant 'message_type'")
-                            except Exception as e:
-                                logger.error(
-                                    f"Error migrating message_type: {e}")
-
-                            # 5. Fix NOT NULL constraints on old columns that might be lingering
-                            try:
-                                await conn.execute(
-                                    "ALTER TABLE userbot_dm_queue ALTER COLUMN message_text SET NOT NULL"
-                                )
-                                await conn.execute(
-                                    "ALTER TABLE userbot_dm_queue ALTER COLUMN label SET NOT NULL"
-                                )
-                            except:
-                                pass
-
-                            # 6. Ensure sent_at column exists
-                            try:
-                                has_sent_at = await conn.fetchval("""
-                                    SELECT count(*) FROM information_schema.columns 
-                                    WHERE table_name = 'userbot_dm_queue' AND column_name = 'sent_at'
-                                """)
-                                if has_sent_at == 0:
-                                    await conn.execute(
-                                        "ALTER TABLE userbot_dm_queue ADD COLUMN sent_at TIMESTAMP WITH TIME ZONE"
-                                    )
-                                    logger.info(
-                                        "✅ Added missing 'sent_at' column")
-                            except Exception as e:
-                                logger.error(
-                                    f"Error adding sent_at column: {e}")
-
-                            # 7. Ensure last_retry_at column exists
-                            try:
-                                has_last_retry = await conn.fetchval("""
-                                    SELECT count(*) FROM information_schema.columns 
-                                    WHERE table_name = 'userbot_dm_queue' AND column_name = 'last_retry_at'
-                                """)
-                                if has_last_retry == 0:
-                                    await conn.execute(
-                                        "ALTER TABLE userbot_dm_queue ADD COLUMN last_retry_at TIMESTAMP WITH TIME ZONE"
-                                    )
-                                    logger.info(
-                                        "✅ Added missing 'last_retry_at' column"
-                                    )
-                            except Exception as e:
-                                logger.error(
-                                    f"Error adding last_retry_at column: {e}")
-
-                            # 8. Ensure abandoned column exists
-                            try:
-                                has_abandoned = await conn.fetchval("""
-                                    SELECT count(*) FROM information_schema.columns 
-                                    WHERE table_name = 'userbot_dm_queue' AND column_name = 'abandoned'
-                                """)
-                                if has_abandoned == 0:
-                                    await conn.execute(
-                                        "ALTER TABLE userbot_dm_queue ADD COLUMN abandoned BOOLEAN DEFAULT FALSE"
-                                    )
-                                    logger.info(
-                                        "✅ Added missing 'abandoned' column")
-                            except Exception as e:
-                                logger.error(
-                                    f"Error adding abandoned column: {e}")
-
-                            # 4. FIX: Handle potential column naming variations and ensure 'label' or 'message_text' is large enough
-                            # We use TRY blocks for each to be safe
-                            try:
-                                await conn.execute(
-                                    "ALTER TABLE userbot_dm_queue ALTER COLUMN label TYPE TEXT"
-                                )
-                                logger.info(
-                                    "✅ Ensured 'label' column is TEXT type")
-                            except:
-                                pass
-
-                            try:
-                                await conn.execute(
-                                    "ALTER TABLE userbot_dm_queue ALTER COLUMN message_text TYPE TEXT"
-                                )
-                                logger.info(
-                                    "✅ Ensured 'message_text' column is TEXT type"
-                                )
-                            except:
-                                pass
-                        except Exception as migration_err:
-                            logger.error(
-                                f"❌ Migration during connection failed: {migration_err}"
-                            )
-
                     break
                 except Exception as e:
                     if attempt == 9:
@@ -269,92 +170,16 @@ class UserbotService:
             raise
 
         if self.db_pool:
+            # Apply pending schema migrations (no-op on a warm start)
             async with self.db_pool.acquire() as conn:
-                # Forced migration: Rename 'message' or 'message_type' to 'message_text' if they exist
-                try:
-                    # Check for 'message'
-                    message_exists = await conn.fetchval("""
-                        SELECT count(*) FROM information_schema.columns 
-                        WHERE table_name = 'userbot_dm_queue' AND column_name = 'message'
-                    """)
-                    if message_exists > 0:
-                        logger.info(
-                            "Migrating userbot_dm_queue: renaming 'message' to 'message_text'"
-                        )
-                        await conn.execute(
-                            "ALTER TABLE userbot_dm_queue RENAME COLUMN message TO message_text"
-                        )
+                await run_migrations(conn)
 
-                    # Check for 'message_type' (which seems to be what it actually is on Render right now)
-                    type_exists = await conn.fetchval("""
-                        SELECT count(*) FROM information_schema.columns 
-                        WHERE table_name = 'userbot_dm_queue' AND column_name = 'message_type'
-                    """)
-                    if type_exists > 0:
-                        logger.info(
-                            "Migrating userbot_dm_queue: renaming 'message_type' to 'message_text'"
-                        )
-                        await conn.execute(
-                            "ALTER TABLE userbot_dm_queue RENAME COLUMN message_type TO message_text"
-                        )
-
-                    # Check for 'label' column
-                    label_exists = await conn.fetchval("""
-                        SELECT count(*) FROM information_schema.columns 
-                        WHERE table_name = 'userbot_dm_queue' AND column_name = 'label'
-                    """)
-                    if label_exists == 0:
-                        logger.info(
-                            "Migrating userbot_dm_queue: adding missing 'label' column"
-                        )
-                        await conn.execute(
-                            "ALTER TABLE userbot_dm_queue ADD COLUMN label TEXT DEFAULT 'manual'"
-                        )
-                except Exception as e:
-                    logger.error(f"Migration error (updating columns): {e}")
-
-                await conn.execute("""
-                    CREATE TABLE IF NOT EXISTS active_members (
-                        member_id BIGINT PRIMARY KEY,
-                        role_added_time TIMESTAMP WITH TIME ZONE NOT NULL,
-                        role_id BIGINT NOT NULL,
-                        guild_id BIGINT NOT NULL,
-                        weekend_delayed BOOLEAN DEFAULT FALSE,
-                        expiry_time TIMESTAMP WITH TIME ZONE,
-                        custom_duration BOOLEAN DEFAULT FALSE,
-                        monday_notification_sent BOOLEAN DEFAULT FALSE
-                    )
-                """)
-                await conn.execute("""
-                    CREATE TABLE IF NOT EXISTS dm_schedule (
-                        member_id BIGINT PRIMARY KEY,
-                        role_expired TIMESTAMP WITH TIME ZONE NOT NULL,
-                        guild_id BIGINT NOT NULL,
-                        dm_3_sent BOOLEAN DEFAULT FALSE,
-                        dm_7_sent BOOLEAN DEFAULT FALSE,
-                        dm_14_sent BOOLEAN DEFAULT FALSE
-                    )
-                """)
-                await conn.execute("""
-                    CREATE TABLE IF NOT EXISTS bot_settings (
-                        setting_key VARCHAR(100) PRIMARY KEY,
-                        setting_value TEXT NOT NULL
-                    )
-                """)
-                await conn.execute("""
-                    CREATE TABLE IF NOT EXISTS userbot_dm_queue (
-                        id SERIAL PRIMARY KEY,
-                        user_id BIGINT NOT NULL,
-                        message_text TEXT NOT NULL,
-                        label TEXT NOT NULL,
-                        status TEXT DEFAULT 'pending',
-                        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                        sent_at TIMESTAMP WITH TIME ZONE,
-                        retry_count INTEGER DEFAULT 0,
-                        last_retry_at TIMESTAMP WITH TIME ZONE,
-                        abandoned BOOLEAN DEFAULT FALSE
-                    )
-                """)
+    async def emit_service_event(self, conn, event_type: str, user_id: int,
+                                 payload: str):
+        """Queue a status event for the main bot (delivered via LISTEN/NOTIFY)."""
+        await conn.execute(
+            "INSERT INTO service_events (target, event_type, user_id, payload) VALUES ('main_bot', $1, $2, $3)",
+            event_type, user_id, payload)
 
     async def log_to_debug(self, message: str, tag_owner: bool = False):
         try:
@@ -398,6 +223,8 @@ class UserbotService:
             # Initialize DB pool if URL is available (needed for DM queue)
             try:
                 await self.init_db()
+                if self.db_pool:
+                    await self.settings.attach(self.db_pool)
             except Exception as e:
                 logger.warning(
                     f"Database initialization failed: {e}. Some features may be limited."
@@ -444,6 +271,17 @@ class UserbotService:
                     except Exception as e:
                         logger.error(f"Failed to send auto-reply: {e}")
 
+                # Reaction updates only mark the message dirty; the flush loop
+                # pulls the per-user list in one paginated pass per message.
+                @self.client.on_raw_update()
+                async def on_raw_update(client, update, users, chats):
+                    if not isinstance(update, types.UpdateMessageReactions):
+                        return
+                    peer = update.peer
+                    if isinstance(peer, types.PeerChannel) and utils.get_channel_id(
+                            peer.channel_id) == FREE_GROUP_ID:
+                        self.dirty_reaction_messages.add(update.msg_id)
+
                 await self.client.start()
                 logger.info("✅ Userbot Service: Connected successfully!")
 
@@ -496,7 +334,10 @@ class UserbotService:
                 logger.error(f"Failed to send startup debug logs: {log_err}")
 
             # Start task loops
-            await asyncio.gather(self.dm_loop(), self.peer_discovery_loop())
+            await asyncio.gather(self.dm_loop(), self.peer_discovery_loop(),
+                                 self.reaction_sweep_loop(),
+                                 self.reaction_flush_loop(),
+                                 self.db_metrics_loop())
 
         except Exception as e:
             # If the loop breaks or start fails, try to notify
@@ -527,6 +368,127 @@ class UserbotService:
                 logger.error(f"Error in peer discovery: {e}")
                 await asyncio.sleep(60)
 
+    async def fetch_message_reactions(self, peer, message_id: int) -> int:
+        """Page through the reaction list of one Free-group message into the buffer."""
+        seen = self.reaction_seen.setdefault(message_id, set())
+        offset = None
+        added = 0
+        while True:
+            try:
+                result = await self.client.invoke(
+                    functions.messages.GetMessageReactionsList(
+                        peer=peer,
+                        id=message_id,
+                        limit=REACTION_TRACKING_CONFIG["page_size"],
+                        offset=offset))
+            except FloodWait as e:
+                wait_time = int(e.value) if getattr(e, 'value', None) else 30
+                logger.warning(f"FloodWait on reaction list: waiting {wait_time}s")
+                await asyncio.sleep(wait_time)
+                continue
+
+            for reaction in result.reactions:
+                if not isinstance(reaction.peer_id, types.PeerUser):
+                    continue
+                if isinstance(reaction.reaction, types.ReactionEmoji):
+                    emoji = reaction.reaction.emoticon
+                elif isinstance(reaction.reaction, types.ReactionCustomEmoji):
+                    emoji = f"custom:{reaction.reaction.document_id}"
+                else:
+                    continue
+                key = (reaction.peer_id.user_id, emoji)
+                if key in seen:
+                    continue
+                seen.add(key)
+                reacted_at = datetime.fromtimestamp(
+                    reaction.date, pytz.UTC) if getattr(
+                        reaction, 'date', None) else datetime.now(pytz.UTC)
+                self.reaction_buffer.append(
+                    (key[0], message_id, emoji, reacted_at))
+                added += 1
+
+            offset = result.next_offset
+            if not offset:
+                return added
+            await asyncio.sleep(1)
+
+    async def flush_reaction_buffer(self):
+        """Write buffered reactions to emoji_reactions in batches."""
+        batch_size = REACTION_TRACKING_CONFIG["flush_batch_size"]
+        while self.reaction_buffer and self.db_pool:
+            batch = self.reaction_buffer[:batch_size]
+            user_ids, message_ids, emojis, times = zip(*batch)
+            async with self.db_pool.acquire('reactions') as conn:
+                await conn.execute(REACTION_FLUSH_QUERY, list(user_ids),
+                                   list(message_ids), list(emojis),
+                                   list(times))
+            del self.reaction_buffer[:len(batch)]
+
+    async def reaction_flush_loop(self):
+        """Fetch reactions for dirty messages and flush the buffer."""
+        while self.running:
+            try:
+                if self.client and self.client.is_connected and FREE_GROUP_ID != 0:
+                    if self.dirty_reaction_messages:
+                        peer = await self.client.resolve_peer(FREE_GROUP_ID)
+                        dirty = sorted(self.dirty_reaction_messages)
+                        self.dirty_reaction_messages.clear()
+                        for message_id in dirty:
+                            try:
+                                await self.fetch_message_reactions(
+                                    peer, message_id)
+                            except Exception as e:
+                                logger.error(
+                                    f"Error fetching reactions for message {message_id}: {e}"
+                                )
+                await self.flush_reaction_buffer()
+            except Exception as e:
+                logger.error(f"Error in reaction flush loop: {e}")
+            await asyncio.sleep(REACTION_TRACKING_CONFIG["flush_interval"])
+
+    async def reaction_sweep_loop(self):
+        """Catch reactions missed by raw updates by sweeping recent Free-group messages."""
+        while self.running:
+            try:
+                if self.client and self.client.is_connected and FREE_GROUP_ID != 0:
+                    recent_ids = set()
+                    async for message in self.client.get_chat_history(
+                            FREE_GROUP_ID,
+                            limit=REACTION_TRACKING_CONFIG["sweep_messages"]):
+                        recent_ids.add(message.id)
+                        if not message.reactions:
+                            continue
+                        total = sum(r.count or 0
+                                    for r in message.reactions.reactions)
+                        if total != self.reaction_totals.get(message.id):
+                            self.reaction_totals[message.id] = total
+                            self.dirty_reaction_messages.add(message.id)
+
+                    # Only remember messages that are still inside the sweep window
+                    for message_id in list(self.reaction_seen):
+                        if message_id not in recent_ids:
+                            self.reaction_seen.pop(message_id, None)
+                            self.reaction_totals.pop(message_id, None)
+            except Exception as e:
+                logger.error(f"Error in reaction sweep: {e}")
+            await asyncio.sleep(REACTION_TRACKING_CONFIG["sweep_interval"])
+
+    async def db_metrics_loop(self):
+        """Publish pool metrics to bot_status for the main bot's /metrics."""
+        while self.running:
+            try:
+                if self.db_pool:
+                    async with self.db_pool.acquire() as conn:
+                        await conn.execute(
+                            """
+                            INSERT INTO bot_status (status_key, status_value)
+                            VALUES ('userbot_db_metrics', $1)
+                            ON CONFLICT (status_key) DO UPDATE SET status_value = $1
+                        """, json.dumps(self.db_pool.metrics()))
+            except Exception as e:
+                logger.error(f"Error publishing DB metrics: {e}")
+            await asyncio.sleep(60)
+
     async def send_dm(self, user_id: int, message: str, label: str):
         if not self.client or not self.client.is_connected:
             logger.error(
@@ -594,22 +556,11 @@ class UserbotService:
                 try:
                     async with self.db_pool.acquire() as conn:
                         if 8 <= current_time.hour < 12:
-                            last_global_offer = await conn.fetchval(
-                                "SELECT setting_value FROM bot_settings WHERE setting_key = 'last_9am_offer_run'"
-                            )
+                            last_global_offer = self.settings.get_str(
+                                'last_9am_offer_run')
                             today_str = current_time.strftime('%Y-%m-%d')
 
                             if last_global_offer != today_str:
-                                await conn.execute(
-                                    "ALTER TABLE peer_id_checks ADD COLUMN IF NOT EXISTS last_daily_offer_at TIMESTAMP WITH TIME ZONE"
-                                )
-                                await conn.execute(
-                                    "ALTER TABLE peer_id_checks ADD COLUMN IF NOT EXISTS ever_in_vip BOOLEAN DEFAULT FALSE"
-                                )
-                                await conn.execute(
-                                    "ALTER TABLE peer_id_checks ADD COLUMN IF NOT EXISTS daily_offer_count INTEGER DEFAULT 0"
-                                )
-
                                 pending_trial_users = await conn.fetch(
                                     """
                                     SELECT p.user_id 
@@ -668,9 +619,8 @@ class UserbotService:
                                             f"📅 Scheduled Daily Trial Offer for {user_id} at {scheduled_time.strftime('%H:%M')}"
                                         )
 
-                                await conn.execute(
-                                    "INSERT INTO bot_settings (setting_key, setting_value) VALUES ('last_9am_offer_run', $1) ON CONFLICT (setting_key) DO UPDATE SET setting_value = EXCLUDED.setting_value",
-                                    today_str)
+                                await self.settings.set(
+                                    'last_9am_offer_run', today_str)
                 except Exception as e:
                     logger.error(f"Error in Daily Offer block: {e}")
 
@@ -769,26 +719,20 @@ class UserbotService:
 
                 # 4. Handle Engagement Tracking
                 try:
-                    joins = []
+                    eligible = []
                     async with self.db_pool.acquire() as conn:
-                        joins = await conn.fetch(
-                            'SELECT user_id, joined_at FROM free_group_joins WHERE discount_sent = FALSE'
-                        )
-
-                    for j in joins:
-                        if current_time >= j['joined_at'] + timedelta(days=30):
+                        eligible = await conn.fetch(
+                            ENGAGEMENT_ELIGIBILITY_QUERY,
+                            current_time - timedelta(days=30), 5)
+
+                    for j in eligible:
+                        msg = "Hey! 👋 We noticed that you've been engaging with our signals in the Free Group. We want to say that we truly appreciate it!\n\nAs a form of appreciation for your loyalty and engagement, we want to give you something special: **an exclusive 50% discount for access to our VIP Group.**\n\n**Your exclusive discount code is:** `Thank_You!50!`\n\n**You can upgrade to VIP and apply your discount code here:** https://whop.com/gold-pioneer/gold-pioneer/"
+                        if await self.send_dm(j['user_id'], msg,
+                                              "Engagement Discount"):
                             async with self.db_pool.acquire() as conn:
-                                reaction_count = await conn.fetchval(
-                                    'SELECT COUNT(DISTINCT message_id) FROM emoji_reactions WHERE user_id = $1 AND reaction_time > $2',
-                                    j['user_id'], j['joined_at'])
-                            if reaction_count >= 5:
-                                msg = "Hey! 👋 We noticed that you've been engaging with our signals in the Free Group. We want to say that we truly appreciate it!\n\nAs a form of appreciation for your loyalty and engagement, we want to give you something special: **an exclusive 50% discount for access to our VIP Group.**\n\n**Your exclusive discount code is:** `Thank_You!50!`\n\n**You can upgrade to VIP and apply your discount code here:** https://whop.com/gold-pioneer/gold-pioneer/"
-                                if await self.send_dm(j['user_id'], msg,
-                                                      "Engagement Discount"):
-                                    async with self.db_pool.acquire() as conn:
-                                        await conn.execute(
-                                            'UPDATE free_group_joins SET discount_sent = TRUE WHERE user_id = $1',
-                                            j['user_id'])
+                                await conn.execute(
+                                    'UPDATE free_group_joins SET discount_sent = TRUE WHERE user_id = $1',
+                                    j['user_id'])
                 except Exception as e:
                     logger.error(f"Error in Engagement Tracking block: {e}")
 
@@ -848,139 +792,121 @@ class UserbotService:
                     logger.error(f"Error in Monday Activation block: {e}")
 
                 # 6. Process Queued DMs (Tiered Retry Logic)
+                # One 'dm' budget connection serves the whole batch, with the
+                # hot queries prepared on it (db_access.PREPARED_QUERIES)
                 try:
-                    queued_dms = []
-                    async with self.db_pool.acquire() as conn:
+                    async with self.db_pool.acquire('dm') as conn:
                         # Fetch items that are pending and not abandoned
-                        queued_dms = await conn.fetch("""
-                            SELECT id, user_id, message_text, label, created_at, retry_count, last_retry_at 
-                            FROM userbot_dm_queue 
-                            WHERE status = 'pending' AND abandoned = FALSE 
-                            ORDER BY created_at ASC LIMIT 10
-                        """)
-
-                    for row in queued_dms:
-                        row_id = row['id']
-                        u_id = row['user_id']
-                        label = row['label']
-                        retries = row['retry_count']
-                        last_retry = row['last_retry_at']
-
-                        # 1. 10-minute initial delay for Welcome DMs
-                        if label == 'Welcome DM':
-                            join_time = row['created_at']
-                            if join_time.tzinfo is None:
-                                join_time = AMSTERDAM_TZ.localize(join_time)
-                            if current_time < join_time + timedelta(
-                                    minutes=10):
-                                continue
-
-                        # 2. Tiered Retry Logic
-                        # Phase 1: First 3 tries (Immediate/Sequential)
-                        # Phase 2: After 3 tries, wait 30 minutes, then 3 more tries
-                        # Phase 3: After 6 tries, wait 3.5 hours, then 3 final tries
-                        # Total max tries: 9
-
-                        can_retry = False
-                        if retries == 0:
-                            can_retry = True
-                        elif retries < 3:
-                            # Try every minute (default loop interval)
-                            can_retry = True
-                        elif 3 <= retries < 6:
-                            # 30-minute pause after 3rd try
-                            if last_retry and current_time >= last_retry + timedelta(
-                                    minutes=30):
+                        queued_dms = await conn.fetch_named('dm_pending_batch')
+
+                        for row in queued_dms:
+                            row_id = row['id']
+                            u_id = row['user_id']
+                            label = row['label']
+                            retries = row['retry_count']
+                            last_retry = row['last_retry_at']
+
+                            # 1. 10-minute initial delay for Welcome DMs
+                            if label == 'Welcome DM':
+                                join_time = row['created_at']
+                                if join_time.tzinfo is None:
+                                    join_time = AMSTERDAM_TZ.localize(join_time)
+                                if current_time < join_time + timedelta(
+                                        minutes=10):
+                                    continue
+
+                            # 2. Tiered Retry Logic
+                            # Phase 1: First 3 tries (Immediate/Sequential)
+                            # Phase 2: After 3 tries, wait 30 minutes, then 3 more tries
+                            # Phase 3: After 6 tries, wait 3.5 hours, then 3 final tries
+                            # Total max tries: 9
+
+                            can_retry = False
+                            if retries == 0:
                                 can_retry = True
-                        elif 6 <= retries < 9:
-                            # 3.5-hour pause after 6th try
-                            if last_retry and current_time >= last_retry + timedelta(
-                                    hours=3.5):
+                            elif retries < 3:
+                                # Try every minute (default loop interval)
                                 can_retry = True
-                        else:
-                            # Abandon after 9 tries
-                            async with self.db_pool.acquire() as conn:
-                                await conn.execute(
-                                    "UPDATE userbot_dm_queue SET abandoned = TRUE, status = 'abandoned' WHERE id = $1",
-                                    row_id)
-                            continue
+                            elif 3 <= retries < 6:
+                                # 30-minute pause after 3rd try
+                                if last_retry and current_time >= last_retry + timedelta(
+                                        minutes=30):
+                                    can_retry = True
+                            elif 6 <= retries < 9:
+                                # 3.5-hour pause after 6th try
+                                if last_retry and current_time >= last_retry + timedelta(
+                                        hours=3.5):
+                                    can_retry = True
+                            else:
+                                # Abandon after 9 tries
+                                await conn.execute_named('dm_abandon', row_id)
+                                continue
 
-                        if not can_retry:
-                            continue
+                            if not can_retry:
+                                continue
 
-                        # Execute the DM attempt
-                        msg_to_send = row['message_text']
+                            # Execute the DM attempt
+                            msg_to_send = row['message_text']
 
-                        # Dynamic end time calculation for 'Trial Started'
-                        if label == 'Trial Started':
-                            try:
-                                async with self.db_pool.acquire() as conn:
-                                    member_row = await conn.fetchrow(
-                                        "SELECT expiry_time FROM active_members WHERE member_id = $1",
-                                        u_id)
+                            # Dynamic end time calculation for 'Trial Started'
+                            if label == 'Trial Started':
+                                try:
+                                    member_row = await conn.fetchrow_named(
+                                        'member_expiry', u_id)
                                     if member_row and member_row['expiry_time']:
                                         expiry = member_row['expiry_time']
                                         if expiry.tzinfo is None:
                                             expiry = AMSTERDAM_TZ.localize(expiry)
-                                        
+
                                         # Format: "friday 16 january at 09:40"
                                         end_date_str = expiry.strftime("%A %d %B at %H:%M").lower()
-                                        
+
                                         # Update the message with actual end date
                                         import re
                                         msg_to_send = re.sub(r'end in \*\*\d+ hours\*\* from now', f'end on **{end_date_str}**', msg_to_send)
-                                        
-                                        logger.info(f"🕒 Updated end date for {u_id}: {end_date_str}")
-                            except Exception as e:
-                                logger.error(f"Error updating trial end date: {e}")
 
-                        # Dynamic hour calculation for '24h_warning' or '3h_warning'
-                        elif label in ['24h_warning', '3h_warning']:
-                            try:
-                                async with self.db_pool.acquire() as conn:
-                                    member_row = await conn.fetchrow(
-                                        "SELECT expiry_time FROM active_members WHERE member_id = $1",
-                                        u_id)
+                                        logger.info(f"🕒 Updated end date for {u_id}: {end_date_str}")
+                                except Exception as e:
+                                    logger.error(f"Error updating trial end date: {e}")
+
+                            # Dynamic hour calculation for '24h_warning' or '3h_warning'
+                            elif label in ['24h_warning', '3h_warning']:
+                                try:
+                                    member_row = await conn.fetchrow_named(
+                                        'member_expiry', u_id)
                                     if member_row and member_row['expiry_time']:
                                         expiry = member_row['expiry_time']
                                         if expiry.tzinfo is None:
                                             expiry = AMSTERDAM_TZ.localize(expiry)
-                                        
+
                                         # Calculate total calendar hours until expiration (includes weekends)
                                         calendar_time_left = expiry - current_time
                                         total_hours_until_end = max(0, int(calendar_time_left.total_seconds() / 3600))
-                                        
+
                                         # Update the message with actual calendar hours remaining
                                         import re
                                         if label == '24h_warning':
                                             msg_to_send = re.sub(r'expire in \d+ hours', f'expire in {total_hours_until_end} hours', msg_to_send)
                                         elif label == '3h_warning':
                                             msg_to_send = re.sub(r'expire in just \d+ hours', f'expire in just {total_hours_until_end} hours', msg_to_send)
-                                        
+
                                         logger.info(f"🕒 Recalculated total hours (incl. weekend) for {u_id} ({label}): {total_hours_until_end}h remaining")
-                            except Exception as e:
-                                logger.error(f"Error recalculating trial hours for {label}: {e}")
+                                except Exception as e:
+                                    logger.error(f"Error recalculating trial hours for {label}: {e}")
 
-                        success = await self.send_dm(u_id, msg_to_send,
-                                                     label)
+                            success = await self.send_dm(u_id, msg_to_send,
+                                                         label)
 
-                        async with self.db_pool.acquire() as conn:
                             if success:
-                                await conn.execute(
-                                    """
-                                    UPDATE userbot_dm_queue 
-                                    SET status = 'sent', sent_at = $1::timestamptz 
-                                    WHERE id = $2::integer
-                                """, current_time, row_id)
+                                await conn.execute_named(
+                                    'dm_mark_sent', current_time, row_id)
 
                                 # Update onboarding widget for Welcome DM success
                                 if label == 'Welcome DM':
                                     try:
-                                        # Main Bot manages this; we just update the status text in DB or log it
-                                        # Since we're in dual-service, we use the debug log which Main Bot can see or just update widget
-                                        await conn.execute(
-                                            "INSERT INTO bot_settings (setting_key, setting_value) VALUES ($1, $2) ON CONFLICT (setting_key) DO UPDATE SET setting_value = EXCLUDED.setting_value",
-                                            f"widget_status_{u_id}",
+                                        # Main Bot owns the widget; hand it the new status
+                                        await self.emit_service_event(
+                                            conn, 'welcome_dm_status', u_id,
                                             "✅ Welcome DM Sent Successfully!")
                                     except Exception:
                                         pass
@@ -988,20 +914,14 @@ class UserbotService:
                                 # Quietly log success to console, skip debug group spam
                                 logger.info(f"✅ Sent {label} to {u_id}")
                             else:
-                                await conn.execute(
-                                    """
-                                    UPDATE userbot_dm_queue 
-                                    SET retry_count = retry_count + 1, 
-                                        last_retry_at = $1::timestamptz 
-                                    WHERE id = $2::integer
-                                """, current_time, row_id)
+                                await conn.execute_named(
+                                    'dm_mark_retry', current_time, row_id)
 
                                 # Update onboarding widget for Welcome DM failure
                                 if label == 'Welcome DM':
                                     try:
-                                        await conn.execute(
-                                            "INSERT INTO bot_settings (setting_key, setting_value) VALUES ($1, $2) ON CONFLICT (setting_key) DO UPDATE SET setting_value = EXCLUDED.setting_value",
-                                            f"widget_status_{u_id}",
+                                        await self.emit_service_event(
+                                            conn, 'welcome_dm_status', u_id,
                                             f"❌ Welcome DM Failed (Attempt {retries + 1})"
                                         )
                                     except Exception: